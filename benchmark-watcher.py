@@ -0,0 +1,1035 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for frontline_watcher_refactored.py.
+Runs against the sanitized HTML fixtures in benchmark_fixtures/ (no Frontline login,
+no Firebase credentials needed).
+
+Usage:
+    python benchmark-watcher.py extraction [--rounds 20]
+    python benchmark-watcher.py notify [--sends 50] [--fail-first 2]
+    python benchmark-watcher.py parser [--blocks 2000] [--rounds 20]
+    python benchmark-watcher.py replay [--dir RECORD_PAGES_DIR] [--speed 60] [--poll-interval 1]
+    python benchmark-watcher.py matcher [--users 5000] [--events 200]
+    python benchmark-watcher.py eventsize [--events 2000]
+
+Recordings for replay come from running the watcher with RECORD_PAGES_DIR set.
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from google.api_core.exceptions import AlreadyExists
+
+import frontline_watcher_refactored as watcher
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_fixtures")
+
+
+def load_fixtures(pattern: str = "available_jobs_*.html") -> dict[str, str]:
+    """Return {fixture name: html} for fixtures matching pattern."""
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, pattern))):
+        with open(path, encoding="utf-8") as f:
+            fixtures[os.path.basename(path)] = f.read()
+    return fixtures
+
+
+def summarize(samples_ms: list[float]) -> str:
+    """Format median / p95 / max for a list of millisecond samples."""
+    ordered = sorted(samples_ms)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"median {statistics.median(ordered):7.2f}ms  p95 {p95:7.2f}ms  max {ordered[-1]:7.2f}ms"
+
+
+# ---------------------------------------------------------------------
+# EXTRACTION: bulk page.evaluate() vs per-field locators
+# ---------------------------------------------------------------------
+
+async def bench_extraction(rounds: int) -> int:
+    from playwright.async_api import async_playwright
+
+    fixtures = load_fixtures()
+    if not fixtures:
+        print(f"No fixtures found in {FIXTURES_DIR}")
+        return 1
+
+    mismatches = 0
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        page = await browser.new_page()
+
+        for name, html in fixtures.items():
+            await page.set_content(html)
+
+            timings: dict[str, list[float]] = {"locator": [], "bulk": []}
+            results: dict[str, list[str]] = {}
+            for _ in range(rounds):
+                for mode, extract in (
+                    ("locator", watcher.extract_job_blocks_per_locator),
+                    ("bulk", watcher.extract_job_blocks_bulk),
+                ):
+                    start = time.perf_counter()
+                    results[mode] = await extract(page)
+                    timings[mode].append((time.perf_counter() - start) * 1000)
+
+            same = results["locator"] == results["bulk"]
+            if not same:
+                mismatches += 1
+            speedup = statistics.median(timings["locator"]) / max(statistics.median(timings["bulk"]), 1e-9)
+
+            print(f"{name}: {len(results['bulk'])} job(s), output {'identical' if same else 'MISMATCH'}")
+            print(f"  locator  {summarize(timings['locator'])}")
+            print(f"  bulk     {summarize(timings['bulk'])}  ({speedup:.1f}x)")
+
+        await browser.close()
+
+    return 1 if mismatches else 0
+
+
+# ---------------------------------------------------------------------
+# NOTIFY: pooled async notifier vs one urllib request per message
+# ---------------------------------------------------------------------
+
+class NtfyStandIn(BaseHTTPRequestHandler):
+    """Local ntfy stand-in: keep-alive HTTP/1.1, optionally failing the first N POSTs with 503."""
+
+    protocol_version = "HTTP/1.1"
+    fail_remaining = 0
+    received = 0
+    deliveries: list[tuple[float, str]] = []  # (perf_counter at arrival, body) of accepted POSTs
+    lock = threading.Lock()
+
+    def _reply(self, status: int) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self._reply(200)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with NtfyStandIn.lock:
+            if NtfyStandIn.fail_remaining > 0:
+                NtfyStandIn.fail_remaining -= 1
+                status = 503
+            else:
+                NtfyStandIn.received += 1
+                NtfyStandIn.deliveries.append((time.perf_counter(), body.decode("utf-8", "replace")))
+                status = 200
+        self._reply(status)
+
+    def log_message(self, *args):
+        pass
+
+
+async def bench_notify(sends: int, fail_first: int) -> int:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), NtfyStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    watcher.NTFY_BASE_URL = base_url
+    message = "🆕 NEW FRONTLINE JOB\n\n📅 Date: Mon, 2/9/2026"
+
+    urllib_ms = []
+    for _ in range(sends):
+        start = time.perf_counter()
+        await asyncio.to_thread(watcher.notify, message, "controller_1")
+        urllib_ms.append((time.perf_counter() - start) * 1000)
+
+    notifier = watcher.Notifier(base_url)
+    await notifier.warm_up()
+    pooled_ms = []
+    for _ in range(sends):
+        await notifier.send(message, "controller_1")
+        pooled_ms.append(notifier.last_latency * 1000)
+
+    # Transient failures: job alerts must still arrive
+    NtfyStandIn.fail_remaining = fail_first
+    NtfyStandIn.received = 0
+    delivered = await notifier.send(message, "controller_1", retries=watcher.NTFY_JOB_RETRIES)
+    await notifier.close()
+    server.shutdown()
+
+    print(f"urllib per message  {summarize(urllib_ms)}")
+    print(f"pooled notifier     {summarize(pooled_ms)}")
+    print(f"{fail_first} transient 503(s) then retry: {'delivered' if delivered and NtfyStandIn.received == 1 else 'LOST'}")
+    return 0 if delivered or fail_first > watcher.NTFY_JOB_RETRIES else 1
+
+
+# ---------------------------------------------------------------------
+# PARSER: compiled parse_job_block / extract_keywords vs the original loop
+# ---------------------------------------------------------------------
+
+# Verbatim copies of the pre-optimization parser, kept as the reference the
+# compiled version must reproduce byte-for-byte (job_data and keyword arrays).
+
+def legacy_extract_keywords(text: str, job_data: Optional[dict] = None) -> list[str]:
+    """
+    Extract unique lowercase words from text for matching.
+    Strips common punctuation and splits on whitespace.
+    Also includes normalized date and duration keywords if provided.
+    """
+    punctuation = ",.;:!?()[]{}<>\"'\\/\n\t"
+    cleaned = text.lower()
+    for ch in punctuation:
+        cleaned = cleaned.replace(ch, " ")
+    words = [w for w in cleaned.split(" ") if w and len(w) > 2]  # Filter very short words
+    
+    # Add normalized date and duration keywords if available
+    if job_data:
+        if job_data.get('dateKeyword'):
+            words.append(job_data['dateKeyword'])
+        if job_data.get('durationKeyword'):
+            words.append(job_data['durationKeyword'])
+            
+            # Check if duration maps to "half" or "full"
+            duration_keyword = job_data['durationKeyword']
+            half_day_durations = [
+                "0100", "0115", "0130", "0145",
+                "0200", "0215", "0230", "0245",
+                "0300", "0315", "0330", "0345",
+                "0400"
+            ]
+            full_day_durations = [
+                "0415", "0430", "0445",
+                "0500", "0515", "0530", "0545",
+                "0600", "0615", "0630", "0645",
+                "0700", "0715", "0730", "0745",
+                "0800", "0815", "0830", "0845",
+                "0900", "0915"
+            ]
+            
+            if duration_keyword in half_day_durations:
+                words.append("half")
+            elif duration_keyword in full_day_durations:
+                words.append("full")
+    
+    return sorted(set(words))
+
+def legacy_normalize_date(date_str: str) -> str:
+    """
+    Normalize date string to keyword format (e.g., "Mon, 2/5/2026" -> "2_5_2026")
+    Removes leading zeros from month and day.
+    """
+    # Remove weekday prefix if present (e.g., "Mon, " or "Monday, ")
+    cleaned = date_str.strip()
+    if ',' in cleaned:
+        cleaned = cleaned.split(',')[-1].strip()
+    
+    # Handle formats like "2/5/2026" or "02/05/2026"
+    if '/' in cleaned:
+        parts = cleaned.split('/')
+        if len(parts) == 3:
+            try:
+                month = int(parts[0])  # Remove leading zero
+                day = int(parts[1])    # Remove leading zero
+                year = parts[2]
+                return f"{month}_{day}_{year}"
+            except (ValueError, IndexError):
+                pass
+    
+    # Handle ISO format "2024-01-15" -> "1_15_2024"
+    if '-' in cleaned and len(cleaned) >= 10:
+        parts = cleaned.split('-')
+        if len(parts) == 3:
+            try:
+                year = parts[0]
+                month = int(parts[1])  # Remove leading zero
+                day = int(parts[2])     # Remove leading zero
+                return f"{month}_{day}_{year}"
+            except (ValueError, IndexError):
+                pass
+    
+    # Fallback: replace slashes and dashes with underscores
+    return cleaned.replace('/', '_').replace('-', '_')
+
+def legacy_normalize_duration(duration_str: str) -> str:
+    """
+    Normalize duration string to 4-digit format (e.g., "01:15" -> "0115")
+    Also handles text formats like "Full Day", "Half Day"
+    """
+    cleaned = duration_str.strip().lower()
+    
+    # Handle text formats first
+    if 'full' in cleaned and 'day' in cleaned:
+        # Full day - return a representative time (e.g., "0800" for 8 hours)
+        # This will match full day duration range
+        return "0800"  # 8:00 AM - represents full day
+    elif 'half' in cleaned and 'day' in cleaned:
+        # Half day - return a representative time (e.g., "0400" for 4 hours)
+        # This will match half day duration range
+        return "0400"  # 4:00 - represents half day
+    
+    # Handle time formats like "01:15", "1:15", etc.
+    if ':' in cleaned:
+        parts = cleaned.split(':')
+        if len(parts) >= 2:
+            try:
+                hours = int(parts[0].strip())
+                minutes = int(parts[1].strip().split(' ')[0])
+                return f"{hours:02d}{minutes:02d}"
+            except (ValueError, IndexError):
+                pass
+    
+    # Extract numbers and pad to 4 digits
+    numbers = ''.join(c for c in cleaned if c.isdigit())
+    if numbers:
+        return numbers.zfill(4)[:4]
+    
+    return cleaned
+
+def legacy_parse_job_block(block: str) -> Optional[dict]:
+    """
+    Parse a job block string into structured data.
+    Returns None if parsing fails.
+    Normalizes dates and durations for keyword matching.
+    """
+    lines = [ln.strip() for ln in block.splitlines() if ln.strip()]
+    
+    job_data = {
+        'confirmationNumber': '',
+        'teacher': '',
+        'title': '',
+        'date': '',
+        'dateKeyword': '',  # Normalized date for keyword matching
+        'startTime': '',
+        'endTime': '',
+        'duration': '',
+        'durationKeyword': '',  # Normalized duration for keyword matching
+        'location': '',
+    }
+    
+    for line in lines:
+        line_upper = line.upper()
+        if line_upper.startswith('CONFIRMATION #'):
+            job_data['confirmationNumber'] = line.split('#', 1)[1].strip()
+        elif line_upper.startswith('TEACHER:'):
+            job_data['teacher'] = line.split(':', 1)[1].strip()
+        elif line_upper.startswith('TITLE:'):
+            job_data['title'] = line.split(':', 1)[1].strip()
+        elif line_upper.startswith('DATE:'):
+            date_str = line.split(':', 1)[1].strip()
+            job_data['date'] = date_str
+            job_data['dateKeyword'] = legacy_normalize_date(date_str)
+        elif line_upper.startswith('TIME:'):
+            time_part = line.split(':', 1)[1].strip()
+            if ' - ' in time_part:
+                parts = time_part.split(' - ', 1)
+                job_data['startTime'] = parts[0].strip()
+                job_data['endTime'] = parts[1].strip() if len(parts) > 1 else ''
+            else:
+                job_data['startTime'] = time_part
+        elif line_upper.startswith('DURATION:'):
+            duration_str = line.split(':', 1)[1].strip()
+            job_data['duration'] = duration_str
+            job_data['durationKeyword'] = legacy_normalize_duration(duration_str)
+        elif line_upper.startswith('LOCATION:'):
+            job_data['location'] = line.split(':', 1)[1].strip()
+    
+    # Require at least confirmation number and date
+    if not job_data['confirmationNumber'] or not job_data['date']:
+        return None
+    
+    return job_data
+
+
+PARSER_EDGE_CASES = [
+    "CONFIRMATION #123\nDATE: 2026-02-09\nDURATION: Full Day",
+    "confirmation #  456 \n  date: Mon, 02/09/2026  \nduration: half day\nlocation: Lone Peak High",
+    "CONFIRMATION #789\nDATE: Tue, 2/10/2026\nTIME: 7:45 AM\nDURATION: 1:15 PM\nTITLE: P.E. (Physical Education)",
+    "CONFIRMATION #790\nDATE: Feb 10, 2026\nTIME: 8:00 AM - \nDURATION: 07:30",
+    "CONFIRMATION #791\nDATE: 2/10\nDURATION: 6 hours\nTEACHER: O'Neil, Mary-Kate",
+    "CONFIRMATION #792\nDATE: x-y-z-2026\nDURATION: ::",
+    "CONFIRMATION #\nDATE: Wed, 2/11/2026",
+    "TEACHER: No Conf\nDATE: Wed, 2/11/2026",
+    "CONFIRMATION #793\nDATE: Thu, 2/12/2026\nDURATION: 4:00 hours\nLOCATION: Art/Music\tRoom [B]",
+    "CONFIRMATION #794\r\nDATE: Fri, 2/13/2026\r\nTIME: 9:00 AM - 3:30 PM - late\r\nDURATION: 09:15",
+    "",
+]
+
+
+def build_parser_corpus(size: int, seed: int = 7) -> list[str]:
+    """Synthetic job blocks in the build_job_block() format, plus hand-written edge cases."""
+    rng = random.Random(seed)
+    schools_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alpine_school_district_schools_ls_of_dicts.json")
+    with open(schools_path, encoding="utf-8") as f:
+        schools = [s["name"] for s in json.load(f)]
+    titles = ["Kindergarten", "SPED Resource", "Physical Education", "ELL Aide", "Art", "5th Grade", "Math 7", "Choir"]
+    names = ["Smith, Jane", "Nguyen, Tom", "O'Brien, Pat", "Garcia-Lopez, Ana", "Lee, Min"]
+    durations = ["Full Day", "Half Day AM", "Half Day PM", "01:15", "3:30", "07:45", "08:00", "Custom"]
+    times = [("7:45 AM", "2:45 PM"), ("8:00 AM", "12:00 PM"), ("12:30 PM", "3:15 PM"), ("", "")]
+
+    first_day = datetime(2026, 2, 9)  # dates span the ~6 week window the jobs page lists
+    corpus = list(PARSER_EDGE_CASES)
+    while len(corpus) < size:
+        start, end = rng.choice(times)
+        day = first_day + timedelta(days=rng.randrange(45))
+        record = {
+            "confNum": str(rng.randint(100000000, 999999999)),
+            "name": rng.choice(names),
+            "title": rng.choice(titles),
+            "itemDate": f"{day:%a}, {day.month}/{day.day}/{day.year}",
+            "startTime": start,
+            "endTime": end,
+            "durationName": rng.choice(durations),
+            "locationName": rng.choice(schools),
+        }
+        corpus.append(watcher.build_job_block(record))
+    return corpus
+
+
+def parse_and_tag(parse, keywords, block: str):
+    job_data = parse(block)
+    return job_data, keywords(block, job_data)
+
+
+# Job feed payloads -> (confNum, itemDate, startTime, endTime) the DOM path would produce (None: rejected)
+FEED_EDGE_CASES = [
+    ({"messages": [], "data": {"jobs": [{"confirmationNumber": 901, "date": "2026-02-09T00:00:00",
+                                         "startTime": "2026-02-09T08:30:00-07:00", "endTime": "2026-02-09T15:15:00-07:00"}]}},
+     [("901", "Mon, 2/9/2026", "8:30 AM", "3:15 PM")]),
+    ({"jobs": [{"confNum": "902", "itemDate": "2026-02-10", "start": "13:30:00", "end": "2026-02-10T16:00:00.000-0700"},
+               {"confirmationNo": "903", "itemDate": "2026-02-10", "start": "2026-02-10T07:45:00Z", "end": "2:45 PM"}]},
+     [("902", "Tue, 2/10/2026", "1:30 PM", "4:00 PM"), ("903", "Tue, 2/10/2026", "7:45 AM", "2:45 PM")]),
+    ({"messages": [], "data": {"jobs": []}}, []),
+    # A record id is not a confirmation number: not a usable feed
+    ({"jobs": [{"id": 17, "jobId": 904, "date": "2026-02-10T00:00:00"}]}, None),
+]
+
+
+# Job block text -> canonical tags; phrases only count as whole words
+PHRASE_TAG_CASES = [
+    ("TEACHER: Stuart Parts", set()),
+    ("TITLE: Arts\nTEACHER: Stuart Parts", {"art"}),
+    ("TITLE: P.E. (Physical Education)", {"pe"}),
+    ("TITLE: Special Education\nDURATION: Half Day AM", {"sped", "half"}),
+    ("LOCATION: Spartsville Elementary", set()),
+]
+
+
+def check_feed_cases() -> int:
+    mismatches = 0
+    for payload, expected in FEED_EDGE_CASES:
+        records = watcher.job_records_from_feed(payload)
+        got = None if records is None else [(r["confNum"], r["itemDate"], r["startTime"], r["endTime"]) for r in records]
+        if got != expected:
+            mismatches += 1
+            print(f"FEED MISMATCH: {got!r} != {expected!r}")
+    return mismatches
+
+
+def bench_parser(blocks: int, rounds: int) -> int:
+    corpus = build_parser_corpus(blocks)
+
+    mismatches = 0
+    for block in corpus:
+        expected = parse_and_tag(legacy_parse_job_block, legacy_extract_keywords, block)
+        if parse_and_tag(watcher.parse_job_block, watcher.extract_keywords, block) != expected:
+            mismatches += 1
+            print(f"MISMATCH on block: {block!r}")
+
+    watcher.normalize_date.cache_clear()
+    watcher.normalize_duration.cache_clear()
+
+    per_block_us: dict[str, list[float]] = {"legacy": [], "compiled": []}
+    for _ in range(rounds):
+        for label, parse, keywords in (
+            ("legacy", legacy_parse_job_block, legacy_extract_keywords),
+            ("compiled", watcher.parse_job_block, watcher.extract_keywords),
+        ):
+            start = time.perf_counter()
+            for block in corpus:
+                parse_and_tag(parse, keywords, block)
+            per_block_us[label].append((time.perf_counter() - start) * 1e6 / len(corpus))
+
+    legacy_med = statistics.median(per_block_us["legacy"])
+    compiled_med = statistics.median(per_block_us["compiled"])
+    print(f"{len(corpus)} block(s), {rounds} round(s), output {'identical' if not mismatches else f'{mismatches} MISMATCH(ES)'}")
+    print(f"  legacy    median {legacy_med:7.2f}us/block")
+    print(f"  compiled  median {compiled_med:7.2f}us/block  ({legacy_med / max(compiled_med, 1e-9):.1f}x)")
+    print(f"  normalize_date cache: {watcher.normalize_date.cache_info()}")
+
+    feed_mismatches = check_feed_cases()
+    print(f"  job feed cases: {len(FEED_EDGE_CASES)}, {'identical' if not feed_mismatches else f'{feed_mismatches} MISMATCH(ES)'}")
+    mismatches += feed_mismatches
+
+    # Phrase tagging: one automaton pass per block regardless of dictionary size
+    tagger = watcher.PhraseTagger(watcher.KEYWORD_MAPPINGS)
+    tag_mismatches = 0
+    for text, expected in PHRASE_TAG_CASES:
+        if tagger.tags(text) != expected:
+            tag_mismatches += 1
+            print(f"TAG MISMATCH on {text!r}: {tagger.tags(text)} != {expected}")
+    print(f"  phrase tag cases: {len(PHRASE_TAG_CASES)}, {'identical' if not tag_mismatches else f'{tag_mismatches} MISMATCH(ES)'}")
+    mismatches += tag_mismatches
+    rng = random.Random(7)
+    large = dict(watcher.KEYWORD_MAPPINGS)
+    for n in range(5000):
+        large[f"tag{n}"] = [" ".join(rng.choice(["alpine", "grade", "resource", "lab", "music", "room", "aide", "east", "west"])
+                                     for _ in range(rng.randint(2, 4)))]
+    for label, tagger in (
+        ("built-in", watcher.PhraseTagger(watcher.KEYWORD_MAPPINGS)),
+        (f"{sum(map(len, large.values()))} phrases", watcher.PhraseTagger(large)),
+    ):
+        start = time.perf_counter()
+        for block in corpus:
+            tagger.tags(block)
+        print(f"  tagging, {label:<13} {(time.perf_counter() - start) * 1e6 / len(corpus):7.2f}us/block")
+
+    # School lookup: memoized per distinct location string
+    locations = [(watcher.parse_job_block(block) or {}).get("location", "") for block in corpus]
+    with open(watcher.SCHOOLS_PATH, encoding="utf-8") as f:
+        index = watcher.SchoolIndex(json.load(f))
+    for label in ("cold", "memoized"):
+        start = time.perf_counter()
+        matched = sum(index.lookup(location) is not None for location in locations)
+        print(f"  schools, {label:<12} {(time.perf_counter() - start) * 1e6 / len(corpus):7.2f}us/block "
+              f"({matched}/{len(locations)} matched, {len(set(locations))} distinct locations)")
+    return 1 if mismatches else 0
+
+
+# ---------------------------------------------------------------------
+# REPLAY: recorded page states through extraction -> parse -> publish -> notify
+# ---------------------------------------------------------------------
+
+REPLAY_CONTROLLER_ID = "controller_1"
+REPLAY_DISTRICT_ID = "replay_district"
+# Used when no recording directory is given: the static fixtures, a minute apart
+DEFAULT_REPLAY_FIXTURES = ["available_jobs_empty.html", "available_jobs_1.html", "available_jobs_10.html"]
+
+
+class MemoryFirestore:
+    """
+    In-memory stand-in for the slice of the Firestore client publish_job_events() uses:
+    collection().document(), ref.create(), batch() create/commit and get_all().
+    Every call that would be a round-trip sleeps for `latency` seconds.
+    """
+
+    class _Ref:
+        def __init__(self, store: "MemoryFirestore", doc_id: str):
+            self._store = store
+            self.id = doc_id
+
+        def create(self, doc: dict) -> None:
+            self._store.round_trip()
+            with self._store.lock:
+                if self.id in self._store.docs:
+                    raise AlreadyExists(f"job_events/{self.id}")
+                self._store.docs[self.id] = doc
+
+    class _Batch:
+        def __init__(self, store: "MemoryFirestore"):
+            self._store = store
+            self._creates = []
+
+        def create(self, ref, doc: dict) -> None:
+            self._creates.append((ref.id, doc))
+
+        def commit(self) -> None:
+            self._store.round_trip()
+            with self._store.lock:
+                if any(doc_id in self._store.docs for doc_id, _ in self._creates):
+                    raise AlreadyExists("batch create hit an existing document")
+                self._store.docs.update(self._creates)
+
+    class _Snapshot:
+        def __init__(self, doc_id: str, exists: bool):
+            self.id = doc_id
+            self.exists = exists
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.docs: dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    def round_trip(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def collection(self, name: str) -> "MemoryFirestore":
+        return self
+
+    def document(self, doc_id: str):
+        return MemoryFirestore._Ref(self, doc_id)
+
+    def batch(self):
+        return MemoryFirestore._Batch(self)
+
+    def get_all(self, refs):
+        self.round_trip()
+        with self.lock:
+            return [MemoryFirestore._Snapshot(ref.id, ref.id in self.docs) for ref in refs]
+
+
+class ReplayPageServer(BaseHTTPRequestHandler):
+    """Serves whichever recorded page state is currently live, at every path."""
+
+    html = "<html><body></body></html>"
+
+    def do_GET(self):
+        body = ReplayPageServer.html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def load_recording(directory: Optional[str]) -> list[tuple[float, str, str]]:
+    """
+    [(seconds since first state, name, html)] in recorded order. Recordings are the
+    <controller_id>_<unix ms>.html files written by RECORD_PAGES_DIR; without a
+    directory the static fixtures are replayed a minute apart.
+    """
+    if directory is None:
+        fixtures = load_fixtures()
+        return [(60.0 * i, name, fixtures[name]) for i, name in enumerate(DEFAULT_REPLAY_FIXTURES) if name in fixtures]
+
+    states = []
+    for path in glob.glob(os.path.join(directory, "*_*.html")):
+        stamp = os.path.basename(path)[:-len(".html")].rpartition("_")[2]
+        if stamp.isdigit():
+            with open(path, encoding="utf-8") as f:
+                states.append((int(stamp) / 1000, os.path.basename(path), f.read()))
+    states.sort()
+    return [(t - states[0][0], name, html) for t, name, html in states]
+
+
+def percentiles(samples_ms: list[float]) -> str:
+    """Format p50 / p95 / p99 for a list of millisecond samples."""
+    if not samples_ms:
+        return "no samples"
+    ordered = sorted(samples_ms)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+    return f"p50 {pick(0.50):8.2f}ms  p95 {pick(0.95):8.2f}ms  p99 {pick(0.99):8.2f}ms  (n={len(ordered)})"
+
+
+async def bench_replay(directory: Optional[str], speed: float, max_gap: float,
+                       poll_interval: float, firestore_ms: float) -> int:
+    from playwright.async_api import async_playwright
+
+    timeline = load_recording(directory)
+    if not timeline:
+        print(f"No recorded pages found in {directory or FIXTURES_DIR}")
+        return 1
+
+    # Recorded gaps, compressed by speed and capped at max_gap
+    schedule, at = [], 0.0
+    for i, (t, name, html) in enumerate(timeline):
+        if i:
+            at += min((t - timeline[i - 1][0]) / speed, max_gap)
+        schedule.append((at, name, html))
+
+    page_server = ThreadingHTTPServer(("127.0.0.1", 0), ReplayPageServer)
+    ntfy_server = ThreadingHTTPServer(("127.0.0.1", 0), NtfyStandIn)
+    for server in (page_server, ntfy_server):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    page_url = f"http://127.0.0.1:{page_server.server_address[1]}/Substitute/Home"
+    ntfy_url = f"http://127.0.0.1:{ntfy_server.server_address[1]}"
+
+    watcher.db = MemoryFirestore(firestore_ms / 1000)
+    watcher.NTFY_BASE_URL = ntfy_url
+    watcher.notifier = watcher.Notifier(ntfy_url)
+    await watcher.notifier.warm_up()
+    NtfyStandIn.deliveries = []
+
+    stages: dict[str, list[float]] = {
+        name: [] for name in ("reload", "extract", "diff", "parse", "dedup", "firestore", "notify", "end-to-end")
+    }
+    first_posted: dict[str, float] = {}  # confirmation number -> when the first state containing it went live
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        page = await browser.new_page()
+
+        # Which jobs each state contains, via the watcher's own extraction
+        state_jobs = []
+        for _, _, html in schedule:
+            await page.set_content(html)
+            blocks = await watcher.try_extract_available_job_blocks(page)
+            state_jobs.append({job['confirmationNumber'] for job in map(watcher.parse_job_block, blocks) if job})
+        expected = set().union(*state_jobs)
+
+        ReplayPageServer.html = schedule[0][2]
+        await page.goto(page_url)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            dedup_index = watcher.DedupIndex(os.path.join(tmp, "dedup_index.json"))
+            snapshot_diff = watcher.SnapshotDiff()
+            coalescer = watcher.NotificationCoalescer(REPLAY_CONTROLLER_ID, REPLAY_DISTRICT_ID)
+
+            async def advance_states() -> None:
+                start = time.perf_counter()
+                for (at, name, html), jobs in zip(schedule, state_jobs):
+                    await asyncio.sleep(max(0.0, start + at - time.perf_counter()))
+                    ReplayPageServer.html = html
+                    live_at = time.perf_counter()
+                    for job_id in jobs:
+                        first_posted.setdefault(job_id, live_at)
+                    print(f"  [{at:7.2f}s] {name}: {len(jobs)} job(s)")
+
+            player = asyncio.create_task(advance_states())
+            final_polls = 2  # polls after the last state, to pick it up
+            while final_polls:
+                if player.done():
+                    final_polls -= 1
+
+                t0 = time.perf_counter()
+                await page.reload(wait_until="domcontentloaded")
+                t1 = time.perf_counter()
+                current = await watcher.get_available_jobs_snapshot(page)
+                t2 = time.perf_counter()
+                changes = snapshot_diff.update(current)
+                t3 = time.perf_counter()
+                stages["reload"].append((t1 - t0) * 1000)
+                stages["extract"].append((t2 - t1) * 1000)
+                stages["diff"].append((t3 - t2) * 1000)
+
+                if changes:
+                    new_blocks, new_jobs = [], []
+                    for block in changes[0]:
+                        t4 = time.perf_counter()
+                        job_data = watcher.parse_job_block(block)
+                        t5 = time.perf_counter()
+                        stages["parse"].append((t5 - t4) * 1000)
+                        if not job_data:
+                            continue
+                        known = watcher.job_event_id(REPLAY_DISTRICT_ID, job_data) in dedup_index
+                        stages["dedup"].append((time.perf_counter() - t5) * 1000)
+                        if not known:
+                            new_blocks.append(block)
+                            new_jobs.append(job_data)
+
+                    if new_blocks:
+                        t6 = time.perf_counter()
+                        statuses = await asyncio.to_thread(
+                            watcher.publish_job_events, new_blocks, REPLAY_CONTROLLER_ID, REPLAY_DISTRICT_ID, False,
+                        )
+                        t7 = time.perf_counter()
+                        published = []
+                        for job_data, status in zip(new_jobs, statuses):
+                            if status != watcher.PUBLISH_FAILED:
+                                dedup_index.add(watcher.job_event_id(REPLAY_DISTRICT_ID, job_data), job_data)
+                            if status == watcher.PUBLISHED:
+                                published.append(job_data)
+                        coalescer.add(published)
+                        stages["firestore"].append((t7 - t6) * 1000)
+                        stages["notify"].append((time.perf_counter() - t7) * 1000)
+
+                await asyncio.sleep(poll_interval)
+
+            await coalescer.close()
+
+        await browser.close()
+    await watcher.notifier.close()
+    page_server.shutdown()
+    ntfy_server.shutdown()
+
+    notified_at: dict[str, float] = {}
+    for received_at, body in NtfyStandIn.deliveries:
+        for job_id in re.findall(r"Confirmation #: (\S+)", body):
+            notified_at.setdefault(job_id, received_at)
+    for job_id, received_at in notified_at.items():
+        if job_id in first_posted:
+            stages["end-to-end"].append((received_at - first_posted[job_id]) * 1000)
+
+    print(f"{len(schedule)} page state(s), {len(expected)} job(s), poll every {poll_interval}s, "
+          f"firestore latency {firestore_ms}ms")
+    for name, samples in stages.items():
+        print(f"  {name:<11} {percentiles(samples)}")
+
+    missed = expected - set(notified_at)
+    if missed:
+        print(f"{len(missed)} job(s) never notified: {', '.join(sorted(missed))}")
+    return 1 if missed else 0
+
+
+# ---------------------------------------------------------------------
+# MATCHER: inverted-index UserMatcher vs per-user matchesUserFilters
+# ---------------------------------------------------------------------
+
+FUNCTIONS_INDEX_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "functions", "index.js")
+
+# Runs the dispatcher's own matching functions (sliced out of functions/index.js)
+# over {"users": {uid: doc}, "events": [...]} read from stdin
+JS_MATCH_DRIVER = """
+const input = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+for (const user of Object.values(input.users)) {
+  if (user.subscriptionEndsAt != null) {
+    const ms = user.subscriptionEndsAt;
+    user.subscriptionEndsAt = { toDate: () => new Date(ms) };
+  }
+}
+const matched = input.events.map(expandJobEvent).map((event) => Object.entries(input.users)
+  .filter(([, user]) => Array.isArray(user.districtIds) && user.districtIds.includes(event.districtId) &&
+    user.notifyEnabled === true && user.automationActive && matchesUserFilters(event, user))
+  .map(([uid]) => uid)
+  .sort());
+process.stdout.write(JSON.stringify(matched));
+"""
+
+MATCHER_TERMS = [
+    "math", "Math ", "kindergarten", "elementary", "high", "art", "arts", "choir", "grade",
+    "pe", "PE", "p.e.", "physical education", "sped", "special ed", "resource", "ell", "esl",
+    "english language learner", "half", "full", "half day", "full day", "0800", "0115", "aide", "lone peak", " ",
+]
+
+
+def js_match_users(users_json: dict, events: list[dict]) -> Optional[list[list[str]]]:
+    """Matched uids per event according to functions/index.js, or None if node is unavailable."""
+    with open(FUNCTIONS_INDEX_JS, encoding="utf-8") as f:
+        source = f.read()
+    start = source.index("// Keyword mappings for alternative terms")
+    end = source.index("/**\n * Create user-level job event record")
+    with tempfile.NamedTemporaryFile("w", suffix=".js", delete=False) as f:
+        f.write(source[start:end] + JS_MATCH_DRIVER)
+        script = f.name
+    try:
+        result = subprocess.run(
+            ["node", script], input=json.dumps({"users": users_json, "events": events}),
+            capture_output=True, text=True, check=True,
+        )
+    except FileNotFoundError:
+        return None
+    finally:
+        os.remove(script)
+    return json.loads(result.stdout)
+
+
+def build_matcher_users(count: int, dates: list[str], rng: random.Random) -> dict[str, dict]:
+    """Random subscriber documents covering every branch of matchesUserFilters."""
+    now = time.time()
+    users = {}
+    for n in range(count):
+        user = {
+            "districtIds": [REPLAY_DISTRICT_ID] if rng.random() < 0.95 else ["other_district"],
+            "notifyEnabled": rng.random() < 0.95,
+            "automationActive": rng.random() < 0.9,
+            "applyFilterEnabled": rng.random() < 0.7,
+        }
+        if rng.random() < 0.8:
+            user["subscriptionEndsAt"] = datetime.fromtimestamp(now + rng.choice([-1, 1]) * rng.uniform(3600, 90 * 86400), timezone.utc)
+        words = lambda k: rng.sample(MATCHER_TERMS, rng.randint(0, k))
+        if rng.random() < 0.8:
+            user["includedLs"], user["excludeLs"] = words(3), words(2)
+        else:
+            user["automationConfig"] = {"includedWords": words(3), "excludedWords": words(2)}
+        if rng.random() < 0.3:
+            user["excludedDates"] = rng.sample(dates, 3)
+        if rng.random() < 0.2:
+            user["scheduledJobDates"] = rng.sample(dates, 2)
+        if rng.random() < 0.3:
+            start = rng.randrange(6 * 60, 15 * 60, 15)
+            user["partialAvailabilityByDate"] = {d: {"startMinutes": start, "endMinutes": start + 120} for d in rng.sample(dates, 4)}
+        users[f"user_{n}"] = user
+    return users
+
+
+def bench_matcher(user_count: int, event_count: int, seed: int) -> int:
+    rng = random.Random(seed)
+    events = []
+    for block in build_parser_corpus(event_count * 2, seed):
+        job_data = watcher.parse_job_block(block)
+        if job_data and len(events) < event_count:
+            _, doc = watcher.build_job_event(block, job_data, REPLAY_CONTROLLER_ID, REPLAY_DISTRICT_ID)
+            doc.pop("createdAt")
+            events.append(doc)
+    dates = sorted({watcher.normalize_job_date(watcher.expand_job_event(e)["jobData"]["date"]) for e in events} - {None})
+    users = build_matcher_users(user_count, dates, rng)
+
+    start = time.perf_counter()
+    matcher = watcher.UserMatcher(REPLAY_DISTRICT_ID)
+    for uid, user in users.items():
+        matcher.upsert_user(uid, user)
+    index_ms = (time.perf_counter() - start) * 1000
+
+    indexed_ms, per_user_ms, indexed, per_user = [], [], [], []
+    for event in events:
+        start = time.perf_counter()
+        indexed.append(sorted(matcher.match(event)))
+        indexed_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        view = watcher.expand_job_event(event)
+        per_user.append(sorted(
+            uid for uid, user in users.items()
+            if watcher.is_eligible_user(user, REPLAY_DISTRICT_ID) and watcher.matches_user_filters(view, user)
+        ))
+        per_user_ms.append((time.perf_counter() - start) * 1000)
+
+    users_json = {
+        uid: {**user, "subscriptionEndsAt": user["subscriptionEndsAt"].timestamp() * 1000} if "subscriptionEndsAt" in user else user
+        for uid, user in users.items()
+    }
+    reference = js_match_users(users_json, events)
+
+    mismatches = sum(a != b for a, b in zip(indexed, per_user))
+    if reference is not None:
+        mismatches += sum(a != b for a, b in zip(indexed, reference))
+    avg_matched = statistics.mean(len(m) for m in indexed)
+
+    print(f"{user_count} user(s), {event_count} event(s), {avg_matched:.0f} matched per event on average")
+    print(f"  reference: {'functions/index.js via node' if reference is not None else 'node not found, Python port only'}")
+    print(f"  output {'identical' if not mismatches else f'{mismatches} MISMATCH(ES)'}")
+    print(f"  build index  {index_ms:8.2f}ms")
+    print(f"  per-user     {summarize(per_user_ms)}")
+    print(f"  indexed      {summarize(indexed_ms)}")
+    return 1 if mismatches else 0
+
+
+# ---------------------------------------------------------------------
+# EVENTSIZE: job_events document size, schema version 1 vs 2
+# ---------------------------------------------------------------------
+
+# Runs expandJobEvent() (sliced out of functions/index.js) over the documents read from stdin
+JS_EXPAND_DRIVER = """
+const docs = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+process.stdout.write(JSON.stringify(docs.map((doc) => {
+  const event = expandJobEvent(doc);
+  return { snapshotText: event.snapshotText, keywords: event.keywords, jobData: event.jobData };
+})));
+"""
+
+
+def firestore_value_size(value) -> int:
+    """Storage size of a field value, per the Firestore storage size documentation."""
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (list, tuple)):
+        return sum(firestore_value_size(v) for v in value)
+    if isinstance(value, dict):
+        return sum(len(k.encode("utf-8")) + 1 + firestore_value_size(v) for k, v in value.items())
+    return 8  # integer, double, timestamp (including the server timestamp sentinel)
+
+
+def firestore_document_size(collection: str, doc_id: str, doc: dict) -> int:
+    name = len(collection.encode("utf-8")) + 1 + len(doc_id.encode("utf-8")) + 1 + 16
+    return name + firestore_value_size(doc) + 32
+
+
+def js_expand_events(docs: list[dict]) -> Optional[list[dict]]:
+    """expandJobEvent() output per document according to functions/index.js, or None if node is unavailable."""
+    with open(FUNCTIONS_INDEX_JS, encoding="utf-8") as f:
+        source = f.read()
+    start = source.index("// Keyword mappings for alternative terms")
+    end = source.index("/**\n * Create user-level job event record")
+    with tempfile.NamedTemporaryFile("w", suffix=".js", delete=False) as f:
+        f.write(source[start:end] + JS_EXPAND_DRIVER)
+        script = f.name
+    try:
+        result = subprocess.run(["node", script], input=json.dumps(docs), capture_output=True, text=True, check=True)
+    except FileNotFoundError:
+        return None
+    finally:
+        os.remove(script)
+    return json.loads(result.stdout)
+
+
+def bench_eventsize(event_count: int, seed: int) -> int:
+    watcher.JOB_EVENT_SCHEMA_VERSION = 1
+    v1_docs, v2_docs, sizes = [], [], {1: [], 2: []}
+    for block in build_parser_corpus(event_count, seed):
+        job_data = watcher.parse_job_block(block)
+        if not job_data:
+            continue
+        event_id, v1 = watcher.build_job_event(block, job_data, REPLAY_CONTROLLER_ID, REPLAY_DISTRICT_ID)
+        v2 = watcher.compact_job_event(v1)
+        sizes[1].append(firestore_document_size("job_events", event_id, v1))
+        sizes[2].append(firestore_document_size("job_events", event_id, v2))
+        v1.pop("createdAt")
+        v2.pop("createdAt")
+        v1_docs.append(v1)
+        v2_docs.append(v2)
+
+    def reader_view(event: dict) -> dict:
+        job_data = {k: v for k, v in event["jobData"].items() if k not in ("dateKeyword", "durationKeyword")}
+        return {"snapshotText": event["snapshotText"], "keywords": sorted(event["keywords"]), "jobData": job_data}
+
+    expected = [reader_view(doc) for doc in v1_docs]
+    mismatches = sum(reader_view(watcher.expand_job_event(doc)) != want for doc, want in zip(v2_docs, expected))
+    reference = js_expand_events(v2_docs)
+    if reference is not None:
+        mismatches += sum({**got, "keywords": sorted(got["keywords"])} != want for got, want in zip(reference, expected))
+    raw_text = sum("rawText" in doc for doc in v2_docs)
+
+    print(f"{len(v1_docs)} job event(s), estimated Firestore document size (bytes)")
+    for version, samples in sizes.items():
+        print(f"  version {version}  mean {statistics.mean(samples):7.1f}  median {statistics.median(samples):7.1f}  "
+              f"max {max(samples):5d}  total {sum(samples):8d}")
+    print(f"  version 2 is {100 * (1 - sum(sizes[2]) / sum(sizes[1])):.1f}% smaller; "
+          f"rawText kept for {raw_text} ({100 * raw_text / len(v2_docs):.1f}%)")
+    print(f"  reference: {'functions/index.js via node' if reference is not None else 'node not found, Python port only'}")
+    print(f"  expanded view {'identical to version 1' if not mismatches else f'{mismatches} MISMATCH(ES)'}")
+    return 1 if mismatches else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p_extract = sub.add_parser("extraction", help="per-poll job extraction time, bulk vs locator")
+    p_extract.add_argument("--rounds", type=int, default=20)
+
+    p_notify = sub.add_parser("notify", help="per-send ntfy latency against a local stand-in, plus retry check")
+    p_notify.add_argument("--sends", type=int, default=50)
+    p_notify.add_argument("--fail-first", type=int, default=2)
+
+    p_parser = sub.add_parser("parser", help="parse_job_block + extract_keywords throughput, compiled vs legacy, plus phrase tagging")
+    p_parser.add_argument("--blocks", type=int, default=2000)
+    p_parser.add_argument("--rounds", type=int, default=20)
+
+    p_replay = sub.add_parser("replay", help="replay recorded page states end to end with in-memory Firestore and ntfy")
+    p_replay.add_argument("--dir", default=None, help="RECORD_PAGES_DIR recordings (default: static fixtures)")
+    p_replay.add_argument("--speed", type=float, default=60.0, help="compress recorded time by this factor")
+    p_replay.add_argument("--max-gap", type=float, default=10.0, help="cap on seconds between replayed states")
+    p_replay.add_argument("--poll-interval", type=float, default=1.0)
+    p_replay.add_argument("--firestore-ms", type=float, default=40.0, help="simulated Firestore round-trip")
+
+    p_matcher = sub.add_parser("matcher", help="user matching: inverted index vs per-user filters, checked against functions/index.js")
+    p_matcher.add_argument("--users", type=int, default=5000)
+    p_matcher.add_argument("--events", type=int, default=200)
+    p_matcher.add_argument("--seed", type=int, default=7)
+
+    p_eventsize = sub.add_parser("eventsize", help="job_events document size, schema version 1 vs 2, checked against functions/index.js")
+    p_eventsize.add_argument("--events", type=int, default=2000)
+    p_eventsize.add_argument("--seed", type=int, default=7)
+
+    args = parser.parse_args()
+
+    if args.bench == "extraction":
+        return asyncio.run(bench_extraction(args.rounds))
+    if args.bench == "notify":
+        return asyncio.run(bench_notify(args.sends, args.fail_first))
+    if args.bench == "parser":
+        return bench_parser(args.blocks, args.rounds)
+    if args.bench == "matcher":
+        return bench_matcher(args.users, args.events, args.seed)
+    if args.bench == "eventsize":
+        return bench_eventsize(args.events, args.seed)
+    if args.bench == "replay":
+        return asyncio.run(bench_replay(args.dir, args.speed, args.max_gap, args.poll_interval, args.firestore_ms))
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,84 +1,126 @@
 print("🚨 CODE VERSION V7) 🚨")
 
 import asyncio
+import collections
+import contextvars
+import difflib
+import fcntl
+import functools
 import hashlib
+import heapq
 import json
+import math
 import os
 import re
+import statistics
 import sys
 import random
+import threading
+import time
 from datetime import datetime, timezone, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import Optional
 from urllib import request
+from urllib.parse import urlparse
 
 from playwright.async_api import async_playwright, TimeoutError as PWTimeout
-from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
+from dotenv import load_dotenv, dotenv_values
+import httpx
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize Firebase
 FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID", "sub67-d4648")
 
 # Support both file path (EC2/local) and JSON string (for flexibility)
 FIREBASE_CREDENTIALS_JSON = os.getenv("FIREBASE_CREDENTIALS")
 FIREBASE_CREDENTIALS_PATH = os.getenv("FIREBASE_CREDENTIALS_PATH")
 
-if FIREBASE_CREDENTIALS_JSON:
-    # Credentials provided as JSON string (for containerized deployments)
-    try:
-        import json
-        cred_info = json.loads(FIREBASE_CREDENTIALS_JSON)
-        cred = credentials.Certificate(cred_info)
-        print("[firebase] Using credentials from FIREBASE_CREDENTIALS environment variable")
-    except json.JSONDecodeError as e:
-        print(f"[firebase] ERROR: FIREBASE_CREDENTIALS is not valid JSON: {e}")
-        sys.exit(1)
-    except Exception as e:
-        print(f"[firebase] ERROR: Failed to parse credentials: {e}")
+# Firestore client, set by init_firebase() when the watcher starts
+db = None
+
+def init_firebase() -> None:
+    """
+    Initialize Firebase from FIREBASE_CREDENTIALS or FIREBASE_CREDENTIALS_PATH.
+    Exits the process if credentials are missing or invalid.
+    """
+    global db
+    # firebase_admin and google.cloud.firestore take ~0.5s to import, so they load here rather than at startup
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if FIREBASE_CREDENTIALS_JSON:
+        # Credentials provided as JSON string (for containerized deployments)
+        try:
+            cred_info = json.loads(FIREBASE_CREDENTIALS_JSON)
+            cred = credentials.Certificate(cred_info)
+            print("[firebase] Using credentials from FIREBASE_CREDENTIALS environment variable")
+        except json.JSONDecodeError as e:
+            print(f"[firebase] ERROR: FIREBASE_CREDENTIALS is not valid JSON: {e}")
+            sys.exit(1)
+        except Exception as e:
+            print(f"[firebase] ERROR: Failed to parse credentials: {e}")
+            sys.exit(1)
+    elif FIREBASE_CREDENTIALS_PATH and os.path.exists(FIREBASE_CREDENTIALS_PATH):
+        # EC2/Local: credentials provided as file path
+        try:
+            cred = credentials.Certificate(FIREBASE_CREDENTIALS_PATH)
+            print(f"[firebase] Using credentials from file: {FIREBASE_CREDENTIALS_PATH}")
+        except Exception as e:
+            print(f"[firebase] ERROR: Failed to load credentials from file: {e}")
+            sys.exit(1)
+    else:
+        print("ERROR: Either FIREBASE_CREDENTIALS (JSON string) or FIREBASE_CREDENTIALS_PATH (file path) must be set")
         sys.exit(1)
-elif FIREBASE_CREDENTIALS_PATH and os.path.exists(FIREBASE_CREDENTIALS_PATH):
-    # EC2/Local: credentials provided as file path
+
     try:
-        cred = credentials.Certificate(FIREBASE_CREDENTIALS_PATH)
-        print(f"[firebase] Using credentials from file: {FIREBASE_CREDENTIALS_PATH}")
+        firebase_admin.initialize_app(cred, {
+            'projectId': FIREBASE_PROJECT_ID,
+        })
+        db = firestore.client()
+        print("[firebase] Initialized successfully")
     except Exception as e:
-        print(f"[firebase] ERROR: Failed to load credentials from file: {e}")
+        print(f"[firebase] ERROR: Failed to initialize: {e}")
         sys.exit(1)
-else:
-    print("ERROR: Either FIREBASE_CREDENTIALS (JSON string) or FIREBASE_CREDENTIALS_PATH (file path) must be set")
-    sys.exit(1)
 
-try:
-    firebase_admin.initialize_app(cred, {
-        'projectId': FIREBASE_PROJECT_ID,
-    })
-    db = firestore.client()
-    print("[firebase] Initialized successfully")
-except Exception as e:
-    print(f"[firebase] ERROR: Failed to initialize: {e}")
-    sys.exit(1)
+# init_firebase() running in a worker thread, started by start_firebase_init()
+_firebase_init: Optional[asyncio.Task] = None
+
+def start_firebase_init() -> None:
+    """Run init_firebase() in a thread so it overlaps the browser launch and login."""
+    global _firebase_init
+    _firebase_init = asyncio.create_task(asyncio.to_thread(init_firebase))
+
+async def firebase_ready() -> None:
+    """Wait for start_firebase_init() to finish (re-raises its SystemExit on failure)."""
+    if _firebase_init is not None:
+        await _firebase_init
 
 # Controller and district configuration
 CONTROLLER_ID = os.getenv("CONTROLLER_ID", "controller_1")
 DISTRICT_ID = os.getenv("DISTRICT_ID")
-if not DISTRICT_ID:
-    print("ERROR: DISTRICT_ID environment variable is required")
-    sys.exit(1)
 
 #init
 SELFTEST_ENABLED = os.getenv("SELFTEST_ON_START", "0") == "1"
 
+def utah_now() -> datetime:
+    """Utah local time (MST, UTC-7)"""
+    return datetime.now(timezone.utc) - timedelta(hours=7)
+
 def _ts() -> str:
     """Utah local time (MST, UTC-7)"""
-    utah = datetime.now(timezone.utc) - timedelta(hours=7)
-    return f"[UTAH MST {utah:%Y-%m-%d %H:%M:%S}]"
+    return f"[UTAH MST {utah_now():%Y-%m-%d %H:%M:%S}]"
+
+# Per-task log tag (e.g. "[controller_3]") so supervised controllers can be told apart
+LOG_TAG: contextvars.ContextVar[str] = contextvars.ContextVar("LOG_TAG", default="")
 
 def log(*args, **kwargs) -> None:
     """Print with timestamps prepended (shows in docker logs)."""
-    print(_ts(), *args, **kwargs, flush=True)
+    tag = LOG_TAG.get()
+    if tag:
+        print(_ts(), tag, *args, **kwargs, flush=True)
+    else:
+        print(_ts(), *args, **kwargs, flush=True)
 
 LOGIN_URL = (
     "https://login.frontlineeducation.com/login"
@@ -88,6 +130,23 @@ LOGIN_URL = (
 
 JOBS_URL = "https://absencesub.frontlineeducation.com/Substitute/Home"
 
+# District registry entry of the current controller task (set by supervise_controller);
+# None when the process watches a single district from the environment
+DISTRICT: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("DISTRICT", default=None)
+
+def district_setting(key: str, default):
+    """A setting from the current task's district registry entry, else default."""
+    district = DISTRICT.get()
+    if district is None or district.get(key) is None:
+        return default
+    return district[key]
+
+def jobs_url() -> str:
+    return district_setting("jobsUrl", JOBS_URL)
+
+def login_url() -> str:
+    return district_setting("loginUrl", LOGIN_URL)
+
 # Randomized poll delay bounds (seconds)
 MIN_DELAY = 7
 MAX_DELAY = 16
@@ -97,9 +156,9 @@ def get_random_delay() -> float:
     import random
     return random.uniform(MIN_DELAY, MAX_DELAY)
 
-def get_ntfy_topic() -> Optional[str]:
+def get_ntfy_topic(controller_id: Optional[str] = None) -> Optional[str]:
     """
-    Get NTFY topic based on controller ID.
+    Get NTFY topic based on controller ID (defaults to CONTROLLER_ID).
     Maps controller_1 -> "frontline-jobs-mckay"
     Maps controller_2 -> "frontline-jobs-nathan"
     """
@@ -107,44 +166,129 @@ def get_ntfy_topic() -> Optional[str]:
         "controller_1": "frontline-jobs-mckay",
         "controller_2": "frontline-jobs-nathan",
     }
-    return controller_to_topic.get(CONTROLLER_ID)
+    return controller_to_topic.get(controller_id or CONTROLLER_ID)
 
-def notify(message: str) -> None:
+# ntfy server (override to point at a local stand-in when testing)
+NTFY_BASE_URL = os.getenv("NTFY_BASE_URL", "https://ntfy.sh").rstrip("/")
+NTFY_TIMEOUT_SECONDS = 5
+NTFY_MAX_CONCURRENCY = int(os.getenv("NTFY_MAX_CONCURRENCY", "4"))
+# Retries (with jittered exponential backoff) for new-job alerts
+NTFY_JOB_RETRIES = int(os.getenv("NTFY_JOB_RETRIES", "3"))
+NTFY_RETRY_BASE_SECONDS = 0.5
+
+def resolve_ntfy_topic(controller_id: Optional[str] = None) -> Optional[str]:
+    """Controller-specific topic, falling back to NTFY_TOPIC."""
+    # Fallback to environment variable if controller mapping not found
+    return get_ntfy_topic(controller_id) or os.getenv("NTFY_TOPIC")
+
+def notify(message: str, controller_id: Optional[str] = None) -> None:
     """
     Send notification to NTFY topic based on controller ID.
     Uses controller-specific topic if available.
+    Blocking; code on the event loop should use notifier.send() instead.
     """
-    topic = get_ntfy_topic()
+    topic = resolve_ntfy_topic(controller_id)
     if not topic:
-        # Fallback to environment variable if controller mapping not found
-        topic = os.getenv("NTFY_TOPIC")
-        if not topic:
-            return
+        return
 
     try:
         req = request.Request(
-            f"https://ntfy.sh/{topic}",
+            f"{NTFY_BASE_URL}/{topic}",
             data=message.encode("utf-8"),
             headers={"Content-Type": "text/plain; charset=utf-8"},
             method="POST",
         )
-        request.urlopen(req, timeout=5).read()
+        request.urlopen(req, timeout=NTFY_TIMEOUT_SECONDS).read()
         log(f"[notify] Sent to {topic}")
     except Exception as e:
         log(f"[notify error] {e}")
 
-def get_scraper_offset() -> int:
-    """Get offset in seconds for this controller based on configurable settings"""
+class Notifier:
+    """
+    Async ntfy client: one keep-alive connection pool shared by every controller
+    in the process, at most NTFY_MAX_CONCURRENCY sends in flight, optional retries
+    with jittered exponential backoff.
+    """
+
+    def __init__(self, base_url: str = NTFY_BASE_URL):
+        self.base_url = base_url
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(NTFY_MAX_CONCURRENCY)
+        self.last_latency: Optional[float] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=NTFY_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=NTFY_MAX_CONCURRENCY,
+                                    max_keepalive_connections=NTFY_MAX_CONCURRENCY),
+                headers={"Content-Type": "text/plain; charset=utf-8"},
+            )
+        return self._client
+
+    async def warm_up(self) -> None:
+        """Open a pooled connection (DNS + TCP + TLS) before the first alert needs it."""
+        try:
+            await self._get_client().get("/v1/health")
+            log(f"[notify] Connection to {self.base_url} warmed up")
+        except Exception as e:
+            log(f"[notify] Warm-up failed (will connect on first send): {e}")
+
+    async def send(self, message: str, controller_id: Optional[str] = None, retries: int = 0) -> bool:
+        """
+        POST message to the controller's topic. Retries transport errors, 429 and 5xx
+        up to `retries` times. Returns True once delivered.
+        """
+        topic = resolve_ntfy_topic(controller_id)
+        if not topic:
+            return False
+
+        client = self._get_client()
+        for attempt in range(retries + 1):
+            started = time.monotonic()
+            try:
+                async with self._semaphore:
+                    response = await client.post(f"/{topic}", content=message.encode("utf-8"))
+                self.last_latency = time.monotonic() - started
+                if response.status_code < 400:
+                    log(f"[notify] Sent to {topic} in {self.last_latency * 1000:.0f}ms")
+                    return True
+                retryable = response.status_code == 429 or response.status_code >= 500
+                error = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                retryable = True
+                error = repr(e)
+
+            if not retryable or attempt == retries:
+                log(f"[notify error] {topic}: {error} (attempt {attempt + 1}/{retries + 1})")
+                return False
+            backoff = NTFY_RETRY_BASE_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5)
+            log(f"[notify] {topic}: {error}, retrying in {backoff:.2f}s")
+            await asyncio.sleep(backoff)
+        return False
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+# Shared by all controllers in the process
+notifier = Notifier()
+
+def get_scraper_offset(controller_id: Optional[str] = None) -> int:
+    """Get offset in seconds for a controller (defaults to CONTROLLER_ID) based on configurable settings"""
     # Get number of scrapers and scrape interval from environment
-    NUM_SCRAPERS = int(os.getenv("NUM_SCRAPERS", "5"))
-    SCRAPE_INTERVAL = int(os.getenv("SCRAPE_INTERVAL_SECONDS", "15"))
+    # (a district registry entry spreads its own accounts over its own interval)
+    NUM_SCRAPERS = district_setting("numScrapers", int(os.getenv("NUM_SCRAPERS", "5")))
+    SCRAPE_INTERVAL = district_setting("scrapeIntervalSeconds", int(os.getenv("SCRAPE_INTERVAL_SECONDS", "15")))
     
     # Calculate offset interval (time between each scraper)
     OFFSET_INTERVAL = SCRAPE_INTERVAL // NUM_SCRAPERS if NUM_SCRAPERS > 0 else 0
     
     # Extract controller number from CONTROLLER_ID (e.g., "controller_1" -> 1)
     try:
-        controller_num = int(CONTROLLER_ID.split('_')[-1])
+        controller_num = district_setting("scraperNumber", None) or int((controller_id or CONTROLLER_ID).split('_')[-1])
         offset = OFFSET_INTERVAL * (controller_num - 1)
     except (ValueError, IndexError):
         offset = 0
@@ -229,48 +373,48 @@ WEEKDAY_WORDS = ["Mon,", "Tue,", "Wed,", "Thu,", "Fri,", "Sat,", "Sun,"]
 # FIRESTORE EVENT PUBLISHING
 # ---------------------------------------------------------------------
 
+# Keyword = run of 3+ characters between spaces / common punctuation
+KEYWORD_RE = re.compile(r"[^,.;:!?()\[\]{}<>\"'\\/\n\t ]{3,}")
+
+# Normalized durations (HHMM) that also earn the "half" / "full" keyword
+HALF_DAY_DURATIONS = frozenset({
+    "0100", "0115", "0130", "0145",
+    "0200", "0215", "0230", "0245",
+    "0300", "0315", "0330", "0345",
+    "0400",
+})
+FULL_DAY_DURATIONS = frozenset({
+    "0415", "0430", "0445",
+    "0500", "0515", "0530", "0545",
+    "0600", "0615", "0630", "0645",
+    "0700", "0715", "0730", "0745",
+    "0800", "0815", "0830", "0845",
+    "0900", "0915",
+})
+
 def extract_keywords(text: str, job_data: Optional[dict] = None) -> list[str]:
     """
     Extract unique lowercase words from text for matching.
     Strips common punctuation and splits on whitespace.
     Also includes normalized date and duration keywords if provided.
     """
-    punctuation = ",.;:!?()[]{}<>\"'\\/\n\t"
-    cleaned = text.lower()
-    for ch in punctuation:
-        cleaned = cleaned.replace(ch, " ")
-    words = [w for w in cleaned.split(" ") if w and len(w) > 2]  # Filter very short words
-    
+    words = set(KEYWORD_RE.findall(text.lower()))
+
     # Add normalized date and duration keywords if available
     if job_data:
         if job_data.get('dateKeyword'):
-            words.append(job_data['dateKeyword'])
-        if job_data.get('durationKeyword'):
-            words.append(job_data['durationKeyword'])
-            
+            words.add(job_data['dateKeyword'])
+        duration_keyword = job_data.get('durationKeyword')
+        if duration_keyword:
+            words.add(duration_keyword)
+
             # Check if duration maps to "half" or "full"
-            duration_keyword = job_data['durationKeyword']
-            half_day_durations = [
-                "0100", "0115", "0130", "0145",
-                "0200", "0215", "0230", "0245",
-                "0300", "0315", "0330", "0345",
-                "0400"
-            ]
-            full_day_durations = [
-                "0415", "0430", "0445",
-                "0500", "0515", "0530", "0545",
-                "0600", "0615", "0630", "0645",
-                "0700", "0715", "0730", "0745",
-                "0800", "0815", "0830", "0845",
-                "0900", "0915"
-            ]
-            
-            if duration_keyword in half_day_durations:
-                words.append("half")
-            elif duration_keyword in full_day_durations:
-                words.append("full")
-    
-    return sorted(set(words))
+            if duration_keyword in HALF_DAY_DURATIONS:
+                words.add("half")
+            elif duration_keyword in FULL_DAY_DURATIONS:
+                words.add("full")
+
+    return sorted(words)
 
 def generate_event_id(district_id: str, job_id: str, date: str, start_time: str, location: str) -> str:
     """
@@ -280,6 +424,9 @@ def generate_event_id(district_id: str, job_id: str, date: str, start_time: str,
     combined = f"{district_id}|{job_id}|{date}|{start_time}|{location}"
     return hashlib.sha256(combined.encode()).hexdigest()
 
+# The same handful of dates and durations repeat across every poll, so the
+# normalizers are memoized; both are pure functions of their input string.
+@functools.lru_cache(maxsize=1024)
 def normalize_date(date_str: str) -> str:
     """
     Normalize date string to keyword format (e.g., "Mon, 2/5/2026" -> "2_5_2026")
@@ -288,78 +435,71 @@ def normalize_date(date_str: str) -> str:
     # Remove weekday prefix if present (e.g., "Mon, " or "Monday, ")
     cleaned = date_str.strip()
     if ',' in cleaned:
-        cleaned = cleaned.split(',')[-1].strip()
-    
+        cleaned = cleaned.rpartition(',')[2].strip()
+
     # Handle formats like "2/5/2026" or "02/05/2026"
     if '/' in cleaned:
         parts = cleaned.split('/')
         if len(parts) == 3:
             try:
-                month = int(parts[0])  # Remove leading zero
-                day = int(parts[1])    # Remove leading zero
-                year = parts[2]
-                return f"{month}_{day}_{year}"
-            except (ValueError, IndexError):
+                return f"{int(parts[0])}_{int(parts[1])}_{parts[2]}"  # int() drops leading zeros
+            except ValueError:
                 pass
-    
+
     # Handle ISO format "2024-01-15" -> "1_15_2024"
     if '-' in cleaned and len(cleaned) >= 10:
         parts = cleaned.split('-')
         if len(parts) == 3:
             try:
-                year = parts[0]
-                month = int(parts[1])  # Remove leading zero
-                day = int(parts[2])     # Remove leading zero
-                return f"{month}_{day}_{year}"
-            except (ValueError, IndexError):
+                return f"{int(parts[1])}_{int(parts[2])}_{parts[0]}"
+            except ValueError:
                 pass
-    
+
     # Fallback: replace slashes and dashes with underscores
     return cleaned.replace('/', '_').replace('-', '_')
 
+@functools.lru_cache(maxsize=256)
 def normalize_duration(duration_str: str) -> str:
     """
     Normalize duration string to 4-digit format (e.g., "01:15" -> "0115")
     Also handles text formats like "Full Day", "Half Day"
     """
     cleaned = duration_str.strip().lower()
-    
+
     # Handle text formats first
-    if 'full' in cleaned and 'day' in cleaned:
-        # Full day - return a representative time (e.g., "0800" for 8 hours)
-        # This will match full day duration range
-        return "0800"  # 8:00 AM - represents full day
-    elif 'half' in cleaned and 'day' in cleaned:
-        # Half day - return a representative time (e.g., "0400" for 4 hours)
-        # This will match half day duration range
-        return "0400"  # 4:00 - represents half day
-    
+    if 'day' in cleaned:
+        if 'full' in cleaned:
+            return "0800"  # 8 hours - represents full day
+        if 'half' in cleaned:
+            return "0400"  # 4 hours - represents half day
+
     # Handle time formats like "01:15", "1:15", etc.
     if ':' in cleaned:
-        parts = cleaned.split(':')
-        if len(parts) >= 2:
-            try:
-                hours = int(parts[0].strip())
-                minutes = int(parts[1].strip().split(' ')[0])
-                return f"{hours:02d}{minutes:02d}"
-            except (ValueError, IndexError):
-                pass
-    
+        hours, _, rest = cleaned.partition(':')
+        try:
+            minutes = int(rest.partition(':')[0].strip().partition(' ')[0])
+            return f"{int(hours.strip()):02d}{minutes:02d}"
+        except ValueError:
+            pass
+
     # Extract numbers and pad to 4 digits
     numbers = ''.join(c for c in cleaned if c.isdigit())
     if numbers:
         return numbers.zfill(4)[:4]
-    
+
     return cleaned
 
+# Block line prefixes, matched against the upper-cased head of each line.
+# The longest prefix is 14 characters, so only that much is ever upper-cased.
+JOB_FIELD_PREFIX_RE = re.compile(r"CONFIRMATION #|TEACHER:|TITLE:|DATE:|TIME:|DURATION:|LOCATION:")
+JOB_FIELD_PREFIX_LEN = 14
+
 def parse_job_block(block: str) -> Optional[dict]:
     """
     Parse a job block string into structured data.
     Returns None if parsing fails.
     Normalizes dates and durations for keyword matching.
     """
-    lines = [ln.strip() for ln in block.splitlines() if ln.strip()]
-    
     job_data = {
         'confirmationNumber': '',
         'teacher': '',
@@ -372,38 +512,43 @@ def parse_job_block(block: str) -> Optional[dict]:
         'durationKeyword': '',  # Normalized duration for keyword matching
         'location': '',
     }
-    
-    for line in lines:
-        line_upper = line.upper()
-        if line_upper.startswith('CONFIRMATION #'):
-            job_data['confirmationNumber'] = line.split('#', 1)[1].strip()
-        elif line_upper.startswith('TEACHER:'):
-            job_data['teacher'] = line.split(':', 1)[1].strip()
-        elif line_upper.startswith('TITLE:'):
-            job_data['title'] = line.split(':', 1)[1].strip()
-        elif line_upper.startswith('DATE:'):
-            date_str = line.split(':', 1)[1].strip()
-            job_data['date'] = date_str
-            job_data['dateKeyword'] = normalize_date(date_str)
-        elif line_upper.startswith('TIME:'):
-            time_part = line.split(':', 1)[1].strip()
-            if ' - ' in time_part:
-                parts = time_part.split(' - ', 1)
-                job_data['startTime'] = parts[0].strip()
-                job_data['endTime'] = parts[1].strip() if len(parts) > 1 else ''
+
+    for line in block.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        match = JOB_FIELD_PREFIX_RE.match(line[:JOB_FIELD_PREFIX_LEN].upper())
+        if not match:
+            continue
+        prefix = match.group()
+        if prefix == 'CONFIRMATION #':
+            job_data['confirmationNumber'] = line.partition('#')[2].strip()
+            continue
+        value = line.partition(':')[2].strip()
+        if prefix == 'TEACHER:':
+            job_data['teacher'] = value
+        elif prefix == 'TITLE:':
+            job_data['title'] = value
+        elif prefix == 'DATE:':
+            job_data['date'] = value
+            job_data['dateKeyword'] = normalize_date(value)
+        elif prefix == 'TIME:':
+            start, sep, end = value.partition(' - ')
+            if sep:
+                job_data['startTime'] = start.strip()
+                job_data['endTime'] = end.strip()
             else:
-                job_data['startTime'] = time_part
-        elif line_upper.startswith('DURATION:'):
-            duration_str = line.split(':', 1)[1].strip()
-            job_data['duration'] = duration_str
-            job_data['durationKeyword'] = normalize_duration(duration_str)
-        elif line_upper.startswith('LOCATION:'):
-            job_data['location'] = line.split(':', 1)[1].strip()
-    
+                job_data['startTime'] = value
+        elif prefix == 'DURATION:':
+            job_data['duration'] = value
+            job_data['durationKeyword'] = normalize_duration(value)
+        else:
+            job_data['location'] = value
+
     # Require at least confirmation number and date
     if not job_data['confirmationNumber'] or not job_data['date']:
         return None
-    
+
     return job_data
 
 def construct_job_url(job_id: str) -> str:
@@ -412,284 +557,2906 @@ def construct_job_url(job_id: str) -> str:
     Adjust this based on actual Frontline URL structure.
     """
     # This is a placeholder - adjust based on actual Frontline URL pattern
-    base_url = "https://absencesub.frontlineeducation.com/Substitute/Home"
+    base_url = jobs_url()
     return f"{base_url}#/job/{job_id}"
 
-def publish_job_event(job_block: str) -> bool:
-    """
-    Parse job block and publish to Firestore if not already exists.
-    Returns True if published, False if skipped (already exists).
-    """
-    job_data = parse_job_block(job_block)
-    if not job_data:
-        log(f"[publish] Failed to parse job block, skipping")
-        return False
+def build_job_notification(job_data: dict, controller_id: str, district_id: str) -> str:
+    """Build a nicely formatted NTFY message with job details."""
+    job_id = job_data.get('confirmationNumber')
+    message_parts = ["🆕 NEW FRONTLINE JOB", ""]
     
-    job_id = job_data['confirmationNumber']
-    date = job_data['date']
-    start_time = job_data['startTime']
-    location = job_data['location']
+    # Add key job details in a readable format
+    if job_data.get('date'):
+        message_parts.append(f"📅 Date: {job_data['date']}")
     
-    # Generate stable event ID
-    event_id = generate_event_id(DISTRICT_ID, job_id, date, start_time, location)
+    if job_data.get('startTime'):
+        time_str = job_data['startTime']
+        if job_data.get('endTime'):
+            time_str += f" - {job_data['endTime']}"
+        message_parts.append(f"⏰ Time: {time_str}")
+    
+    if job_data.get('duration'):
+        message_parts.append(f"⏱️  Duration: {job_data['duration']}")
+    
+    if job_data.get('location'):
+        message_parts.append(f"📍 Location: {job_data['location']}")
+    
+    if job_data.get('teacher'):
+        message_parts.append(f"👤 Teacher: {job_data['teacher']}")
+    
+    if job_data.get('title'):
+        message_parts.append(f"📚 Title: {job_data['title']}")
+    
+    if job_id:
+        message_parts.append(f"🔢 Confirmation #: {job_id}")
     
-    # Check if event already exists
-    event_ref = db.collection('job_events').document(event_id)
+    message_parts.append("")  # Empty line before metadata
+    message_parts.append(f"Controller: {controller_id}")
+    message_parts.append(f"District: {district_id}")
+    
+    return "\n".join(message_parts)
+
+def notify_new_job(job_data: dict, controller_id: str, district_id: str) -> None:
+    """
+    Send the NTFY notification for a newly published job.
+    Non-critical: errors are logged, the job event is already in Firestore.
+    """
+    job_id = job_data.get('confirmationNumber')
     try:
-        if event_ref.get().exists:
-            log(f"[publish] Event {event_id[:16]}... already exists, skipping")
-            return False
+        notify(build_job_notification(job_data, controller_id, district_id), controller_id)
+        log(f"[notify] Sent NTFY notification for job {job_id} to {get_ntfy_topic(controller_id)}")
     except Exception as e:
-        log(f"[publish] Error checking event existence: {e}")
-        return False
+        # Log but don't fail - job event was already written to Firestore
+        log(f"[notify] Warning: Failed to send NTFY notification (job event still recorded): {e}")
+
+async def notify_new_job_async(job_data: dict, controller_id: str, district_id: str) -> bool:
+    """notify_new_job() through the pooled notifier, retrying up to NTFY_JOB_RETRIES times."""
+    job_id = job_data.get('confirmationNumber')
+    message = build_job_notification(job_data, controller_id, district_id)
+    sent = await notifier.send(message, controller_id, retries=NTFY_JOB_RETRIES)
+    if sent:
+        log(f"[notify] Sent NTFY notification for job {job_id} to {get_ntfy_topic(controller_id)}")
+    else:
+        # Log but don't fail - job event was already written to Firestore
+        log(f"[notify] Warning: Failed to send NTFY notification for job {job_id} (job event still recorded)")
+    return sent
+
+def job_event_id(district_id: str, job_data: dict) -> str:
+    """Stable event ID (generate_event_id) for a parsed job."""
+    return generate_event_id(
+        district_id, job_data['confirmationNumber'], job_data['date'], job_data['startTime'], job_data['location'],
+    )
+
+def build_job_event(job_block: str, job_data: dict, controller_id: str, district_id: str) -> tuple[str, dict]:
+    """Return (event_id, job_events document) for a parsed job block."""
+    from firebase_admin import firestore  # already imported by init_firebase()
+    job_id = job_data['confirmationNumber']
     
-    # Extract keywords from snapshot text (including normalized date/duration)
-    keywords = extract_keywords(job_block, job_data)
+    # Generate stable event ID
+    event_id = job_event_id(district_id, job_data)
     
-    # Construct job URL
-    job_url = construct_job_url(job_id)
+    # Extract keywords from snapshot text (including normalized date/duration),
+    # plus canonical tags for known phrases ("physical education" -> "pe")
+    keywords = extract_keywords(job_block, job_data)
+    if phrase_tagger is not None:
+        tags = phrase_tagger.tags(job_block)
+        if not tags.issubset(keywords):
+            keywords = sorted(tags.union(keywords))
+
+    # Canonical school fields for the location, so filters on level or city are exact
+    # lookups on jobData. They stay out of keywords: matchesKeyword() checks keywords
+    # for every include/exclude term, and a city or school type there would change
+    # which jobs existing users' keywords match.
+    school_index = current_school_index()
+    school = school_index.lookup(job_data.get('location', '')) if school_index is not None else None
+    if school is not None:
+        job_data = {**job_data, **school}
     
     # Build job event document
     job_event = {
         'source': 'frontline',
-        'controllerId': CONTROLLER_ID,
-        'districtId': DISTRICT_ID,
+        'controllerId': controller_id,
+        'districtId': district_id,
         'jobId': job_id,
-        'jobUrl': job_url,
+        'jobUrl': construct_job_url(job_id),
         'snapshotText': job_block,
         'keywords': keywords,
         'createdAt': firestore.SERVER_TIMESTAMP,
         'jobData': job_data,
     }
-    
-    # Write to Firestore (critical - must succeed)
+    if JOB_EVENT_SCHEMA_VERSION >= 2:
+        job_event = compact_job_event(job_event)
+    return event_id, job_event
+
+# Per-job publish results
+PUBLISHED = "published"
+ALREADY_EXISTS = "already-exists"
+PUBLISH_FAILED = "failed"
+
+# Firestore allows at most 500 writes per batch
+FIRESTORE_BATCH_LIMIT = 500
+
+def _commit_creates(chunk: list[tuple]) -> None:
+    """Create every (ref, doc) in one atomic batch (at most FIRESTORE_BATCH_LIMIT). Raises on any conflict."""
+    batch = db.batch()
+    for ref, doc in chunk:
+        batch.create(ref, doc)
+    batch.commit()
+
+def _create_each(pending: list[tuple]) -> dict:
+    """Slow path: create documents one by one. Returns {ref.id: status}."""
+    from google.api_core.exceptions import Conflict
+    results = {}
+    for ref, doc in pending:
+        try:
+            ref.create(doc)
+            results[ref.id] = PUBLISHED
+        except Conflict:
+            results[ref.id] = ALREADY_EXISTS
+        except Exception as e:
+            log(f"[publish] ❌ Error publishing event {ref.id[:16]}... to Firestore: {e}")
+            results[ref.id] = PUBLISH_FAILED
+    return results
+
+def _write_chunk(chunk: list[tuple]) -> dict:
+    """
+    Create-if-absent write of one batch-sized chunk. Returns {ref.id: status}.
+    Fast path is a single batched create with no existence read; only if that
+    batch hits an existing document do we read the chunk's refs at once and
+    retry with just the new ones. A failed batch writes nothing, so the
+    existence read only ever sees documents from other writers.
+    """
+    from google.api_core.exceptions import Conflict
     try:
-        event_ref.set(job_event)
-        log(f"[publish] ✅ Published job event: {event_id[:16]}... (jobId: {job_id})")
+        _commit_creates(chunk)
+        return {ref.id: PUBLISHED for ref, _ in chunk}
+    except Conflict:
+        pass
     except Exception as e:
-        log(f"[publish] ❌ Error publishing event to Firestore: {e}")
-        return False
-    
-    # Send NTFY notification (non-critical - don't fail if this errors)
-    # This is separate so Firestore write success is independent of notification
+        log(f"[publish] ❌ Batched publish failed, retrying per event: {e}")
+        return _create_each(chunk)
+
+    # Some events already exist: one multi-document read to find which
+    results = {}
     try:
-        # Build a nicely formatted notification message with job details
-        message_parts = ["🆕 NEW FRONTLINE JOB", ""]
-        
-        # Add key job details in a readable format
-        if job_data.get('date'):
-            message_parts.append(f"📅 Date: {job_data['date']}")
-        
-        if job_data.get('startTime'):
-            time_str = job_data['startTime']
-            if job_data.get('endTime'):
-                time_str += f" - {job_data['endTime']}"
-            message_parts.append(f"⏰ Time: {time_str}")
-        
-        if job_data.get('duration'):
-            message_parts.append(f"⏱️  Duration: {job_data['duration']}")
-        
-        if job_data.get('location'):
-            message_parts.append(f"📍 Location: {job_data['location']}")
-        
-        if job_data.get('teacher'):
-            message_parts.append(f"👤 Teacher: {job_data['teacher']}")
-        
-        if job_data.get('title'):
-            message_parts.append(f"📚 Title: {job_data['title']}")
-        
-        if job_id:
-            message_parts.append(f"🔢 Confirmation #: {job_id}")
-        
-        message_parts.append("")  # Empty line before metadata
-        message_parts.append(f"Controller: {CONTROLLER_ID}")
-        message_parts.append(f"District: {DISTRICT_ID}")
-        
-        message = "\n".join(message_parts)
-        notify(message)
-        log(f"[notify] Sent NTFY notification for job {job_id} to {get_ntfy_topic()}")
+        existing = {snap.id for snap in db.get_all([ref for ref, _ in chunk]) if snap.exists}
     except Exception as e:
-        # Log but don't fail - job event was already written to Firestore
-        log(f"[notify] Warning: Failed to send NTFY notification (job event still recorded): {e}")
-    
-    return True
+        log(f"[publish] Error checking event existence: {e}")
+        return _create_each(chunk)
+
+    remaining = []
+    for ref, doc in chunk:
+        if ref.id in existing:
+            results[ref.id] = ALREADY_EXISTS
+        else:
+            remaining.append((ref, doc))
+
+    if remaining:
+        try:
+            _commit_creates(remaining)
+            results.update({ref.id: PUBLISHED for ref, _ in remaining})
+        except Exception:
+            # Lost a race with another controller - settle each event individually
+            results.update(_create_each(remaining))
+    return results
+
+def _write_job_events(pending: list[tuple]) -> dict:
+    """
+    Create-if-absent write of (ref, doc) pairs, one FIRESTORE_BATCH_LIMIT chunk
+    at a time. Returns {ref.id: status}. Conflicts are resolved per chunk, so
+    events committed by an earlier chunk are never mistaken for existing ones.
+    """
+    results = {}
+    for i in range(0, len(pending), FIRESTORE_BATCH_LIMIT):
+        results.update(_write_chunk(pending[i:i + FIRESTORE_BATCH_LIMIT]))
+    return results
+
+def publish_job_events(job_blocks: list[str], controller_id: Optional[str] = None,
+                       district_id: Optional[str] = None, send_notifications: bool = True) -> list[str]:
+    """
+    Parse and publish every job block from one poll in a single batched write,
+    then send NTFY notifications for the newly published ones (unless send_notifications=False).
+    controller_id/district_id default to CONTROLLER_ID/DISTRICT_ID.
+    Returns one status per block: PUBLISHED, ALREADY_EXISTS or PUBLISH_FAILED.
+    """
+    controller_id = controller_id or CONTROLLER_ID
+    district_id = district_id or DISTRICT_ID
+
+    statuses = [PUBLISH_FAILED] * len(job_blocks)
+    parsed = {}  # event_id -> (index, job_data)
+    pending = []
+
+    for i, job_block in enumerate(job_blocks):
+        job_data = parse_job_block(job_block)
+        if not job_data:
+            log(f"[publish] Failed to parse job block, skipping")
+            continue
+        event_id, job_event = build_job_event(job_block, job_data, controller_id, district_id)
+        if event_id in parsed:
+            # Same job twice on one page - report it once
+            statuses[i] = ALREADY_EXISTS
+            continue
+        parsed[event_id] = (i, job_data)
+        pending.append((db.collection('job_events').document(event_id), job_event))
+
+    # Write to Firestore (critical - must succeed)
+    results = _write_job_events(pending)
+
+    for event_id, (i, job_data) in parsed.items():
+        status = results.get(event_id, PUBLISH_FAILED)
+        statuses[i] = status
+        if status == PUBLISHED:
+            log(f"[publish] ✅ Published job event: {event_id[:16]}... (jobId: {job_data['confirmationNumber']})")
+        elif status == ALREADY_EXISTS:
+            log(f"[publish] Event {event_id[:16]}... already exists, skipping")
+
+    # Send NTFY notifications (non-critical - separate from the Firestore write)
+    for event_id, (i, job_data) in parsed.items():
+        if send_notifications and statuses[i] == PUBLISHED:
+            notify_new_job(job_data, controller_id, district_id)
+
+    return statuses
+
+def publish_job_event(job_block: str, controller_id: Optional[str] = None, district_id: Optional[str] = None) -> bool:
+    """
+    Parse job block and publish to Firestore if not already exists.
+    controller_id/district_id default to CONTROLLER_ID/DISTRICT_ID.
+    Returns True if published, False if skipped (already exists).
+    """
+    return publish_job_events([job_block], controller_id, district_id)[0] == PUBLISHED
 
 # ---------------------------------------------------------------------
-# SCRAPING JOB BLOCKS
+# USER MATCHING
 # ---------------------------------------------------------------------
 
-async def try_extract_available_job_blocks(page) -> list[str]:
+# Python port of the dispatcher's matching (functions/index.js: findMatchingUsers /
+# matchesUserFilters). matches_user_filters() follows the JS line by line;
+# UserMatcher gives the same answers from an inverted index, so matching an
+# event costs one pass over its text plus its keyword set instead of one
+# filter evaluation per subscriber.
+
+# Alternative terms (functions/index.js keywordMappings)
+KEYWORD_MAPPINGS = {
+    'pe': ['physical education', 'p.e.', 'p. e.'],
+    'sped': ['special ed', 'special ed.', 'special edu', 'special education'],
+    'esl': ['english sign language'],
+    'ell': ['english language learning', 'english language learner'],
+    'art': ['arts'],
+    'half': ['half day'],
+    'full': ['full day'],
+}
+
+def get_mapped_keywords(term: str, mappings: dict = KEYWORD_MAPPINGS) -> set[str]:
+    """The term plus its direct and reverse mappings (getMappedKeywords)."""
+    term = term.lower().strip()
+    keywords = {term}
+    keywords.update(mappings.get(term, ()))
+    for key, phrases in mappings.items():
+        if term in phrases:
+            keywords.add(key)
+            keywords.update(phrases)
+    return keywords
+
+def _js_truthy(value) -> bool:
+    """JavaScript truthiness (empty lists and dicts are truthy, NaN is not)."""
+    if isinstance(value, (list, dict)):
+        return True
+    if isinstance(value, float) and math.isnan(value):
+        return False
+    return bool(value)
+
+def _js_or(*values):
+    """JavaScript `a || b || c`."""
+    for value in values[:-1]:
+        if _js_truthy(value):
+            return value
+    return values[-1]
+
+def _js_integer(value) -> bool:
+    """Number.isInteger()"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value) and value == int(value)
+
+def normalize_job_date(value) -> Optional[str]:
     """
-    DOM-based extraction from Frontline's real job containers:
-    #availableJobs tbody.job (each has id=<confirmation_number>)
+    jobData.date -> "YYYY-MM-DD" (normalizeJobDate). new Date() parsing is
+    approximated for the formats the watcher publishes ("Mon, 2/9/2026", ISO).
     """
-    jobs = page.locator("#availableJobs tbody.job")
+    if not value or not isinstance(value, str):
+        return None
+    s = value.strip()
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", s, re.ASCII):
+        return s
     try:
-        count = await jobs.count()
-    except Exception:
-        count = 0
+        d = datetime.fromisoformat(s.replace("Z", "+00:00"))
+        if d.tzinfo is not None:
+            d = d.astimezone()
+        return f"{d:%Y-%m-%d}"
+    except ValueError:
+        pass
+    try:
+        month, day, year = (int(p) for p in normalize_date(s).split('_'))
+        return f"{datetime(year, month, day):%Y-%m-%d}"
+    except ValueError:
+        pass
+    for fmt in ("%b %d, %Y", "%B %d, %Y", "%a, %b %d, %Y", "%A, %B %d, %Y"):
+        try:
+            return f"{datetime.strptime(s, fmt):%Y-%m-%d}"
+        except ValueError:
+            continue
+    return None
 
-    job_blocks: list[str] = []
+def parse_time_to_minutes(value) -> Optional[float]:
+    """"8:30 AM" / "13:30" / minutes -> minutes after midnight (parseTimeToMinutes)."""
+    if not _js_truthy(value):
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value if math.isfinite(value) else None
+    if not isinstance(value, str):
+        return None
+    s = value.strip()
+    m = re.fullmatch(r"(\d{1,2}):(\d{2})", s, re.ASCII)
+    if m:
+        return int(m.group(1)) * 60 + int(m.group(2))
+    m = re.fullmatch(r"(\d{1,2}):(\d{2})\s*([AaPp][Mm])", s, re.ASCII)
+    if m:
+        hour = int(m.group(1))
+        ampm = m.group(3).upper()
+        if ampm == "PM" and hour != 12:
+            hour += 12
+        if ampm == "AM" and hour == 12:
+            hour = 0
+        return hour * 60 + int(m.group(2))
+    return None
 
-    for i in range(count):
-        job = jobs.nth(i)
+def ranges_overlap(a_start: float, a_end: float, b_start: float, b_end: float) -> bool:
+    return min(a_start, a_end) < max(b_start, b_end) and min(b_start, b_end) < max(a_start, a_end)
 
-        # confirmation/job id is literally the tbody id
-        job_id = ""
-        try:
-            job_id = (await job.get_attribute("id")) or ""
-        except Exception:
-            job_id = ""
+def is_subscription_active(user: dict, now: Optional[float] = None) -> bool:
+    """subscriptionEndsAt (a Firestore timestamp, i.e. datetime) is in the future."""
+    ends_at = user.get('subscriptionEndsAt')
+    if not isinstance(ends_at, datetime):
+        return False
+    return ends_at.timestamp() > (time.time() if now is None else now)
 
-        async def safe_text(locator_str: str) -> str:
-            try:
-                loc = job.locator(locator_str).first
-                if await loc.count() == 0:
-                    return ""
-                t = (await loc.inner_text()).strip()
-                return t
-            except Exception:
-                return ""
+def _job_window(event: dict) -> tuple[Optional[float], Optional[float]]:
+    job = event.get('jobData') or {}
+    start = parse_time_to_minutes(_js_or(job.get('startTime'), job.get('start'), event.get('startTime')))
+    end = parse_time_to_minutes(_js_or(job.get('endTime'), job.get('end'), event.get('endTime')))
+    return start, end
 
-        teacher = await safe_text("span.name")
-        title = await safe_text("span.title")
-        conf_num = await safe_text("span.confNum")
-        item_date = await safe_text("span.itemDate")
-        start_time = await safe_text("span.startTime")
-        end_time = await safe_text("span.endTime")
-        duration = await safe_text("span.durationName")
-        location = await safe_text("div.locationName")
+def _filter_words(user: dict) -> tuple[list, list]:
+    """(included, excluded) terms, preferring includedLs/excludeLs over automationConfig."""
+    config = _js_or(user.get('automationConfig'), {})
+    config = config if isinstance(config, dict) else {}
+    included = _js_or(user.get('includedLs'), config.get('includedWords'), [])
+    excluded = _js_or(user.get('excludeLs'), config.get('excludedWords'), [])
+    return list(included), list(excluded)
 
-        # --- Robust fallbacks (Frontline DOM changes over time) ---
-        # If the structured selectors fail, try extracting from the tbody text.
-        try:
-            if not item_date or not start_time or not location:
-                tbody_text = " ".join((await job.inner_text()).split())
-
-                # Date patterns: with/without weekday prefix
-                if not item_date:
-                    m = re.search(r"(Mon|Tue|Wed|Thu|Fri|Sat|Sun),\s*\d{1,2}/\d{1,2}/\d{4}", tbody_text)
-                    if m:
-                        item_date = m.group(0)
-                    else:
-                        m2 = re.search(r"\b\d{1,2}/\d{1,2}/\d{4}\b", tbody_text)
-                        if m2:
-                            item_date = m2.group(0)
-
-                # Time window (start/end) like "8:00 AM - 3:00 PM"
-                if not start_time:
-                    mt = re.search(r"\b(\d{1,2}:\d{2}\s*[AP]M)\s*-\s*(\d{1,2}:\d{2}\s*[AP]M)\b", tbody_text, re.IGNORECASE)
-                    if mt:
-                        start_time = mt.group(1).upper().replace("  ", " ").strip()
-                        end_time = mt.group(2).upper().replace("  ", " ").strip()
-
-                # Location: try common label
-                if not location:
-                    ml = re.search(r"LOCATION:\s*([^|]+)$", tbody_text, re.IGNORECASE)
-                    if ml:
-                        location = ml.group(1).strip()
-        except Exception:
-            pass
+def is_eligible_user(user: dict, district_id: Optional[str] = None) -> bool:
+    """The findMatchingUsers() query and automationActive check."""
+    if district_id is not None and district_id not in (user.get('districtIds') or []):
+        return False
+    return user.get('notifyEnabled') is True and _js_truthy(user.get('automationActive'))
+
+def matches_keyword(text: str, keywords: set[str], term: str, mappings: dict = KEYWORD_MAPPINGS) -> bool:
+    """matchesKeyword(): substring of the snapshot text or exact keyword, with mappings."""
+    term = term.lower().strip()
+    if any(k in text or k in keywords for k in get_mapped_keywords(term, mappings)):
+        return True
+    if term == 'half':
+        return not HALF_DAY_DURATIONS.isdisjoint(keywords)
+    if term == 'full':
+        return not FULL_DAY_DURATIONS.isdisjoint(keywords)
+    return False
+
+def matches_user_filters(event: dict, user: dict, now: Optional[float] = None) -> bool:
+    """Per-user check, same semantics as matchesUserFilters() in functions/index.js."""
+    event = expand_job_event(event)
+    job_date = normalize_job_date((event.get('jobData') or {}).get('date'))
+
+    if job_date:
+        if isinstance(user.get('excludedDates'), list) and job_date in user['excludedDates']:
+            return False
+        if isinstance(user.get('scheduledJobDates'), list) and job_date in user['scheduledJobDates']:
+            return False
+        partial = user.get('partialAvailabilityByDate')
+        window = partial.get(job_date) if isinstance(partial, dict) else None
+        if _js_truthy(window) and isinstance(window, dict):
+            start, end = window.get('startMinutes'), window.get('endMinutes')
+            if _js_integer(start) and _js_integer(end):
+                job_start, job_end = _job_window(event)
+                if job_start is not None and job_end is not None and ranges_overlap(job_start, job_end, start, end):
+                    return False
+
+    if not (user.get('applyFilterEnabled') is True and is_subscription_active(user, now)):
+        return True
+
+    text = (event.get('snapshotText') or '').lower()
+    keywords = {k.lower() for k in event.get('keywords') or []}
+    included, excluded = _filter_words(user)
+    if not included and not excluded:
+        return True
+    if included and not any(matches_keyword(text, keywords, term) for term in included):
+        return False
+    return not any(matches_keyword(text, keywords, term) for term in excluded)
+
+def _at_word_boundaries(text: str, start: int, end: int) -> bool:
+    """text[start:end] does not continue a word on either side ("arts" in "parts" does)."""
+    if start > 0 and text[start - 1].isalnum() and text[start].isalnum():
+        return False
+    if end < len(text) and text[end].isalnum() and text[end - 1].isalnum():
+        return False
+    return True
+
+class PhraseAutomaton:
+    """Aho-Corasick automaton: finds every dictionary phrase occurring in a text in one pass."""
+
+    def __init__(self, phrases):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[str, ...]] = [()]
+
+        for phrase in set(phrases):
+            if not phrase:
+                continue
+            node = 0
+            for ch in phrase:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] += (phrase,)
+
+        # Breadth-first so every fail target is finished before it is used
+        queue = collections.deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def find(self, text: str, whole_words: bool = False) -> set[str]:
+        """
+        Every phrase that occurs in text (as a substring). With whole_words, a
+        phrase only counts where it is not joined to letters or digits on either side.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        found: set[str] = set()
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                if not whole_words:
+                    found.update(out[node])
+                    continue
+                for phrase in out[node]:
+                    if phrase not in found and _at_word_boundaries(text, i + 1 - len(phrase), i + 1):
+                        found.add(phrase)
+        return found
+
+class UserMatcher:
+    """
+    Inverted index over one district's subscribers, answering "which users does
+    this job event notify" with the same result as running matches_user_filters()
+    per user.
+
+    - Users without active keyword filters match everything not blocked by availability.
+    - Filter terms are indexed term -> include/exclude user sets; a term's mapped
+      phrases are found in the snapshot text with one PhraseAutomaton pass and in
+      the event keywords with set lookups.
+    - Unavailable days and partial-availability windows are indexed by date.
+    upsert_user()/remove_user() update the index incrementally; follow() keeps it
+    in sync with Firestore.
+    """
+
+    def __init__(self, district_id: Optional[str] = None, mappings: dict = KEYWORD_MAPPINGS):
+        self.district_id = district_id
+        self.mappings = mappings
+        self._lock = threading.RLock()
+        self._users: dict[str, dict] = {}                      # uid -> indexed fields
+        self._unfiltered: set[str] = set()
+        self._exclude_only: set[str] = set()                   # filters with no include terms
+        self._include: dict[str, set[str]] = {}                # term -> uids
+        self._exclude: dict[str, set[str]] = {}                # term -> uids
+        self._phrase_terms: dict[str, set[str]] = {}           # mapped phrase -> terms
+        self._automaton: Optional[PhraseAutomaton] = None
+        self._unavailable: dict[str, set[str]] = {}            # YYYY-MM-DD -> uids
+        self._partial: dict[str, dict[str, tuple]] = {}        # YYYY-MM-DD -> uid -> (start, end)
+        self._expiries: list[tuple[float, str]] = []           # heap of filtered users' subscription ends
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    # -- index maintenance --
+
+    def _add_term(self, postings: dict, term: str, uid: str) -> None:
+        if term not in self._include and term not in self._exclude:
+            for phrase in get_mapped_keywords(term, self.mappings):
+                self._phrase_terms.setdefault(phrase, set()).add(term)
+            self._automaton = None
+        postings.setdefault(term, set()).add(uid)
+
+    def _remove_term(self, postings: dict, term: str, uid: str) -> None:
+        users = postings.get(term)
+        if users is None:
+            return
+        users.discard(uid)
+        if not users:
+            del postings[term]
+            if term not in self._include and term not in self._exclude:
+                for phrase in get_mapped_keywords(term, self.mappings):
+                    terms = self._phrase_terms.get(phrase)
+                    if terms is not None:
+                        terms.discard(term)
+                        if not terms:
+                            del self._phrase_terms[phrase]
+                self._automaton = None
+
+    def _index(self, uid: str, entry: dict) -> None:
+        self._users[uid] = entry
+        for date in entry['unavailable']:
+            self._unavailable.setdefault(date, set()).add(uid)
+        for date, window in entry['partial'].items():
+            self._partial.setdefault(date, {})[uid] = window
+
+        if entry['filtered']:
+            for term in entry['include']:
+                self._add_term(self._include, term, uid)
+            for term in entry['exclude']:
+                self._add_term(self._exclude, term, uid)
+            if not entry['include']:
+                self._exclude_only.add(uid)
+            heapq.heappush(self._expiries, (entry['ends_at'], uid))
+        else:
+            self._unfiltered.add(uid)
+
+    def _unindex(self, uid: str) -> Optional[dict]:
+        entry = self._users.pop(uid, None)
+        if entry is None:
+            return None
+        for date in entry['unavailable']:
+            users = self._unavailable.get(date)
+            if users is not None:
+                users.discard(uid)
+                if not users:
+                    del self._unavailable[date]
+        for date in entry['partial']:
+            windows = self._partial.get(date)
+            if windows is not None:
+                windows.pop(uid, None)
+                if not windows:
+                    del self._partial[date]
+        for term in entry['include']:
+            self._remove_term(self._include, term, uid)
+        for term in entry['exclude']:
+            self._remove_term(self._exclude, term, uid)
+        self._unfiltered.discard(uid)
+        self._exclude_only.discard(uid)
+        return entry
+
+    def upsert_user(self, uid: str, user: dict, now: Optional[float] = None) -> None:
+        """Add or re-index a user document (removes the user if no longer eligible)."""
+        with self._lock:
+            self._unindex(uid)
+            if not is_eligible_user(user, self.district_id):
+                return
+
+            unavailable = set()
+            for field in ('excludedDates', 'scheduledJobDates'):
+                if isinstance(user.get(field), list):
+                    unavailable.update(d for d in user[field] if isinstance(d, str))
+            partial = {}
+            if isinstance(user.get('partialAvailabilityByDate'), dict):
+                for date, window in user['partialAvailabilityByDate'].items():
+                    if _js_truthy(window) and isinstance(window, dict):
+                        start, end = window.get('startMinutes'), window.get('endMinutes')
+                        if _js_integer(start) and _js_integer(end):
+                            partial[date] = (start, end)
+
+            included, excluded = _filter_words(user)
+            active = user.get('applyFilterEnabled') is True and is_subscription_active(user, now)
+            self._index(uid, {
+                'unavailable': unavailable,
+                'partial': partial,
+                'filtered': active and bool(included or excluded),
+                'include': {t.lower().strip() for t in included},
+                'exclude': {t.lower().strip() for t in excluded},
+                'ends_at': user['subscriptionEndsAt'].timestamp() if active else 0.0,
+            })
+
+    def remove_user(self, uid: str) -> None:
+        with self._lock:
+            self._unindex(uid)
+
+    def _expire_subscriptions(self, now: float) -> None:
+        """Users whose subscription ended stop filtering (they match everything)."""
+        while self._expiries and self._expiries[0][0] <= now:
+            ends_at, uid = heapq.heappop(self._expiries)
+            entry = self._users.get(uid)
+            if entry is None or not entry['filtered'] or entry['ends_at'] != ends_at:
+                continue  # stale heap entry
+            self._unindex(uid)
+            self._index(uid, {**entry, 'filtered': False})
+
+    # -- matching --
+
+    def matched_terms(self, event: dict) -> set[str]:
+        """Indexed filter terms that matches_keyword() would accept for this event."""
+        event = expand_job_event(event)
+        with self._lock:
+            if self._automaton is None:
+                self._automaton = PhraseAutomaton(self._phrase_terms)
+            text = (event.get('snapshotText') or '').lower()
+            keywords = {k.lower() for k in event.get('keywords') or []}
+
+            phrases = self._automaton.find(text)
+            phrases.update(k for k in keywords if k in self._phrase_terms)
+            if "" in self._phrase_terms:
+                phrases.add("")  # "".includes("") is always true
+
+            terms: set[str] = set()
+            for phrase in phrases:
+                terms |= self._phrase_terms[phrase]
+            for term, durations in (('half', HALF_DAY_DURATIONS), ('full', FULL_DAY_DURATIONS)):
+                if (term in self._include or term in self._exclude) and not durations.isdisjoint(keywords):
+                    terms.add(term)
+            return terms
+
+    def match(self, event: dict, now: Optional[float] = None) -> set[str]:
+        """uids of every indexed user the event should notify."""
+        event = expand_job_event(event)
+        with self._lock:
+            self._expire_subscriptions(time.time() if now is None else now)
+
+            included: set[str] = set()
+            excluded: set[str] = set()
+            for term in self.matched_terms(event):
+                included |= self._include.get(term, set())
+                excluded |= self._exclude.get(term, set())
+            matched = self._unfiltered | (self._exclude_only - excluded) | (included - excluded)
+
+            job_date = normalize_job_date((event.get('jobData') or {}).get('date'))
+            if job_date:
+                matched -= self._unavailable.get(job_date, set())
+                windows = self._partial.get(job_date)
+                if windows:
+                    job_start, job_end = _job_window(event)
+                    if job_start is not None and job_end is not None:
+                        matched -= {uid for uid, (start, end) in windows.items()
+                                    if ranges_overlap(job_start, job_end, start, end)}
+            return matched
+
+    # -- Firestore sync --
+
+    def load(self, district_id: Optional[str] = None) -> None:
+        """Index every notify-enabled user in the district."""
+        for snap in self._users_query(district_id).stream():
+            self.upsert_user(snap.id, snap.to_dict() or {})
+        log(f"[matcher] Indexed {len(self)} user(s) for {district_id or self.district_id}")
+
+    def follow(self, district_id: Optional[str] = None):
+        """Keep the index in sync with Firestore. Returns the watch (call .unsubscribe() to stop)."""
+        def on_snapshot(docs, changes, read_time):
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    self.remove_user(change.document.id)
+                else:
+                    self.upsert_user(change.document.id, change.document.to_dict() or {})
+        return self._users_query(district_id).on_snapshot(on_snapshot)
+
+    def _users_query(self, district_id: Optional[str]):
+        return (
+            db.collection('users')
+            .where('districtIds', 'array_contains', district_id or self.district_id)
+            .where('notifyEnabled', '==', True)
+        )
+
+# ---------------------------------------------------------------------
+# PHRASE TAGGING
+# ---------------------------------------------------------------------
+
+# Canonical tags added to job event keywords when any of their phrases occurs in
+# the job block, so matching "pe" no longer needs a substring scan for
+# "physical education". PHRASE_TAGS_PATH points at a JSON file of
+# {"tag": ["phrase", ...]} that adds to / overrides the built-in dictionary.
+PHRASE_TAGGING = os.getenv("PHRASE_TAGGING", "1") == "1"
+PHRASE_TAGS_PATH = os.getenv("PHRASE_TAGS_PATH", "")
+
+class PhraseTagger:
+    """Maps every dictionary phrase found as whole words in a text (one automaton pass) to its canonical tags."""
+
+    def __init__(self, dictionary: dict[str, list[str]]):
+        self.phrase_tags: dict[str, set[str]] = {}
+        for tag, phrases in dictionary.items():
+            for phrase in phrases:
+                phrase = phrase.lower().strip()
+                if phrase:
+                    self.phrase_tags.setdefault(phrase, set()).add(tag.lower().strip())
+        self.automaton = PhraseAutomaton(self.phrase_tags)
+
+    def tags(self, text: str) -> set[str]:
+        found: set[str] = set()
+        for phrase in self.automaton.find(text.lower(), whole_words=True):
+            found |= self.phrase_tags[phrase]
+        return found
+
+def load_phrase_tagger(path: str = PHRASE_TAGS_PATH) -> PhraseTagger:
+    """KEYWORD_MAPPINGS plus any tags from PHRASE_TAGS_PATH."""
+    dictionary = dict(KEYWORD_MAPPINGS)
+    if path:
+        try:
+            with open(path, encoding="utf-8") as f:
+                dictionary.update({str(tag): [str(p) for p in phrases] for tag, phrases in json.load(f).items()})
+        except Exception as e:
+            log(f"[tags] Could not load {path}, using built-in phrases only: {e}")
+    return PhraseTagger(dictionary)
+
+phrase_tagger = load_phrase_tagger() if PHRASE_TAGGING else None
+
+# ---------------------------------------------------------------------
+# SCHOOL INDEX
+# ---------------------------------------------------------------------
+
+# Resolve a job's location text to a school from the district's school list and
+# attach its id, type, city and zip to jobData (not the keywords). SCHOOLS_PATH is
+# the list for the environment's district; a district registry entry names its
+# own with "schools".
+SCHOOL_INDEX = os.getenv("SCHOOL_INDEX", "1") == "1"
+SCHOOLS_PATH = os.getenv(
+    "SCHOOLS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "alpine_school_district_schools_ls_of_dicts.json"),
+)
+# difflib ratio a location needs to match a school name it does not contain
+SCHOOL_FUZZY_CUTOFF = 0.85
+
+SCHOOL_NAME_ABBREVIATIONS = {
+    "elem": "elementary", "el": "elementary", "es": "elementary",
+    "mid": "middle", "ms": "middle", "jr": "junior", "jh": "junior high",
+    "hs": "high", "sr": "senior", "acad": "academy",
+}
+SCHOOL_NAME_FILLER = {"school", "sch", "the"}
+
+def normalize_school_name(name: str) -> str:
+    """Lowercase words, abbreviations expanded, filler dropped ("TIMBERLINE MS" -> "timberline middle")."""
+    words = []
+    for word in re.findall(r"[a-z0-9]+", name.lower()):
+        word = SCHOOL_NAME_ABBREVIATIONS.get(word, word)
+        if word not in SCHOOL_NAME_FILLER:
+            words.append(word)
+    return " ".join(words)
+
+def school_id(name: str) -> str:
+    """Stable id from the school's listed name: "Lehi High School" -> "lehi-high-school"."""
+    return "-".join(re.findall(r"[a-z0-9]+", name.lower()))
+
+# Distinct location strings seen per school index; the same few hundred repeat every poll
+SCHOOL_LOOKUP_CACHE_SIZE = 1024
+
+class SchoolIndex:
+    """Normalized-name index over a school list; lookups are memoized per location string."""
+
+    def __init__(self, schools: list[dict]):
+        self.by_name: dict[str, dict] = {}
+        for school in schools:
+            key = normalize_school_name(school.get("name", ""))
+            if key and key not in self.by_name:
+                self.by_name[key] = {
+                    "schoolId": school_id(school["name"]),
+                    "schoolName": school["name"],
+                    # Registry lists may have nulls; keep every field a string
+                    "schoolType": str(school.get("type") or ""),
+                    "schoolCity": str(school.get("city") or ""),
+                    "schoolZip": str(school.get("zip") or ""),
+                }
+        # Longest first, so "lehi junior high" wins over "lehi" inside a location
+        self._keys_longest_first = sorted(self.by_name, key=len, reverse=True)
+        self._lookup = functools.lru_cache(maxsize=SCHOOL_LOOKUP_CACHE_SIZE)(self._match)
+
+    def _match(self, location: str) -> Optional[dict]:
+        key = normalize_school_name(location)
+        if not key:
+            return None
+        if key in self.by_name:
+            return self.by_name[key]
+        padded = f" {key} "
+        for name in self._keys_longest_first:
+            if f" {name} " in padded:
+                return self.by_name[name]
+        close = difflib.get_close_matches(key, self._keys_longest_first, n=1, cutoff=SCHOOL_FUZZY_CUTOFF)
+        return self.by_name[close[0]] if close else None
+
+    def lookup(self, location: str) -> Optional[dict]:
+        """School fields for a location string, or None if no school matches."""
+        return self._lookup(location)
+
+@functools.lru_cache(maxsize=None)
+def load_school_index(path: str) -> Optional[SchoolIndex]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            index = SchoolIndex(json.load(f))
+    except Exception as e:
+        log(f"[schools] Could not load {path}, jobs will not be enriched: {e}")
+        return None
+    log(f"[schools] Indexed {len(index.by_name)} schools from {path}")
+    return index
+
+def current_school_index() -> Optional[SchoolIndex]:
+    """The school index for the current task's district (None if it has no school list)."""
+    if not SCHOOL_INDEX:
+        return None
+    path = district_setting("schools", None) if DISTRICT.get() is not None else SCHOOLS_PATH
+    return load_school_index(path) if path else None
+
+# ---------------------------------------------------------------------
+# JOB EVENT SCHEMA
+# ---------------------------------------------------------------------
+
+# job_events document version written by build_job_event().
+# 1: snapshotText, a keywords array repeating most of its words, and jobData
+#    parsing the same text again.
+# 2: typed job fields, only the keywords the text does not already contain
+#    ("tags"), and the raw text only when the fields do not re-render it exactly.
+# Readers go through expand_job_event() here and expandJobEvent() in
+# functions/index.js, which accept both; deploy the functions before writing 2.
+JOB_EVENT_SCHEMA_VERSION = int(os.getenv("JOB_EVENT_SCHEMA_VERSION", "1"))
+
+JOB_SCHOOL_FIELDS = ('schoolId', 'schoolName', 'schoolType', 'schoolCity', 'schoolZip')
+JOB_TEXT_FIELDS = ('teacher', 'title', 'duration', 'location') + JOB_SCHOOL_FIELDS
+
+JOB_DATE_RE = re.compile(r"(Mon|Tue|Wed|Thu|Fri|Sat|Sun), (\d{1,2})/(\d{1,2})/(\d{4})")
+JOB_CLOCK_RE = re.compile(r"(\d{1,2}):(\d{2}) (AM|PM)")
+
+def render_job_date(day: str) -> str:
+    """ISO day -> jobs page date ("2026-02-09" -> "Mon, 2/9/2026")."""
+    d = datetime.strptime(day, "%Y-%m-%d")
+    return f"{d:%a}, {d.month}/{d.day}/{d.year}"
+
+def render_job_clock(minutes: int) -> str:
+    """480 -> "8:00 AM" (the jobs page format)."""
+    hour, minute = divmod(minutes, 60)
+    return f"{(hour % 12) or 12}:{minute:02d} {'PM' if hour >= 12 else 'AM'}"
+
+def _job_day(date: str) -> Optional[str]:
+    """ISO day for a page date, if rendering it back gives the same text."""
+    m = JOB_DATE_RE.fullmatch(date)
+    if not m:
+        return None
+    try:
+        day = f"{int(m.group(4)):04d}-{int(m.group(2)):02d}-{int(m.group(3)):02d}"
+        return day if render_job_date(day) == date else None
+    except ValueError:
+        return None
+
+def _job_minutes(clock: str) -> Optional[int]:
+    """Minutes after midnight for a page time, if rendering it back gives the same text."""
+    m = JOB_CLOCK_RE.fullmatch(clock)
+    if not m or not 1 <= int(m.group(1)) <= 12:
+        return None
+    minutes = (int(m.group(1)) % 12 + (12 if m.group(3) == "PM" else 0)) * 60 + int(m.group(2))
+    return minutes if render_job_clock(minutes) == clock else None
+
+def job_view(job: dict) -> dict:
+    """jobData-style string fields from a version 2 'job' map."""
+    view = {'confirmationNumber': job.get('confirmationNumber', '')}
+    for key in ('teacher', 'title', 'duration', 'location'):
+        view[key] = job.get(key, '')
+    if 'schoolId' in job:
+        # Empty school fields are not stored
+        for key in JOB_SCHOOL_FIELDS:
+            view[key] = job.get(key, '')
+    view['date'] = render_job_date(job['day']) if 'day' in job else job.get('date', '')
+    for key in ('startTime', 'endTime'):
+        value = job.get(key, '')
+        view[key] = render_job_clock(value) if isinstance(value, int) else value
+    return view
+
+def render_job_text(job: dict) -> str:
+    """The job block a version 2 'job' map stands for (build_job_block() layout)."""
+    view = job_view(job)
+    return build_job_block({
+        'confNum': view['confirmationNumber'],
+        'name': view['teacher'],
+        'title': view['title'],
+        'itemDate': view['date'],
+        'startTime': view['startTime'],
+        'endTime': view['endTime'],
+        'durationName': view['duration'],
+        'locationName': view['location'],
+    })
+
+def compact_job_event(event: dict) -> dict:
+    """Version 2 document for a version 1 job event."""
+    text = event['snapshotText']
+    job_data = event['jobData']
+
+    job = {'confirmationNumber': job_data['confirmationNumber']}
+    for key in JOB_TEXT_FIELDS:
+        if job_data.get(key):
+            job[key] = job_data[key]
+    day = _job_day(job_data['date'])
+    if day:
+        job['day'] = day
+    elif job_data['date']:
+        job['date'] = job_data['date']
+    for key in ('startTime', 'endTime'):
+        if job_data.get(key):
+            minutes = _job_minutes(job_data[key])
+            job[key] = minutes if minutes is not None else job_data[key]
+
+    doc = {key: event[key] for key in ('source', 'controllerId', 'districtId', 'jobId', 'jobUrl', 'createdAt')}
+    doc['schemaVersion'] = 2
+    doc['job'] = job
+    if render_job_text(job) != text:
+        doc['rawText'] = text
+    tags = set(event['keywords']).difference(KEYWORD_RE.findall(text.lower()))
+    if tags:
+        doc['tags'] = sorted(tags)
+    return doc
+
+def expand_job_event(doc: dict) -> dict:
+    """
+    Reader view of a job_events document of either version: snapshotText,
+    keywords and jobData as version 1 has them (jobData without the
+    dateKeyword/durationKeyword helpers, which are in keywords).
+    """
+    if doc.get('schemaVersion', 1) < 2 or 'snapshotText' in doc:
+        return doc
+    text = doc.get('rawText') or render_job_text(doc['job'])
+    keywords = set(KEYWORD_RE.findall(text.lower())).union(doc.get('tags', []))
+    return {**doc, 'snapshotText': text, 'keywords': sorted(keywords), 'jobData': job_view(doc['job'])}
+
+# ---------------------------------------------------------------------
+# DEDUP INDEX
+# ---------------------------------------------------------------------
+
+# Event IDs we know are in Firestore, kept on disk so restarts don't re-read every visible job
+DEDUP_INDEX_MAX_ENTRIES = int(os.getenv("DEDUP_INDEX_MAX_ENTRIES", "5000"))
+# Keep an entry until this many days after the job's date (jobs disappear from the page by then)
+DEDUP_INDEX_DAYS_AFTER_JOB = int(os.getenv("DEDUP_INDEX_DAYS_AFTER_JOB", "1"))
+# Entries whose job date can't be parsed
+DEDUP_INDEX_DEFAULT_TTL_DAYS = 7
+
+def get_dedup_index_path(controller_id: str) -> str:
+    """
+    Per-controller index file, so controllers sharing a process never share one.
+    DEDUP_INDEX_PATH may be a directory, a template containing "{controller_id}",
+    or a .json path that gets "_<controller_id>" inserted before the extension.
+    """
+    path = os.getenv("DEDUP_INDEX_PATH", "/opt/frontline-watcher")
+    if "{controller_id}" in path:
+        return path.replace("{controller_id}", controller_id)
+    if path.endswith(".json"):
+        return f"{path[:-len('.json')]}_{controller_id}.json"
+    return os.path.join(path, f"dedup_index_{controller_id}.json")
+
+class DedupIndex:
+    """
+    Bounded on-disk set of published event IDs.
+    Entries expire after their job date (TTL) and the least recently seen
+    entries are evicted beyond max_entries (LRU). Saves are atomic
+    (write temp file, fsync, rename), so a crash never leaves a torn index.
+    """
+
+    def __init__(self, path: str, max_entries: int = DEDUP_INDEX_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries: dict[str, float] = {}  # event_id -> expiry (unix time), in LRU order
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.entries = {k: float(v) for k, v in data.get("entries", {}).items()}
+            self.expire()
+            log(f"[dedup] Loaded {len(self.entries)} event(s) from {self.path}")
+        except FileNotFoundError:
+            log(f"[dedup] No index at {self.path}, starting empty")
+        except Exception as e:
+            log(f"[dedup] Could not read {self.path}, starting empty: {e}")
+            self.entries = {}
+
+    @staticmethod
+    def expiry_for(job_data: dict) -> float:
+        """Unix time after which a job's entry is no longer needed."""
+        try:
+            month, day, year = (int(p) for p in job_data.get('dateKeyword', '').split('_'))
+            job_day = datetime(year, month, day, tzinfo=timezone.utc)
+            return (job_day + timedelta(days=DEDUP_INDEX_DAYS_AFTER_JOB + 1)).timestamp()
+        except ValueError:
+            return time.time() + DEDUP_INDEX_DEFAULT_TTL_DAYS * 86400
+
+    def __contains__(self, event_id: str) -> bool:
+        expiry = self.entries.get(event_id)
+        if expiry is None:
+            return False
+        if expiry < time.time():
+            del self.entries[event_id]
+            self._dirty = True
+            return False
+        # Refresh LRU position
+        self.entries[event_id] = self.entries.pop(event_id)
+        return True
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, event_id: str, job_data: dict) -> None:
+        self.entries.pop(event_id, None)
+        self.entries[event_id] = self.expiry_for(job_data)
+        while len(self.entries) > self.max_entries:
+            del self.entries[next(iter(self.entries))]
+        self._dirty = True
+
+    def expire(self) -> None:
+        now = time.time()
+        expired = [k for k, v in self.entries.items() if v < now]
+        for k in expired:
+            del self.entries[k]
+        if expired:
+            self._dirty = True
+
+    def save(self) -> None:
+        """Atomically write the index if it changed."""
+        self.expire()
+        if not self._dirty:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "entries": self.entries}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except Exception as e:
+            log(f"[dedup] Could not save {self.path}: {e}")
+
+# ---------------------------------------------------------------------
+# SNAPSHOT DIFF
+# ---------------------------------------------------------------------
+
+def fingerprint(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+class SnapshotDiff:
+    """
+    Compares each poll's snapshot with the previous one.
+    update() returns None when the page is unchanged, otherwise the
+    (added, removed) job blocks since the last poll.
+    """
+
+    def __init__(self):
+        self.snapshot_fingerprint: Optional[str] = None
+        self.blocks: dict[str, str] = {}  # block fingerprint -> block
+
+    def update(self, snapshot: str) -> Optional[tuple[list[str], list[str]]]:
+        snapshot_fp = fingerprint(snapshot)
+        if snapshot_fp == self.snapshot_fingerprint:
+            return None
+
+        current: dict[str, str] = {}
+        if snapshot != "NO_AVAILABLE_JOBS":
+            for block in snapshot.split("\n\n"):
+                block = block.strip()
+                if block:
+                    current[fingerprint(block)] = block
+
+        added = [block for fp, block in current.items() if fp not in self.blocks]
+        removed = [block for fp, block in self.blocks.items() if fp not in current]
+        self.blocks = current
+        self.snapshot_fingerprint = snapshot_fp
+        return added, removed
+
+    def forget(self, block: str) -> None:
+        """Report block as added again on the next poll (e.g. after a failed publish)."""
+        self.blocks.pop(fingerprint(block), None)
+        self.snapshot_fingerprint = None
+
+    def job_count(self) -> int:
+        return len(self.blocks)
+
+# ---------------------------------------------------------------------
+# METRICS
+# ---------------------------------------------------------------------
+
+# Prometheus text endpoint on METRICS_HOST:METRICS_PORT (0 = off) and/or a JSON
+# snapshot rewritten every METRICS_JSON_INTERVAL_SECONDS (empty path = off)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_JSON_PATH = os.getenv("METRICS_JSON_PATH", "")
+METRICS_JSON_INTERVAL_SECONDS = float(os.getenv("METRICS_JSON_INTERVAL_SECONDS", "60"))
+# Most recent samples per stage used for the JSON percentiles
+METRICS_WINDOW = 1000
+
+# Histogram bucket upper bounds in seconds
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Stages timed per controller: reload, page_wait (poll waiting on a page load;
+# below reload when double buffered), extract, parse (per job block), dedup
+# (per job), firestore (per batch), notify (per alert or digest),
+# first_seen_to_notify (poll that found a job -> its alert delivered) and
+# unauthenticated (landing on the login page -> polling again), http_poll
+# (one browserless feed request) and recycle (memory governor page/context swap)
+
+METRIC_COUNTERS = {
+    "polls": "Completed polls",
+    "reload_errors": "Reloads that failed and fell back to goto",
+    "session_expired": "Polls that landed on the login page",
+    "unauthenticated_seconds": "Time from landing on the login page to polling again",
+    "session_refreshes": "Sessions renewed ahead of expiry",
+    "session_refresh_failures": "Background session renewals that failed",
+    "http_not_modified": "Browserless polls answered 304 Not Modified",
+    "http_fallbacks": "Browserless polls handed back to the browser",
+    "new_jobs": "Job blocks that appeared since the previous poll",
+    "published": "Job events written to Firestore",
+    "already_exists": "Job events another controller had already written",
+    "publish_failures": "Job events that failed to write",
+    "notifications_sent": "Alerts and digests delivered",
+    "notification_failures": "Alerts and digests that were not delivered",
+    "page_recycles": "Jobs pages replaced by the memory governor",
+    "context_recycles": "Browser contexts replaced by the memory governor",
+    "recycle_errors": "Memory governor recycles that failed (the old page or context was kept)",
+}
+
+METRIC_GAUGES = {
+    "js_heap_bytes": "JS heap used by the current jobs page",
+    "browser_rss_bytes": "Resident memory of the browser process tree",
+    "process_rss_bytes": "Resident memory of the watcher process",
+    "time_to_first_poll_seconds": "Process start (or controller restart) to the first completed poll, excluding the offset",
+}
+
+# Reference point for time_to_first_poll_seconds on each controller's first run
+PROCESS_STARTED = time.monotonic()
+
+class Histogram:
+    """Cumulative-bucket histogram plus a window of recent samples for percentiles."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(METRICS_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.recent: collections.deque = collections.deque(maxlen=METRICS_WINDOW)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+        for i, bound in enumerate(METRICS_BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+class Metrics:
+    """
+    Stage latency histograms, counters and gauges per controller, shared by every
+    controller in the process. Read by the metrics endpoint thread, so all
+    access goes through one lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: dict[tuple[str, str], Histogram] = {}  # (controller_id, stage) -> histogram
+        self._counters: dict[tuple[str, str], float] = {}        # (controller_id, counter) -> value
+        self._gauges: dict[tuple[str, str], float] = {}          # (controller_id, gauge) -> value
+        self._districts: dict[str, str] = {}                     # controller_id -> district_id label
+        self._json_written = 0.0
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def observe(self, stage: str, seconds: float, controller_id: Optional[str] = None) -> None:
+        key = (controller_id or CONTROLLER_ID or "", stage)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, counter: str, controller_id: Optional[str] = None, n: float = 1) -> None:
+        key = (controller_id or CONTROLLER_ID or "", counter)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def set(self, gauge: str, value: float, controller_id: Optional[str] = None) -> None:
+        key = (controller_id or CONTROLLER_ID or "", gauge)
+        with self._lock:
+            self._gauges[key] = value
+
+    def set_district(self, controller_id: str, district_id: str) -> None:
+        """Label a controller's series with its district."""
+        with self._lock:
+            self._districts[controller_id] = district_id
+
+    def _labels(self, controller_id: str) -> str:
+        district_id = self._districts.get(controller_id)
+        return f'controller="{controller_id}",district="{district_id}"' if district_id else f'controller="{controller_id}"'
+
+    def get(self, gauge: str, controller_id: Optional[str] = None) -> Optional[float]:
+        with self._lock:
+            return self._gauges.get((controller_id or CONTROLLER_ID or "", gauge))
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines.append("# HELP frontline_watcher_stage_seconds Time spent per watch loop stage")
+            lines.append("# TYPE frontline_watcher_stage_seconds histogram")
+            for (controller_id, stage), h in sorted(self._histograms.items()):
+                labels = f'{self._labels(controller_id)},stage="{stage}"'
+                for bound, n in zip(METRICS_BUCKETS, h.bucket_counts):
+                    lines.append(f'frontline_watcher_stage_seconds_bucket{{{labels},le="{bound}"}} {n}')
+                lines.append(f'frontline_watcher_stage_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"frontline_watcher_stage_seconds_sum{{{labels}}} {h.sum:.6f}")
+                lines.append(f"frontline_watcher_stage_seconds_count{{{labels}}} {h.count}")
+
+            for counter, help_text in METRIC_COUNTERS.items():
+                name = f"frontline_watcher_{counter}_total"
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for (controller_id, key), value in sorted(self._counters.items()):
+                    if key == counter:
+                        lines.append(f'{name}{{{self._labels(controller_id)}}} {value}')
+
+            for gauge, help_text in METRIC_GAUGES.items():
+                name = f"frontline_watcher_{gauge}"
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                for (controller_id, key), value in sorted(self._gauges.items()):
+                    if key == gauge:
+                        lines.append(f'{name}{{{self._labels(controller_id)}}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Counters, gauges and recent-window percentiles per controller, for the JSON file."""
+        controllers: dict[str, dict] = {}
+        with self._lock:
+            for (controller_id, stage), h in self._histograms.items():
+                stages = controllers.setdefault(controller_id, {"stages": {}, "counters": {}, "gauges": {}})["stages"]
+                stages[stage] = {
+                    "count": h.count,
+                    "sum": round(h.sum, 6),
+                    **{name: h.percentile(q) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+                }
+            for (controller_id, counter), value in self._counters.items():
+                controllers.setdefault(controller_id, {"stages": {}, "counters": {}, "gauges": {}})["counters"][counter] = value
+            for (controller_id, gauge), value in self._gauges.items():
+                controllers.setdefault(controller_id, {"stages": {}, "counters": {}, "gauges": {}})["gauges"][gauge] = value
+            for controller_id, district_id in self._districts.items():
+                if controller_id in controllers:
+                    controllers[controller_id]["district"] = district_id
+        return {"updatedAt": datetime.now(timezone.utc).isoformat(), "controllers": controllers}
+
+    def maybe_write_json(self, path: str = METRICS_JSON_PATH) -> None:
+        """Atomically rewrite the JSON snapshot if METRICS_JSON_INTERVAL_SECONDS has passed."""
+        if not path or time.monotonic() - self._json_written < METRICS_JSON_INTERVAL_SECONDS:
+            return
+        self._json_written = time.monotonic()
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            log(f"[metrics] Could not write {path}: {e}")
+
+    def serve(self, host: str = METRICS_HOST, port: int = METRICS_PORT) -> None:
+        """Serve /metrics from a daemon thread."""
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            log(f"[metrics] Could not listen on {host}:{port}: {e}")
+            return
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        log(f"[metrics] Serving Prometheus metrics on http://{host}:{port}/metrics")
+
+def start_metrics() -> None:
+    """Start the configured metrics exports (called once per process)."""
+    if METRICS_PORT:
+        metrics.serve()
+    if METRICS_JSON_PATH:
+        log(f"[metrics] Writing metrics to {METRICS_JSON_PATH} every {METRICS_JSON_INTERVAL_SECONDS:.0f}s")
+
+# Shared by all controllers in the process
+metrics = Metrics()
+
+# ---------------------------------------------------------------------
+# NOTIFICATION COALESCING
+# ---------------------------------------------------------------------
+
+# Jobs published within this many seconds of an alert are sent as one digest
+# when the window closes (0 = only coalesce jobs found in the same poll)
+NOTIFY_COALESCE_WINDOW_SECONDS = float(os.getenv("NOTIFY_COALESCE_WINDOW_SECONDS", "0"))
+
+def build_digest_notification(jobs: list[dict], controller_id: str, district_id: str) -> str:
+    """One NTFY message listing several jobs, soonest first."""
+    message_parts = [f"🆕 {len(jobs)} NEW FRONTLINE JOBS"]
+
+    for job_data in sorted(jobs, key=job_priority):
+        message_parts.append("")
+        when = job_data.get('date', '')
+        if job_data.get('startTime'):
+            time_str = job_data['startTime']
+            if job_data.get('endTime'):
+                time_str += f" - {job_data['endTime']}"
+            when += f" ⏰ {time_str}"
+        message_parts.append(f"📅 {when}")
+        if job_data.get('location'):
+            message_parts.append(f"📍 {job_data['location']}")
+        details = [job_data[k] for k in ('title', 'teacher', 'duration') if job_data.get(k)]
+        if details:
+            message_parts.append(f"📚 {' · '.join(details)}")
+        message_parts.append(f"🔢 Confirmation #: {job_data.get('confirmationNumber')}")
+
+    message_parts.append("")  # Empty line before metadata
+    message_parts.append(f"Controller: {controller_id}")
+    message_parts.append(f"District: {district_id}")
+
+    return "\n".join(message_parts)
+
+class NotificationCoalescer:
+    """
+    Turns bursts of new jobs into digest alerts.
+    Jobs from one publish batch go out together; a lone job outside a window
+    goes out immediately. Jobs arriving within NOTIFY_COALESCE_WINDOW_SECONDS of
+    the last alert wait for the window to close and are sent as one digest.
+    add() never waits for delivery: sends run as tasks, so ntfy retries and
+    backoff never hold up the caller.
+    """
+
+    def __init__(self, controller_id: str, district_id: str, window: float = NOTIFY_COALESCE_WINDOW_SECONDS):
+        self.controller_id = controller_id
+        self.district_id = district_id
+        self.window = window
+        self._last_sent = float("-inf")
+        self._pending: list[dict] = []
+        self._first_seen: dict[str, float] = {}  # confirmation number -> monotonic time first seen
+        self._flush_task: Optional[asyncio.Task] = None
+        self._sends: set[asyncio.Task] = set()
+
+    def _start_send(self, jobs: list[dict]) -> None:
+        # Start the window now, so jobs added before the task runs join the next digest
+        self._last_sent = time.monotonic()
+        task = asyncio.create_task(self._send_logged(jobs))
+        self._sends.add(task)
+        task.add_done_callback(self._sends.discard)
+
+    async def _send_logged(self, jobs: list[dict]) -> None:
+        try:
+            await self._send(jobs)
+        except Exception as e:
+            log(f"[notify] Error sending alert for {len(jobs)} job(s): {e}")
+            metrics.inc("notification_failures", self.controller_id)
+
+    async def _send(self, jobs: list[dict]) -> None:
+        self._last_sent = started = time.monotonic()
+        if len(jobs) == 1:
+            delivered = await notify_new_job_async(jobs[0], self.controller_id, self.district_id)
+        else:
+            message = build_digest_notification(jobs, self.controller_id, self.district_id)
+            delivered = await notifier.send(message, self.controller_id, retries=NTFY_JOB_RETRIES)
+            if delivered:
+                job_ids = ", ".join(str(j.get('confirmationNumber')) for j in sorted(jobs, key=job_priority))
+                log(f"[notify] Sent digest for {len(jobs)} jobs ({job_ids}) to {get_ntfy_topic(self.controller_id)}")
+            else:
+                log(f"[notify] Warning: Failed to send digest for {len(jobs)} jobs (job events still recorded)")
+
+        finished = time.monotonic()
+        metrics.observe("notify", finished - started, self.controller_id)
+        metrics.inc("notifications_sent" if delivered else "notification_failures", self.controller_id)
+        for job in jobs:
+            seen_at = self._first_seen.pop(str(job.get('confirmationNumber')), None)
+            if delivered and seen_at is not None:
+                metrics.observe("first_seen_to_notify", finished - seen_at, self.controller_id)
+
+    async def _flush_after(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        jobs, self._pending = self._pending, []
+        if jobs:
+            await self._send_logged(jobs)
+
+    def add(self, jobs: list[dict], first_seen: Optional[dict[str, float]] = None) -> None:
+        """
+        Alert for newly published jobs (starts sending now, or joins the open window).
+        first_seen maps confirmation number -> time.monotonic() when the job was found.
+        """
+        if not jobs:
+            return
+        if first_seen:
+            self._first_seen.update(first_seen)
+        if self._flush_task and not self._flush_task.done():
+            self._pending.extend(jobs)
+            return
+
+        remaining = self._last_sent + self.window - time.monotonic()
+        if remaining > 0:
+            self._pending.extend(jobs)
+            self._flush_task = asyncio.create_task(self._flush_after(remaining))
+            return
+
+        self._start_send(jobs)
+
+    async def close(self) -> None:
+        """Send anything still waiting for its window and wait for sends in flight."""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        jobs, self._pending = self._pending, []
+        if jobs:
+            self._start_send(jobs)
+        if self._sends:
+            await asyncio.gather(*self._sends, return_exceptions=True)
+
+# ---------------------------------------------------------------------
+# PUBLISH PIPELINE
+# ---------------------------------------------------------------------
+
+# Firestore and ntfy.sh calls are blocking; workers run them on threads so a
+# slow backend never delays the next reload.
+PUBLISH_WORKERS = int(os.getenv("PUBLISH_WORKERS", "2"))
+
+def job_priority(job_data: dict) -> tuple:
+    """Sort key putting the soonest job (date, then start time) first."""
+    parts = job_data.get('dateKeyword', '').split('_')
+    try:
+        month, day, year = (int(p) for p in parts)
+        job_date = (year, month, day)
+    except ValueError:
+        job_date = (9999, 12, 31)
+
+    start = re.match(r"(\d{1,2}):(\d{2})\s*([AP]M)?", job_data.get('startTime', ''), re.IGNORECASE)
+    minutes = 24 * 60
+    if start:
+        hour = int(start.group(1)) % 12 if start.group(3) else int(start.group(1))
+        if start.group(3) and start.group(3).upper() == "PM":
+            hour += 12
+        minutes = hour * 60 + int(start.group(2))
+    return job_date + (minutes,)
+
+class PublishPipeline:
+    """
+    Priority queue of parsed jobs drained by PUBLISH_WORKERS workers.
+    Each worker takes everything queued (soonest job first), publishes it with one
+    publish_job_events() batch on a thread, then hands the new jobs to a
+    NotificationCoalescer (one digest per burst).
+    on_result(block, job_data, status) is called on the event loop for every job.
+    """
+
+    def __init__(self, controller_id: str, district_id: str, on_result, workers: int = PUBLISH_WORKERS):
+        self.controller_id = controller_id
+        self.district_id = district_id
+        self.on_result = on_result
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self.pending_job_ids: set[str] = set()
+        self.coalescer = NotificationCoalescer(controller_id, district_id)
+        self._seq = 0
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(max(1, workers))]
+
+    def submit(self, block: str, job_data: dict) -> bool:
+        """Queue a job for publishing. Returns False if it is already queued or in flight."""
+        job_id = job_data['confirmationNumber']
+        if job_id in self.pending_job_ids:
+            return False
+        self.pending_job_ids.add(job_id)
+        self._seq += 1
+        self.queue.put_nowait((job_priority(job_data), self._seq, time.monotonic(), block, job_data))
+        return True
+
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            items = [await self.queue.get()]
+            while not self.queue.empty():
+                items.append(self.queue.get_nowait())
+            await firebase_ready()
+
+            started = time.monotonic()
+            waited = started - min(item[2] for item in items)
+            blocks = [item[3] for item in items]
+            try:
+                statuses = await asyncio.to_thread(
+                    publish_job_events, blocks, self.controller_id, self.district_id, False,
+                )
+            except Exception as e:
+                log(f"[pipeline] Worker {n} publish error: {e}")
+                statuses = [PUBLISH_FAILED] * len(items)
+            published_at = time.monotonic()
+            metrics.observe("firestore", published_at - started, self.controller_id)
+
+            # Record results before notifying, so the dedup index and pending set
+            # are up to date while alerts are still being delivered
+            for item, status in zip(items, statuses):
+                self.pending_job_ids.discard(item[4]['confirmationNumber'])
+                try:
+                    self.on_result(item[3], item[4], status)
+                except Exception as e:
+                    log(f"[pipeline] Worker {n} result handler error: {e}")
+                self.queue.task_done()
+
+            # Items come off the priority queue soonest-first; a job is submitted
+            # in the poll that found it, so its queue time is when it was first seen
+            published = [item for item, status in zip(items, statuses) if status == PUBLISHED]
+            try:
+                self.coalescer.add(
+                    [item[4] for item in published],
+                    first_seen={item[4]['confirmationNumber']: item[2] for item in published},
+                )
+            except Exception as e:
+                log(f"[pipeline] Worker {n} notify error: {e}")
+
+            log(
+                f"[pipeline] {len(items)} job(s): queued {waited:.2f}s, firestore {published_at - started:.2f}s "
+                f"(queue depth {self.depth()})"
+            )
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Give queued jobs up to timeout seconds to finish, then stop the workers."""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            log(f"[pipeline] Stopping with {self.depth()} job(s) still queued")
+        for task in self._tasks:
+            task.cancel()
+        await self.coalescer.close()
+
+# ---------------------------------------------------------------------
+# SCRAPING JOB BLOCKS
+# ---------------------------------------------------------------------
+
+# "bulk" reads every job row in one page.evaluate() round-trip,
+# "locator" is the original per-field Playwright locator path.
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "bulk").lower()
+
+# In-page extraction of every #availableJobs tbody.job row.
+# Mirrors the selectors used by the locator path, so both produce identical blocks.
+JOB_RECORDS_JS = """
+() => Array.from(document.querySelectorAll("#availableJobs tbody.job")).map((job) => {
+    const text = (selector) => {
+        const el = job.querySelector(selector);
+        return el ? (el.innerText || "").trim() : "";
+    };
+    const durCell = job.querySelector("tr.detail td.duration");
+    return {
+        id: job.getAttribute("id") || "",
+        name: text("span.name"),
+        title: text("span.title"),
+        confNum: text("span.confNum"),
+        itemDate: text("span.itemDate"),
+        startTime: text("span.startTime"),
+        endTime: text("span.endTime"),
+        durationName: text("span.durationName"),
+        locationName: text("div.locationName"),
+        durationCell: durCell ? (durCell.innerText || "") : "",
+        text: job.innerText || "",
+    };
+})
+"""
+
+def apply_text_fallbacks(record: dict, tbody_text: str) -> None:
+    """
+    Fill missing date/time/location fields of a job record from the tbody text.
+    Robust fallbacks for when the structured selectors fail (Frontline DOM changes over time).
+    """
+    tbody_text = " ".join(tbody_text.split())
+
+    # Date patterns: with/without weekday prefix
+    if not record.get('itemDate'):
+        m = re.search(r"(Mon|Tue|Wed|Thu|Fri|Sat|Sun),\s*\d{1,2}/\d{1,2}/\d{4}", tbody_text)
+        if m:
+            record['itemDate'] = m.group(0)
+        else:
+            m2 = re.search(r"\b\d{1,2}/\d{1,2}/\d{4}\b", tbody_text)
+            if m2:
+                record['itemDate'] = m2.group(0)
+
+    # Time window (start/end) like "8:00 AM - 3:00 PM"
+    if not record.get('startTime'):
+        mt = re.search(r"\b(\d{1,2}:\d{2}\s*[AP]M)\s*-\s*(\d{1,2}:\d{2}\s*[AP]M)\b", tbody_text, re.IGNORECASE)
+        if mt:
+            record['startTime'] = mt.group(1).upper().replace("  ", " ").strip()
+            record['endTime'] = mt.group(2).upper().replace("  ", " ").strip()
+
+    # Location: try common label
+    if not record.get('locationName'):
+        ml = re.search(r"LOCATION:\s*([^|]+)$", tbody_text, re.IGNORECASE)
+        if ml:
+            record['locationName'] = ml.group(1).strip()
+
+def build_job_block(record: dict) -> str:
+    """
+    Format an extracted job record as the CONFIRMATION/TEACHER/... text block
+    consumed by parse_job_block(). Returns "" if the record has no usable fields.
+    """
+    job_id = record.get('id', '')
+    conf_num = record.get('confNum', '')
+    start_time = record.get('startTime', '')
+    end_time = record.get('endTime', '')
+
+    block_lines = []
+    if job_id or conf_num:
+        block_lines.append(f"CONFIRMATION #{conf_num or job_id}")
+    if record.get('name'):
+        block_lines.append(f"TEACHER: {record['name']}")
+    if record.get('title'):
+        block_lines.append(f"TITLE: {record['title']}")
+    if record.get('itemDate'):
+        block_lines.append(f"DATE: {record['itemDate']}")
+    if start_time or end_time:
+        block_lines.append(f"TIME: {start_time} - {end_time}".strip())
+    if record.get('durationName'):
+        block_lines.append(f"DURATION: {record['durationName']}")
+    if record.get('locationName'):
+        block_lines.append(f"LOCATION: {record['locationName']}")
+
+    return "\n".join([ln for ln in block_lines if ln.strip()])
+
+def job_blocks_from_records(records: list[dict]) -> list[str]:
+    """Apply fallbacks to bulk-extracted records and format them as job blocks."""
+    job_blocks: list[str] = []
+    for record in records:
+        try:
+            if not record.get('itemDate') or not record.get('startTime') or not record.get('locationName'):
+                apply_text_fallbacks(record, record.get('text', ''))
+        except Exception:
+            pass
+
+        # fallback duration if durationName isn't what the UI shows
+        if not record.get('durationName') and record.get('durationCell'):
+            record['durationName'] = " ".join(record['durationCell'].split())
+
+        block = build_job_block(record)
+
+        # If we got *nothing*, skip
+        if not block.strip():
+            continue
+
+        job_blocks.append(block)
+
+    return job_blocks
+
+async def extract_job_blocks_bulk(page) -> list[str]:
+    """
+    Single round-trip extraction: one page.evaluate() returns every job row's
+    fields, instead of ~10 Playwright calls per tbody.job.
+    """
+    records = await page.evaluate(JOB_RECORDS_JS)
+    return job_blocks_from_records(records or [])
+
+async def extract_job_blocks_per_locator(page) -> list[str]:
+    """
+    DOM-based extraction from Frontline's real job containers:
+    #availableJobs tbody.job (each has id=<confirmation_number>)
+    """
+    jobs = page.locator("#availableJobs tbody.job")
+    try:
+        count = await jobs.count()
+    except Exception:
+        count = 0
+
+    job_blocks: list[str] = []
+
+    for i in range(count):
+        job = jobs.nth(i)
+
+        # confirmation/job id is literally the tbody id
+        job_id = ""
+        try:
+            job_id = (await job.get_attribute("id")) or ""
+        except Exception:
+            job_id = ""
+
+        async def safe_text(locator_str: str) -> str:
+            try:
+                loc = job.locator(locator_str).first
+                if await loc.count() == 0:
+                    return ""
+                t = (await loc.inner_text()).strip()
+                return t
+            except Exception:
+                return ""
+
+        record = {
+            'id': job_id,
+            'name': await safe_text("span.name"),
+            'title': await safe_text("span.title"),
+            'confNum': await safe_text("span.confNum"),
+            'itemDate': await safe_text("span.itemDate"),
+            'startTime': await safe_text("span.startTime"),
+            'endTime': await safe_text("span.endTime"),
+            'durationName': await safe_text("span.durationName"),
+            'locationName': await safe_text("div.locationName"),
+        }
+
+        # --- Robust fallbacks (Frontline DOM changes over time) ---
+        # If the structured selectors fail, try extracting from the tbody text.
+        try:
+            if not record['itemDate'] or not record['startTime'] or not record['locationName']:
+                apply_text_fallbacks(record, await job.inner_text())
+        except Exception:
+            pass
+
+        # fallback duration if durationName isn't what the UI shows
+        if not record['durationName']:
+            try:
+                dur_cell = job.locator("tr.detail td.duration").first
+                if await dur_cell.count() > 0:
+                    record['durationName'] = " ".join((await dur_cell.inner_text()).split())
+            except Exception:
+                pass
+
+        block = build_job_block(record)
+
+        # If we got *nothing*, skip
+        if not block.strip():
+            continue
+
+        job_blocks.append(block)
+
+    return job_blocks
+
+async def try_extract_available_job_blocks(page) -> list[str]:
+    """
+    Extract job blocks using EXTRACTION_MODE.
+    Bulk mode falls back to the locator path if the in-page evaluation fails.
+    """
+    if EXTRACTION_MODE == "bulk":
+        try:
+            return await extract_job_blocks_bulk(page)
+        except Exception as e:
+            log(f"[extract] Bulk extraction failed, falling back to locators: {e}")
+    return await extract_job_blocks_per_locator(page)
+
+
+# ---------------------------------------------------------------------
+# NETWORK JOB FEED
+# ---------------------------------------------------------------------
+
+# Build job records from the SPA's own available-jobs JSON response instead of
+# waiting for it to render. Off by default until JOB_FEED_URL_PATTERN is
+# confirmed against the live site; the DOM path is always the fallback.
+JOB_FEED_ENABLED = os.getenv("JOB_FEED_ENABLED", "0") == "1"
+JOB_FEED_URL_PATTERN = re.compile(os.getenv("JOB_FEED_URL_PATTERN", r"/api/.*available.*job"), re.IGNORECASE)
+JOB_FEED_WAIT_SECONDS = float(os.getenv("JOB_FEED_WAIT_SECONDS", "3"))
+
+# Candidate JSON keys (lowercased) for each job record field, in priority order.
+# confNum has no generic fallback ("id", "jobId"): a record id is not the
+# confirmation number, and would give every job a second event ID.
+JOB_FEED_FIELD_KEYS = {
+    'confNum': ["confirmationnumber", "confnum", "confirmationno"],
+    'name': ["teacher", "teachername", "employeename", "employee.name", "name"],
+    'title': ["title", "positiontitle", "position.name", "position"],
+    'itemDate': ["itemdate", "date", "startdate", "jobdate"],
+    'startTime': ["starttime", "start"],
+    'endTime': ["endtime", "end"],
+    'durationName': ["durationname", "duration"],
+    'locationName': ["locationname", "location.name", "schoolname", "school.name", "location", "school"],
+}
+
+CONFIRMATION_RE = re.compile(r"^CONFIRMATION #(\S+)", re.MULTILINE)
+
+def block_confirmation_numbers(job_blocks: list[str]) -> set[str]:
+    return {m.group(1) for block in job_blocks for m in CONFIRMATION_RE.finditer(block)}
+
+class JobFeedStatus:
+    """
+    A controller's verdict on the job feed, shared by its pages. The endpoint
+    pattern and field keys are guesses, so the feed is only used once its
+    confirmation numbers have matched the DOM's on a poll where both had jobs.
+    """
+
+    def __init__(self):
+        self.verified: Optional[bool] = None  # None until a poll could compare
+        # A poll waited the full JOB_FEED_WAIT_SECONDS without seeing the feed:
+        # later polls only take a response that already arrived, until one does
+        # again or the session is renewed
+        self.missing = False
+
+    def verify(self, feed_blocks: list[str], dom_blocks: list[str]) -> None:
+        feed_nums, dom_nums = block_confirmation_numbers(feed_blocks), block_confirmation_numbers(dom_blocks)
+        if not feed_nums or not dom_nums:
+            return
+        self.verified = feed_nums == dom_nums
+        if self.verified:
+            log(f"[feed] Job feed matches the page ({len(feed_nums)} job(s)), using it from now on")
+        else:
+            log(f"[feed] Job feed does not match the page (feed {sorted(feed_nums)[:5]}, page {sorted(dom_nums)[:5]}), "
+                "ignoring it for this controller")
+
+class JobFeedCapture:
+    """Keeps the latest available-jobs JSON response seen by a page."""
+
+    def __init__(self, page, status: Optional[JobFeedStatus] = None):
+        self.status = status or JobFeedStatus()
+        self.payload = None
+        # Where the page fetched the feed from, for HttpJobPoller
+        self.url: Optional[str] = None
+        self.request_headers: dict = {}
+        self._event = asyncio.Event()
+        page.on("response", self._on_response)
+
+    def reset(self) -> None:
+        """Forget the previous response (call before each reload)."""
+        self.payload = None
+        self._event.clear()
+
+    async def _on_response(self, response) -> None:
+        if not JOB_FEED_URL_PATTERN.search(response.url):
+            return
+        if "json" not in (response.headers.get("content-type") or ""):
+            return
+        try:
+            self.payload = await response.json()
+            self.url = response.url
+            self.request_headers = response.request.headers
+            if self.status.missing:
+                log("[feed] Job feed response seen again")
+                self.status.missing = False
+            self._event.set()
+        except Exception as e:
+            log(f"[feed] Could not read job feed response: {e}")
+
+    async def wait(self, timeout: float = JOB_FEED_WAIT_SECONDS):
+        """Return the captured payload, waiting up to timeout seconds for it (not at all once it went missing)."""
+        if self.payload is None and not self.status.missing:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                log(f"[feed] No job feed response within {timeout:g}s, not waiting for it on later polls")
+                self.status.missing = True
+        return self.payload
+
+def _flatten_json(obj: dict, prefix: str = "") -> dict:
+    """Flatten nested dicts to {"a.b": value} with lowercased keys."""
+    flat = {}
+    for key, value in obj.items():
+        name = f"{prefix}{str(key).lower()}"
+        if isinstance(value, dict):
+            flat.update(_flatten_json(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+def _find_job_list(payload) -> Optional[list]:
+    """
+    Find the first non-empty list of objects in a JSON payload (breadth-first).
+    An empty list is only returned when the payload has no non-empty one.
+    """
+    empty = None
+    queue = [payload]
+    while queue:
+        node = queue.pop(0)
+        if isinstance(node, list):
+            if not node:
+                empty = node if empty is None else empty
+            elif isinstance(node[0], dict):
+                return node
+        elif isinstance(node, dict):
+            queue.extend(node.values())
+    return empty
+
+def _format_feed_date(value: str) -> str:
+    """ISO dates ("2026-02-09T00:00:00") -> DOM format ("Mon, 2/9/2026") so event IDs match."""
+    try:
+        d = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return f"{d:%a}, {d.month}/{d.day}/{d.year}"
+    except ValueError:
+        return value
+
+# Clock time at the end of a feed value, before any "Z" / "+HH:MM" / "-HH:MM" offset
+FEED_TIME_RE = re.compile(r"(\d{1,2}):(\d{2})(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?$", re.IGNORECASE)
+
+def _format_feed_time(value: str) -> str:
+    """
+    ISO datetimes / "13:30:00" -> DOM format ("1:30 PM") so event IDs match.
+    The time is kept as written (the district's wall clock the page shows); the offset is dropped.
+    """
+    if re.search(r"[AP]M", value, re.IGNORECASE):
+        return value
+    m = FEED_TIME_RE.search(value.strip())
+    if not m:
+        return value
+    hour, minute = int(m.group(1)), m.group(2)
+    return f"{(hour % 12) or 12}:{minute} {'PM' if hour >= 12 else 'AM'}"
+
+def job_records_from_feed(payload) -> Optional[list[dict]]:
+    """
+    Convert a job feed payload into records for job_blocks_from_records().
+    Returns None if the payload does not look like a job list.
+    """
+    items = _find_job_list(payload)
+    if items is None:
+        return None
+
+    records = []
+    for item in items:
+        flat = _flatten_json(item)
+        record = {}
+        for field, keys in JOB_FEED_FIELD_KEYS.items():
+            value = next((flat[k] for k in keys if flat.get(k) not in (None, "")), "")
+            record[field] = str(value).strip()
+
+        if record['itemDate']:
+            record['itemDate'] = _format_feed_date(record['itemDate'])
+        for field in ('startTime', 'endTime'):
+            if record[field]:
+                record[field] = _format_feed_time(record[field])
+
+        # A record without id and date means we matched the wrong response
+        if not record['confNum'] or not record['itemDate']:
+            return None
+        records.append(record)
+
+    return records
+
+def join_job_blocks(job_blocks: list[str]) -> str:
+    """Snapshot text for a poll: unique job blocks in page order, joined by '\n\n'."""
+    unique_blocks: list[str] = []
+    for block in job_blocks:
+        if block not in unique_blocks:
+            unique_blocks.append(block)
+    return "\n\n".join(unique_blocks)
+
+async def get_available_jobs_snapshot(page, feed: Optional[JobFeedCapture] = None) -> str:
+    """
+    High-level extraction:
+    - If a job feed response was captured and the feed has been verified
+      against the DOM, build the jobs from it (the first poll where both have
+      jobs does the verification).
+    - Otherwise try to parse available jobs from the DOM.
+    - If we find at least one job, return them joined by '\n\n'.
+    - If we do not find jobs but the page says "no available assignments",
+      return sentinel "NO_AVAILABLE_JOBS".
+    - If we see nothing at all (blind), also return "NO_AVAILABLE_JOBS".
+    """
+    job_blocks = None
+    if feed is not None and feed.status.verified is not False:
+        payload = await feed.wait()
+        records = job_records_from_feed(payload) if payload is not None else None
+        if records is None:
+            log("[feed] No usable job feed response, falling back to DOM")
+        elif feed.status.verified:
+            job_blocks = job_blocks_from_records(records)
+            if not job_blocks:
+                return "NO_AVAILABLE_JOBS"
+        else:
+            # Not verified yet: the DOM decides, and is compared with the feed
+            dom_blocks = await try_extract_available_job_blocks(page)
+            feed.status.verify(job_blocks_from_records(records), dom_blocks)
+            job_blocks = dom_blocks
+
+    if job_blocks is None:
+        job_blocks = await try_extract_available_job_blocks(page)
+
+    if job_blocks:
+        return join_job_blocks(job_blocks)
+
+    # No jobs found - check for "no jobs" message using smaller, targeted selectors
+    # Avoid expensive body.inner_text() call
+    no_jobs_text = ""
+    try:
+        # Try common selectors for "no jobs" messages first
+        no_jobs_selectors = [
+            "#availableJobs .no-jobs",
+            "#availableJobs .empty",
+            "#availableJobs .no-available",
+            ".no-available-jobs",
+            ".empty-jobs",
+            "[class*='no-jobs']",
+            "[class*='no-available']",
+            "[id*='no-jobs']",
+        ]
+        
+        for selector in no_jobs_selectors:
+            try:
+                element = page.locator(selector).first
+                if await element.count() > 0:
+                    no_jobs_text = await element.inner_text()
+                    break
+            except Exception:
+                continue
+        
+        # If no specific selector found, try the availableJobs container (smaller than body)
+        if not no_jobs_text:
+            try:
+                available_jobs_container = page.locator("#availableJobs").first
+                if await available_jobs_container.count() > 0:
+                    no_jobs_text = await available_jobs_container.inner_text()
+            except Exception:
+                pass
+    except Exception:
+        pass
+
+    # Check if any "no jobs" markers are in the text
+    if no_jobs_text:
+        no_jobs_flat = " ".join(no_jobs_text.split())
+        for marker in NO_JOBS_MARKERS:
+            if marker in no_jobs_flat:
+                return "NO_AVAILABLE_JOBS"
+
+    # Fallback: if we can't find jobs and can't find "no jobs" message, assume no jobs
+    return "NO_AVAILABLE_JOBS"
+
+# ---------------------------------------------------------------------
+# BROWSERLESS POLLING
+# ---------------------------------------------------------------------
+
+# Poll the job feed endpoint over HTTP with the browser session's cookies and
+# only use the browser to log in or when a response does not look like a job
+# list. Turns on job feed capture, which is how the endpoint is learned
+HTTP_POLL = os.getenv("HTTP_POLL", "0") == "1"
+# Fixed endpoint to poll instead of the one captured from the page
+HTTP_POLL_URL = os.getenv("HTTP_POLL_URL", "")
+HTTP_POLL_TIMEOUT_SECONDS = 15
+
+# Request headers not copied from the browser's feed request
+HTTP_POLL_SKIP_HEADERS = {"cookie", "host", "content-length", "connection", "accept-encoding"}
+
+class HttpJobPoller:
+    """
+    Fetches the job feed with httpx using cookies exported from the browser
+    context. poll() returns the same snapshot text as get_available_jobs_snapshot(),
+    or None when the browser has to poll instead (not synced yet, redirected to
+    login, or a response that is not a job list).
+    """
+
+    def __init__(self, controller_id: str, url: str = HTTP_POLL_URL):
+        self.controller_id = controller_id
+        self.url = url or None
+        self.headers: dict = {"accept": "application/json"}
+        self._client: Optional[httpx.AsyncClient] = None
+        self.synced_at = 0.0
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.last_snapshot: Optional[str] = None
+        # The pages' verdict on the feed; nothing is polled over HTTP until it matched the DOM
+        self.feed_status: Optional[JobFeedStatus] = None
+        # Whether the latest browser poll found jobs: an empty feed then needs a second look
+        self.browser_had_jobs = False
+
+    @property
+    def ready(self) -> bool:
+        return (self._client is not None and self.url is not None
+                and self.feed_status is not None and self.feed_status.verified is True)
+
+    async def sync(self, context, feed: Optional[JobFeedCapture] = None, snapshot: Optional[str] = None) -> None:
+        """
+        Take the endpoint from the page's feed request and the cookies from the context.
+        snapshot is what the browser poll just extracted, if this follows one.
+        """
+        if snapshot is not None:
+            self.browser_had_jobs = snapshot != "NO_AVAILABLE_JOBS"
+        if feed is not None:
+            self.feed_status = feed.status
+        elif self.feed_status is not None:
+            # New session cookies: give the page's feed a full wait again
+            self.feed_status.missing = False
+        if feed is not None and feed.url and not HTTP_POLL_URL:
+            self.url = feed.url
+            self.headers = {k: v for k, v in feed.request_headers.items()
+                            if k.lower() not in HTTP_POLL_SKIP_HEADERS and not k.startswith(":")}
+        if self.url is None:
+            return
+
+        state = await context.storage_state()
+        cookies = httpx.Cookies()
+        for c in state.get("cookies", []):
+            cookies.set(c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/"))
+
+        await self.close()
+        self._client = httpx.AsyncClient(timeout=HTTP_POLL_TIMEOUT_SECONDS, headers=self.headers,
+                                         cookies=cookies, follow_redirects=False)
+        # The browser's view may differ from what was cached over HTTP
+        self.etag = self.last_modified = self.last_snapshot = None
+        self.synced_at = time.time()
+
+    def _fall_back(self, reason: str) -> None:
+        log(f"[http] {reason}, polling with the browser")
+        metrics.inc("http_fallbacks", self.controller_id)
+
+    async def poll(self) -> Optional[str]:
+        if not self.ready:
+            return None
+
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        started = time.monotonic()
+        try:
+            response = await self._client.get(self.url, headers=headers)
+        except httpx.HTTPError as e:
+            self._fall_back(f"Request failed: {e!r}")
+            return None
+        metrics.observe("http_poll", time.monotonic() - started, self.controller_id)
+
+        if response.status_code == 304 and self.last_snapshot is not None:
+            metrics.inc("http_not_modified", self.controller_id)
+            return self.last_snapshot
+        if response.is_redirect or response.status_code in (401, 403):
+            # Session rejected: the browser poll will land on the login page and re-login
+            self._fall_back(f"HTTP {response.status_code} (session rejected)")
+            await self.close()
+            return None
+        if response.status_code != 200 or "json" not in response.headers.get("content-type", ""):
+            self._fall_back(f"Unexpected response: HTTP {response.status_code}, {response.headers.get('content-type')}")
+            return None
+
+        try:
+            records = job_records_from_feed(response.json())
+        except ValueError:
+            records = None
+        if records is None:
+            self._fall_back("Response is not a job list")
+            return None
+
+        job_blocks = job_blocks_from_records(records)
+        if not job_blocks and self.browser_had_jobs:
+            # Let the browser confirm before reporting every job gone
+            self._fall_back("Feed has no jobs but the last browser poll did")
+            return None
+        self.last_snapshot = join_job_blocks(job_blocks) if job_blocks else "NO_AVAILABLE_JOBS"
+        self.etag = response.headers.get("etag")
+        self.last_modified = response.headers.get("last-modified")
+        return self.last_snapshot
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+# ---------------------------------------------------------------------
+# PAGE RECORDING
+# ---------------------------------------------------------------------
+
+# Save each new #availableJobs state as a sanitized, timestamped fixture
+# for `benchmark-watcher.py replay` (off unless RECORD_PAGES_DIR is set)
+RECORD_PAGES_DIR = os.getenv("RECORD_PAGES_DIR", "")
+RECORD_PAGES_MAX = int(os.getenv("RECORD_PAGES_MAX", "1000"))
+
+# Clone #availableJobs and strip anything not needed to extract jobs:
+# scripts/media, every attribute except id/class, free-text notes.
+# Teacher names become a stable pseudonym so the same job looks the same in every recording.
+SANITIZED_JOBS_HTML_JS = """
+() => {
+    const root = document.querySelector("#availableJobs");
+    if (!root) return null;
+    const clone = root.cloneNode(true);
+    clone.querySelectorAll("script, style, noscript, iframe, img, svg, input, textarea").forEach((el) => el.remove());
+    for (const el of [clone, ...clone.querySelectorAll("*")]) {
+        for (const attr of Array.from(el.attributes)) {
+            if (attr.name !== "id" && attr.name !== "class") el.removeAttribute(attr.name);
+        }
+    }
+    clone.querySelectorAll(".notes").forEach((el) => { el.textContent = ""; });
+    clone.querySelectorAll("span.name").forEach((el) => {
+        let h = 0x811c9dc5;
+        for (const ch of el.textContent.trim()) h = Math.imul(h ^ ch.codePointAt(0), 0x01000193) >>> 0;
+        el.textContent = "Teacher " + h.toString(16).padStart(8, "0");
+    });
+    return clone.outerHTML;
+}
+"""
+
+RECORDED_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><meta name="recorded-at" content="{recorded_at}"><title>Substitute Home (recorded fixture)</title></head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+class PageRecorder:
+    """
+    Writes sanitized #availableJobs states to <directory>/<controller_id>_<unix ms>.html,
+    keeping the newest max_files recordings.
+    """
+
+    def __init__(self, directory: str, controller_id: str, max_files: int = RECORD_PAGES_MAX):
+        self.directory = directory
+        self.prefix = f"{controller_id}_"
+        self.max_files = max_files
+        os.makedirs(directory, exist_ok=True)
+
+    async def record(self, page) -> None:
+        try:
+            body = await page.evaluate(SANITIZED_JOBS_HTML_JS)
+        except Exception as e:
+            log(f"[record] Could not capture page: {e}")
+            return
+        if body is None:
+            return
+
+        recorded_at = datetime.now(timezone.utc)
+        path = os.path.join(self.directory, f"{self.prefix}{int(recorded_at.timestamp() * 1000)}.html")
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(RECORDED_PAGE_TEMPLATE.format(recorded_at=recorded_at.isoformat(), body=body))
+        except OSError as e:
+            log(f"[record] Could not write {path}: {e}")
+            return
+
+        recordings = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(self.prefix) and name.endswith(".html")
+        )
+        for name in recordings[:-self.max_files] if self.max_files > 0 else []:
+            os.remove(os.path.join(self.directory, name))
+
+# ---------------------------------------------------------------------
+# REQUEST BLOCKING
+# ---------------------------------------------------------------------
+
+# "off": load everything, "standard": skip images/fonts/media and known trackers,
+# "strict": also skip stylesheets and every host outside frontlineeducation.com.
+# Blocking routes every request through a Python handler, so it is opt-in:
+# compare the [net] lines and reload times before turning it on for a district.
+REQUEST_BLOCKING = os.getenv("REQUEST_BLOCKING", "off").lower()
+
+BLOCKED_RESOURCE_TYPES = {
+    "standard": {"image", "font", "media"},
+    "strict": {"image", "font", "media", "stylesheet", "manifest", "other"},
+}
+
+# Analytics / session-recording hosts never needed to render #availableJobs
+BLOCKED_HOSTS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "nr-data.net",
+    "newrelic.com",
+    "hotjar.com",
+    "fullstory.com",
+    "pendo.io",
+    "segment.io",
+    "segment.com",
+    "walkme.com",
+    "appcues.com",
+]
+FIRST_PARTY_HOST_SUFFIX = "frontlineeducation.com"
+
+# URL patterns that are never blocked (login page assets, captcha, anything extraction needs)
+REQUEST_ALLOWLIST = [
+    re.compile(pattern) for pattern in
+    os.getenv("REQUEST_ALLOWLIST", r"login\.frontlineeducation\.com,recaptcha,hcaptcha,/api/").split(",")
+    if pattern
+]
+
+def _host_matches(host: str, suffix: str) -> bool:
+    return host == suffix or host.endswith("." + suffix)
+
+def should_block_request(url: str, resource_type: str, profile: str = REQUEST_BLOCKING) -> bool:
+    """Decide whether a request is unnecessary for the polling page under a blocking profile."""
+    if profile not in BLOCKED_RESOURCE_TYPES:
+        return False
+    if any(pattern.search(url) for pattern in REQUEST_ALLOWLIST):
+        return False
+
+    host = urlparse(url).hostname or ""
+    if any(_host_matches(host, blocked) for blocked in BLOCKED_HOSTS):
+        return True
+    if resource_type in BLOCKED_RESOURCE_TYPES[profile]:
+        return True
+    if profile == "strict" and host and not _host_matches(host, FIRST_PARTY_HOST_SUFFIX):
+        return True
+    return False
+
+class RequestBlocker:
+    """
+    Routes a context's requests through should_block_request() (unless the profile
+    is "off") and counts per-poll traffic. Bytes are the responses' Content-Length,
+    read from headers already delivered with the response event, so counting costs
+    no extra round-trip (chunked responses without one count as 0).
+    """
+
+    def __init__(self, profile: str = REQUEST_BLOCKING):
+        self.profile = profile
+        self.requests = 0
+        self.blocked = 0
+        self.bytes = 0
+
+    async def install(self, context) -> None:
+        if self.profile in BLOCKED_RESOURCE_TYPES:
+            await context.route("**/*", self._route)
+        context.on("response", self._on_response)
+
+    async def _route(self, route) -> None:
+        req = route.request
+        # Never interfere with the login flow (captcha images, SSO scripts)
+        try:
+            on_login_page = "login.frontlineeducation.com" in req.frame.url
+        except Exception:
+            on_login_page = False
+
+        if not on_login_page and should_block_request(req.url, req.resource_type, self.profile):
+            self.blocked += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _on_response(self, response) -> None:
+        self.requests += 1
+        try:
+            self.bytes += int(response.headers.get("content-length", 0))
+        except (TypeError, ValueError):
+            pass
+
+    def take_poll_stats(self) -> str:
+        """Summarize and reset the counters for the poll that just finished."""
+        summary = f"[net] {self.requests} requests ({self.blocked} blocked, profile={self.profile}), {self.bytes / 1024:.1f} KB"
+        self.requests = self.blocked = self.bytes = 0
+        return summary
+
+# ---------------------------------------------------------------------
+# POLL SCHEDULING
+# ---------------------------------------------------------------------
+
+# "static": SCRAPE_INTERVAL_SECONDS inside HOT_WINDOWS, 5x slower outside.
+# "adaptive": spend POLL_BUDGET_PER_DAY where jobs have actually been posted.
+POLL_SCHEDULER = os.getenv("POLL_SCHEDULER", "static").lower()
+POLL_BUDGET_PER_DAY = int(os.getenv("POLL_BUDGET_PER_DAY", "2880"))
+ADAPTIVE_MIN_INTERVAL_SECONDS = float(os.getenv("ADAPTIVE_MIN_INTERVAL_SECONDS", "8"))
+ADAPTIVE_MAX_INTERVAL_SECONDS = float(os.getenv("ADAPTIVE_MAX_INTERVAL_SECONDS", "300"))
+ADAPTIVE_LOOKBACK_DAYS = int(os.getenv("ADAPTIVE_LOOKBACK_DAYS", "28"))
+ADAPTIVE_REFRESH_SECONDS = 6 * 3600
+# Need at least this many published jobs in the lookback window to trust the model
+ADAPTIVE_MIN_HISTORY = 50
+
+# Arrival rates are bucketed by weekday and half hour (Utah time)
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOTS_PER_WEEK = 7 * SLOTS_PER_DAY
+# Pseudo-count (jobs per slot per week) so quiet slots are still polled
+ARRIVAL_PRIOR = 0.05
+
+def get_static_delay() -> float:
+    """Delay from the static hot-window schedule."""
+    SCRAPE_INTERVAL = district_setting("scrapeIntervalSeconds", int(os.getenv("SCRAPE_INTERVAL_SECONDS", "15")))
+    if should_run_aggressive():
+        # Use configured interval (with small random variation)
+        return SCRAPE_INTERVAL + random.uniform(-2, 2)
+    # Slower outside hot windows (5x the interval)
+    return SCRAPE_INTERVAL * 5
+
+def week_slot(dt: datetime) -> int:
+    """Weekday/half-hour bucket (0..SLOTS_PER_WEEK-1) for a Utah-local datetime."""
+    return dt.weekday() * SLOTS_PER_DAY + (dt.hour * 60 + dt.minute) // SLOT_MINUTES
+
+def plan_poll_intervals(slot_counts: list[float], weeks: float,
+                        budget_per_day: int = POLL_BUDGET_PER_DAY) -> list[float]:
+    """
+    Split the weekly poll budget across slots in proportion to sqrt(arrival rate),
+    which minimizes the mean detection delay for a fixed number of polls.
+    Returns the poll interval (seconds) for each slot, clamped to the adaptive bounds.
+    """
+    weights = [math.sqrt(count / max(weeks, 1e-9) + ARRIVAL_PRIOR) for count in slot_counts]
+    weekly_budget = budget_per_day * 7
+    slot_seconds = SLOT_MINUTES * 60
+
+    # Slots capped at the minimum interval hand their unused budget to the rest
+    capped: set[int] = set()
+    while True:
+        budget = weekly_budget - len(capped) * slot_seconds / ADAPTIVE_MIN_INTERVAL_SECONDS
+        free_weight = sum(w for i, w in enumerate(weights) if i not in capped)
+        if budget <= 0 or free_weight <= 0:
+            break
+        newly_capped = {
+            i for i, w in enumerate(weights)
+            if i not in capped and slot_seconds * free_weight / (budget * w) < ADAPTIVE_MIN_INTERVAL_SECONDS
+        }
+        if not newly_capped:
+            break
+        capped |= newly_capped
+
+    intervals = []
+    for i, weight in enumerate(weights):
+        if i in capped or budget <= 0:
+            interval = ADAPTIVE_MIN_INTERVAL_SECONDS
+        else:
+            interval = slot_seconds * free_weight / (budget * weight)
+        intervals.append(min(max(interval, ADAPTIVE_MIN_INTERVAL_SECONDS), ADAPTIVE_MAX_INTERVAL_SECONDS))
+    return intervals
+
+def load_publish_history(district_id: str, days: int = ADAPTIVE_LOOKBACK_DAYS) -> list[datetime]:
+    """createdAt of every job_events document for the district in the last `days` days."""
+    from google.cloud.firestore_v1.base_query import FieldFilter  # installed with firebase_admin
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    # Only createdAt is needed, so don't download the rest of each document
+    query = (
+        db.collection('job_events')
+        .where(filter=FieldFilter('districtId', '==', district_id))
+        .where(filter=FieldFilter('createdAt', '>=', since))
+        .select(['createdAt'])
+    )
+    return [snap.get('createdAt') for snap in query.stream() if snap.get('createdAt')]
+
+class AdaptivePollScheduler:
+    """
+    Learns job arrival rates per weekday/half-hour from published job_events and
+    spaces polls accordingly. Falls back to the static schedule until enough
+    history has loaded.
+    """
+
+    def __init__(self, district_id: str):
+        self.district_id = district_id
+        self.intervals: Optional[list[float]] = None
+        self._loaded_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def _rebuild(self, created: list[datetime]) -> None:
+        if len(created) < ADAPTIVE_MIN_HISTORY:
+            log(f"[schedule] Only {len(created)} published job(s) in {ADAPTIVE_LOOKBACK_DAYS}d, using static schedule")
+            self.intervals = None
+            return
+        counts = [0.0] * SLOTS_PER_WEEK
+        for ts in created:
+            counts[week_slot(ts.astimezone(timezone.utc) - timedelta(hours=7))] += 1
+        budget = district_setting("pollBudgetPerDay", POLL_BUDGET_PER_DAY)
+        self.intervals = plan_poll_intervals(counts, ADAPTIVE_LOOKBACK_DAYS / 7, budget_per_day=budget)
+        log(
+            f"[schedule] Adaptive schedule from {len(created)} job(s): "
+            f"interval {min(self.intervals):.1f}s-{max(self.intervals):.1f}s, budget {budget}/day"
+        )
+
+    async def _refresh(self) -> None:
+        await firebase_ready()
+        try:
+            created = await asyncio.to_thread(load_publish_history, self.district_id)
+            self._rebuild(created)
+        except Exception as e:
+            log(f"[schedule] Could not load publish history: {e}")
+
+    def maybe_refresh(self) -> None:
+        """Reload publish history in the background every ADAPTIVE_REFRESH_SECONDS."""
+        if time.monotonic() - self._loaded_at < ADAPTIVE_REFRESH_SECONDS and self._loaded_at:
+            return
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        self._loaded_at = time.monotonic()
+        self._refresh_task = asyncio.create_task(self._refresh())
+
+    def next_delay(self) -> float:
+        self.maybe_refresh()
+        if self.intervals is None:
+            return get_static_delay()
+        interval = self.intervals[week_slot(utah_now())]
+        # Same +/- jitter proportion as the static schedule
+        return interval * random.uniform(0.87, 1.13)
+
+class PollStats:
+    """Hourly summary of polls, new jobs and the detection-delay bound (gap before the poll that found a job)."""
+
+    REPORT_SECONDS = 3600
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self._reset()
+        self._last_poll: Optional[float] = None
+
+    def _reset(self) -> None:
+        self.started = time.monotonic()
+        self.polls = 0
+        self.new_jobs = 0
+        self.detection_gaps: list[float] = []
+
+    def record_poll(self, new_jobs: int) -> None:
+        now = time.monotonic()
+        self.polls += 1
+        self.new_jobs += new_jobs
+        if new_jobs and self._last_poll is not None:
+            # A job found now was posted at most this long ago
+            self.detection_gaps.extend([now - self._last_poll] * new_jobs)
+        self._last_poll = now
+
+        if now - self.started >= self.REPORT_SECONDS:
+            polls_per_job = f"{self.polls / self.new_jobs:.1f}" if self.new_jobs else "n/a"
+            latency = "n/a"
+            if self.detection_gaps:
+                gaps = sorted(self.detection_gaps)
+                latency = f"mean {statistics.mean(gaps) / 2:.1f}s, max {gaps[-1]:.1f}s"
+            log(
+                f"[schedule] {self.mode}: {self.polls} polls, {self.new_jobs} new job(s), "
+                f"{polls_per_job} polls/job, detection delay {latency}"
+            )
+            self._reset()
+
+# ---------------------------------------------------------------------
+# DOUBLE-BUFFERED POLLING
+# ---------------------------------------------------------------------
+
+# Keep a second jobs page in the same context and reload it during the sleep,
+# so each poll extracts from a render that just finished loading instead of
+# paying the reload time on top of the delay
+POLL_DOUBLE_BUFFER = os.getenv("POLL_DOUBLE_BUFFER", "0") == "1"
+# Cap on page loads per minute across all of a controller's pages (0 = no cap)
+POLL_MAX_RELOADS_PER_MINUTE = float(os.getenv("POLL_MAX_RELOADS_PER_MINUTE", "0"))
+# Load-time guess until the first loads have been measured
+PAGE_LOAD_ESTIMATE_SECONDS = 3.0
+PAGE_LOAD_SMOOTHING = 0.3
+
+class PageBuffer:
+    """
+    The jobs page(s) a controller polls. With one page, next() reloads it in
+    place. With double buffering, prefetch() starts reloading the standby page
+    so it finishes as the sleep ends, and next() swaps it in; the two pages
+    never navigate at the same time.
+    """
+
+    def __init__(self, controller_id: str, max_per_minute: float = POLL_MAX_RELOADS_PER_MINUTE):
+        self.controller_id = controller_id
+        self.min_spacing = 60.0 / max_per_minute if max_per_minute > 0 else 0.0
+        self.load_estimate = PAGE_LOAD_ESTIMATE_SECONDS
+        self.entries: list[tuple] = []  # (page, feed)
+        self.front = 0
+        self._prefetch: Optional[asyncio.Task] = None
+        self._next_load_at = 0.0
+        # Shared by every page, including pages opened by recycle()
+        self.feed_status = JobFeedStatus()
+
+    async def add_page(self, context, page=None) -> None:
+        """Register a page (opening a new one in the context if none is given)."""
+        if page is None:
+            page = await context.new_page()
+            page.on("dialog", lambda d: asyncio.create_task(d.accept()))
+        feed = JobFeedCapture(page, self.feed_status) if JOB_FEED_ENABLED or HTTP_POLL else None
+        self.entries.append((page, feed))
+
+    @property
+    def page(self):
+        return self.entries[self.front][0]
+
+    @property
+    def feed(self) -> Optional[JobFeedCapture]:
+        return self.entries[self.front][1]
+
+    async def _throttle(self) -> None:
+        """Wait until the request-rate cap allows another page load."""
+        now = time.monotonic()
+        if now < self._next_load_at:
+            await asyncio.sleep(self._next_load_at - now)
+        self._next_load_at = max(now, self._next_load_at) + self.min_spacing
+
+    async def _load(self, index: int) -> bool:
+        """Reload one page, falling back to goto. False if both failed."""
+        page, feed = self.entries[index]
+        await self._throttle()
+        started = time.monotonic()
+        try:
+            # Check if page is still valid before reloading
+            if page.is_closed():
+                log("[!] Page is closed, cannot reload. This should not happen.")
+                raise Exception("Page is closed")
+
+            if feed is not None:
+                feed.reset()
+            if page.url == "about:blank":
+                # A standby page that has not been loaded yet
+                await page.goto(jobs_url(), wait_until="domcontentloaded", timeout=30000)
+            else:
+                await page.reload(wait_until="domcontentloaded", timeout=30000)
+        except PWTimeout:
+            log("[!] reload timeout, trying goto instead...")
+            metrics.inc("reload_errors", self.controller_id)
+            try:
+                await page.goto(jobs_url(), wait_until="domcontentloaded", timeout=30000)
+            except Exception as goto_err:
+                log(f"[!] goto also failed after reload timeout: {goto_err}")
+                return False
+        except Exception as e:
+            log(f"[!] reload error: {e}, trying goto instead...")
+            metrics.inc("reload_errors", self.controller_id)
+            try:
+                # If reload fails, try navigating to the URL directly
+                await page.goto(jobs_url(), wait_until="domcontentloaded", timeout=30000)
+            except Exception as goto_err:
+                log(f"[!] goto also failed after reload error: {goto_err}")
+                return False
+
+        elapsed = time.monotonic() - started
+        metrics.observe("reload", elapsed, self.controller_id)
+        self.load_estimate += PAGE_LOAD_SMOOTHING * (elapsed - self.load_estimate)
+        return True
+
+    async def _load_after(self, index: int, wait: float) -> bool:
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return await self._load(index)
+
+    def prefetch(self, delay: float) -> None:
+        """Start loading the standby page so it is ready when a delay-second sleep ends."""
+        if len(self.entries) < 2:
+            return
+        standby = (self.front + 1) % len(self.entries)
+        self._prefetch = asyncio.create_task(self._load_after(standby, delay - self.load_estimate))
+
+    async def next(self) -> bool:
+        """Make a freshly loaded page current. False if the load failed."""
+        if self._prefetch is None:
+            return await self._load(self.front)
+        task, self._prefetch = self._prefetch, None
+        self.front = (self.front + 1) % len(self.entries)
+        return await task
+
+    async def cancel_prefetch(self) -> None:
+        """Stop a standby load (e.g. while the current page logs in again)."""
+        if self._prefetch is not None:
+            task, self._prefetch = self._prefetch, None
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def recycle(self, context) -> bool:
+        """
+        Replace every page with a new one in context (the same context or its
+        replacement) and load the current one, then close the old pages.
+        If a new page cannot be opened, the old pages stay in place and the error is raised.
+        """
+        await self.cancel_prefetch()
+        old_entries = self.entries
+        self.entries = []
+        try:
+            for _ in old_entries:
+                await self.add_page(context)
+        except Exception:
+            new_entries, self.entries = self.entries, old_entries
+            for page, _ in new_entries:
+                try:
+                    await page.close()
+                except Exception:
+                    pass
+            raise
+        loaded = await self._load(self.front)
+        for page, _ in old_entries:
+            try:
+                await page.close()
+            except Exception:
+                pass
+        return loaded
+
+# ---------------------------------------------------------------------
+# MEMORY GOVERNOR
+# ---------------------------------------------------------------------
+
+# Sample page JS heap (over CDP) and resident memory every MEMORY_CHECK_POLLS
+# polls; past a limit, replace the jobs page (heap) or the whole context (RSS)
+# between polls
+MEMORY_GOVERNOR = os.getenv("MEMORY_GOVERNOR", "0") == "1"
+MEMORY_CHECK_POLLS = int(os.getenv("MEMORY_CHECK_POLLS", "10"))
+MEMORY_JS_HEAP_LIMIT_MB = float(os.getenv("MEMORY_JS_HEAP_LIMIT_MB", "256"))
+# Browser process tree (shared by every controller in the process)
+MEMORY_RSS_LIMIT_MB = float(os.getenv("MEMORY_RSS_LIMIT_MB", "1536"))
+# A context recycle follows this many page recycles in a row
+MEMORY_PAGE_RECYCLES_PER_CONTEXT = 3
+# Minimum time between context recycles, so controllers sharing a browser do not all recycle at once
+MEMORY_CONTEXT_COOLDOWN_SECONDS = 900
+
+RECYCLE_PAGE = "page"
+RECYCLE_CONTEXT = "context"
+
+def _proc_rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def process_tree_rss() -> tuple[Optional[int], Optional[int]]:
+    """(RSS of this process, summed RSS of its descendants: Playwright driver and Chromium). None off Linux."""
+    if not os.path.isdir("/proc"):
+        return None, None
+    children: dict[int, list[int]] = collections.defaultdict(list)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # "pid (comm) state ppid ..." - comm may contain spaces and parens
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children[ppid].append(int(entry))
+
+    own = _proc_rss_bytes(os.getpid())
+    descendants = 0
+    stack = list(children[os.getpid()])
+    while stack:
+        pid = stack.pop()
+        try:
+            descendants += _proc_rss_bytes(pid)
+        except OSError:
+            continue
+        stack.extend(children[pid])
+    return own, descendants
+
+class MemoryGovernor:
+    """Decides when a controller's page or context has grown enough to be replaced."""
+
+    def __init__(self, controller_id: str):
+        self.controller_id = controller_id
+        self.polls = 0
+        self.page_recycles_in_row = 0
+        self.context_recycled_at = time.monotonic()
+        self._cdp = None
+        self._cdp_page = None
 
-        # fallback duration if durationName isn't what the UI shows
-        if not duration:
-            try:
-                dur_cell = job.locator("tr.detail td.duration").first
-                if await dur_cell.count() > 0:
-                    duration = " ".join((await dur_cell.inner_text()).split())
-            except Exception:
-                pass
+    async def js_heap_bytes(self, context, page) -> Optional[float]:
+        """JSHeapUsedSize from the page's CDP Performance domain (Chromium only)."""
+        try:
+            if self._cdp_page is not page:
+                self._cdp = await context.new_cdp_session(page)
+                await self._cdp.send("Performance.enable")
+                self._cdp_page = page
+            result = await self._cdp.send("Performance.getMetrics")
+        except Exception as e:
+            log(f"[memory] Could not read JS heap: {e}")
+            self._cdp_page = None
+            return None
+        return next((m["value"] for m in result.get("metrics", []) if m["name"] == "JSHeapUsedSize"), None)
 
-        block_lines = []
-        if job_id or conf_num:
-            block_lines.append(f"CONFIRMATION #{conf_num or job_id}")
-        if teacher:
-            block_lines.append(f"TEACHER: {teacher}")
-        if title:
-            block_lines.append(f"TITLE: {title}")
-        if item_date:
-            block_lines.append(f"DATE: {item_date}")
-        if start_time or end_time:
-            block_lines.append(f"TIME: {start_time} - {end_time}".strip())
-        if duration:
-            block_lines.append(f"DURATION: {duration}")
-        if location:
-            block_lines.append(f"LOCATION: {location}")
-
-        block = "\n".join([ln for ln in block_lines if ln.strip()])
+    async def check(self, context, page) -> Optional[str]:
+        """Call once per poll. Returns RECYCLE_PAGE, RECYCLE_CONTEXT or None."""
+        self.polls += 1
+        if self.polls % MEMORY_CHECK_POLLS:
+            return None
 
-        # If we got *nothing*, skip
-        if not block.strip():
-            continue
+        heap = await self.js_heap_bytes(context, page)
+        own_rss, browser_rss = process_tree_rss()
+        for gauge, value in (("js_heap_bytes", heap), ("browser_rss_bytes", browser_rss),
+                             ("process_rss_bytes", own_rss)):
+            if value is not None:
+                metrics.set(gauge, value, self.controller_id)
+        mb = lambda v: f"{v / 2**20:.0f}MB" if v is not None else "n/a"
+        log(f"[memory] JS heap {mb(heap)}, browser RSS {mb(browser_rss)}, watcher RSS {mb(own_rss)}")
 
-        job_blocks.append(block)
+        rss_over = browser_rss is not None and browser_rss > MEMORY_RSS_LIMIT_MB * 2**20
+        heap_over = heap is not None and heap > MEMORY_JS_HEAP_LIMIT_MB * 2**20
+        cooled_down = time.monotonic() - self.context_recycled_at >= MEMORY_CONTEXT_COOLDOWN_SECONDS
+        if cooled_down and (rss_over or self.page_recycles_in_row >= MEMORY_PAGE_RECYCLES_PER_CONTEXT):
+            self.page_recycles_in_row = 0
+            self.context_recycled_at = time.monotonic()
+            return RECYCLE_CONTEXT
+        if heap_over or rss_over:
+            self.page_recycles_in_row += 1
+            return RECYCLE_PAGE
+        self.page_recycles_in_row = 0
+        return None
 
-    return job_blocks
+# ---------------------------------------------------------------------
+# PHASE COORDINATION
+# ---------------------------------------------------------------------
 
+# Controllers watching the same district share a lease file (flock-protected)
+# on this host and keep re-slotting themselves so their polls stay evenly
+# spaced, even as jitter drifts them or a controller dies.
+PHASE_COORDINATION = os.getenv("PHASE_COORDINATION", "0") == "1"
+COORDINATION_DIR = os.getenv("COORDINATION_DIR", "/opt/frontline-watcher/coordination")
+# A controller without a heartbeat for this long loses its slot
+PHASE_LEASE_SECONDS = float(os.getenv("PHASE_LEASE_SECONDS", "120"))
+# Never poll sooner than this fraction of the interval after our own last poll
+PHASE_MIN_DELAY_FRACTION = 0.5
+PHASE_REPORT_SECONDS = 3600
 
-async def get_available_jobs_snapshot(page) -> str:
+def controller_rank_key(controller_id: str) -> tuple:
+    """Order controller IDs by their numeric suffix ("controller_2" before "controller_10"), then by name."""
+    try:
+        return (0, int(controller_id.split('_')[-1]), controller_id)
+    except ValueError:
+        return (1, 0, controller_id)
+
+class PhaseCoordinator:
     """
-    High-level extraction:
-    - Try to parse available jobs.
-    - If we find at least one job, return them joined by '\n\n'.
-    - If we do not find jobs but the page says "no available assignments",
-      return sentinel "NO_AVAILABLE_JOBS".
-    - If we see nothing at all (blind), also return "NO_AVAILABLE_JOBS".
+    Lease/heartbeat membership over a JSON file in COORDINATION_DIR.
+    Live controllers are ranked by controller number; rank r polls r/N of an
+    interval after the rank-0 controller's last poll, so the group's polls are
+    evenly spaced. Rank 0 (the leader) just polls on its own interval, jitter
+    included, and everyone else follows it: the leader's drift moves the whole
+    group's phase, not the spacing within it.
+    The lease file is read and written in a worker thread, so a slow disk or a
+    held lock never stalls the event loop.
     """
-    job_blocks = await try_extract_available_job_blocks(page)
 
-    if job_blocks:
-        unique_blocks: list[str] = []
-        for block in job_blocks:
-            if block not in unique_blocks:
-                unique_blocks.append(block)
-        return "\n\n".join(unique_blocks)
+    def __init__(self, controller_id: str, district_id: str):
+        self.controller_id = controller_id
+        self.path = os.path.join(COORDINATION_DIR, f"phase_{district_id}.json")
+        self.worst_gap = 0.0
+        self._report_started = time.time()
+        os.makedirs(COORDINATION_DIR, exist_ok=True)
 
-    # No jobs found - check for "no jobs" message using smaller, targeted selectors
-    # Avoid expensive body.inner_text() call
-    no_jobs_text = ""
-    try:
-        # Try common selectors for "no jobs" messages first
-        no_jobs_selectors = [
-            "#availableJobs .no-jobs",
-            "#availableJobs .empty",
-            "#availableJobs .no-available",
-            ".no-available-jobs",
-            ".empty-jobs",
-            "[class*='no-jobs']",
-            "[class*='no-available']",
-            "[id*='no-jobs']",
-        ]
-        
-        for selector in no_jobs_selectors:
-            try:
-                element = page.locator(selector).first
-                if await element.count() > 0:
-                    no_jobs_text = await element.inner_text()
-                    break
-            except Exception:
-                continue
-        
-        # If no specific selector found, try the availableJobs container (smaller than body)
-        if not no_jobs_text:
+    def _locked_update(self, update) -> dict:
+        """Read, modify (update(state) -> None) and rewrite the lease file under an exclusive flock."""
+        with open(self.path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
             try:
-                available_jobs_container = page.locator("#availableJobs").first
-                if await available_jobs_container.count() > 0:
-                    no_jobs_text = await available_jobs_container.inner_text()
-            except Exception:
-                pass
-    except Exception:
-        pass
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except json.JSONDecodeError:
+                    state = {}
+                state.setdefault("members", {})
+                update(state)
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return state
 
-    # Check if any "no jobs" markers are in the text
-    if no_jobs_text:
-        no_jobs_flat = " ".join(no_jobs_text.split())
-        for marker in NO_JOBS_MARKERS:
-            if marker in no_jobs_flat:
-                return "NO_AVAILABLE_JOBS"
+    async def next_delay(self, interval: float) -> float:
+        """Record a poll that just finished and return the delay that puts our next poll in our slot."""
+        now = time.time()
+        group_last_poll = {}
 
-    # Fallback: if we can't find jobs and can't find "no jobs" message, assume no jobs
-    return "NO_AVAILABLE_JOBS"
+        def heartbeat(state: dict) -> None:
+            members = state["members"]
+            for cid in [cid for cid, m in members.items() if now - m.get("heartbeat", 0) > PHASE_LEASE_SECONDS]:
+                log(f"[phase] {cid} lease expired, dropping it from the rotation")
+                del members[cid]
+            group_last_poll["at"] = max((m.get("last_poll", 0) for m in members.values()), default=0)
+            members[self.controller_id] = {"heartbeat": now, "last_poll": now}
+
+        state = await asyncio.to_thread(self._locked_update, heartbeat)
+        members = state["members"]
+
+        if group_last_poll["at"]:
+            self.worst_gap = max(self.worst_gap, now - group_last_poll["at"])
+        if now - self._report_started >= PHASE_REPORT_SECONDS:
+            log(f"[phase] {len(members)} live controller(s), worst gap between polls {self.worst_gap:.1f}s")
+            self.worst_gap = 0.0
+            self._report_started = now
+
+        ranked = sorted(members, key=controller_rank_key)
+        rank = ranked.index(self.controller_id)
+        if len(ranked) == 1 or rank == 0:
+            # Sole/first controller sets the rhythm (and drift) for the group
+            return interval
+
+        leader_last = members[ranked[0]]["last_poll"]
+        slot = interval * rank / len(ranked)
+        target = leader_last + slot
+        earliest = now + interval * PHASE_MIN_DELAY_FRACTION
+        while target < earliest:
+            target += interval
+        return target - now
+
+    async def leave(self) -> None:
+        """Give up our slot immediately (clean shutdown)."""
+        try:
+            await asyncio.to_thread(self._locked_update, lambda state: state["members"].pop(self.controller_id, None))
+        except Exception as e:
+            log(f"[phase] Could not leave rotation: {e}")
 
 # ---------------------------------------------------------------------
 # AUTH / MAIN LOOP
@@ -889,7 +3656,7 @@ async def ensure_logged_in_strategy_clear_cookies(page, context, username: str,
         await asyncio.sleep(1)
         
         # Navigate to login page with cleared state
-        await page.goto(LOGIN_URL, wait_until="load", timeout=60000)
+        await page.goto(login_url(), wait_until="load", timeout=60000)
         await asyncio.sleep(2)  # Extra wait for page to fully load
         
         # Use simple strategy (like old code) but with cleared cookies
@@ -944,56 +3711,203 @@ async def ensure_logged_in_strategy_clear_cookies(page, context, username: str,
         return False
 
 
-async def main() -> None:
-    username = os.getenv("FRONTLINE_USERNAME")
-    password = os.getenv("FRONTLINE_PASSWORD")
-    if not username or not password:
-        print("ERROR: Missing FRONTLINE_USERNAME or FRONTLINE_PASSWORD")
-        print()
-        print(
-            "Required environment variables:\n"
-            "  - FRONTLINE_USERNAME\n"
-            "  - FRONTLINE_PASSWORD\n"
-            "  - CONTROLLER_ID (controller_1 through controller_5)\n"
-            "  - DISTRICT_ID\n"
-            "  - FIREBASE_PROJECT_ID\n"
-            "  - FIREBASE_CREDENTIALS_PATH\n"
-        )
-        sys.exit(1)
+# ---------------------------------------------------------------------
+# SESSION REFRESH
+# ---------------------------------------------------------------------
+
+# Renew the Frontline session in a background context before its cookies
+# expire, instead of finding out from a reload that lands on the login page
+SESSION_REFRESH = os.getenv("SESSION_REFRESH", "0") == "1"
+# Renew this long before the earliest session cookie expires
+SESSION_REFRESH_MARGIN_SECONDS = int(os.getenv("SESSION_REFRESH_MARGIN_SECONDS", "900"))
+# Renew at least this often when the session cookies have no expiry (0 = only on cookie expiry)
+SESSION_MAX_AGE_SECONDS = int(os.getenv("SESSION_MAX_AGE_SECONDS", "0"))
+SESSION_CHECK_INTERVAL_SECONDS = 60
+# Wait this long after a failed background login before trying again
+SESSION_REFRESH_RETRY_SECONDS = 300
+# Cookies that carry the session: domain suffix and name pattern. The default
+# names the ASP.NET / IdentityServer auth cookies Frontline's login sets; check
+# it against a saved storage state (save-auth-context.py) if renewals misfire.
+# Analytics and load-balancer cookies on the same domain must not match, or
+# their short expiry would trigger a background login on every check.
+SESSION_COOKIE_DOMAIN = os.getenv("SESSION_COOKIE_DOMAIN", "frontlineeducation.com")
+SESSION_COOKIE_NAME_PATTERN = re.compile(os.getenv(
+    "SESSION_COOKIE_NAME_PATTERN", r"\.ASPXAUTH|\.AspNetCore\.(Cookies|Identity\.Application)|idsrv(\.session)?",
+))
+
+def session_expiry(storage_state: dict, first_seen: Optional[dict] = None, now: Optional[float] = None) -> Optional[float]:
+    """
+    Earliest expiry (unix time) of the session cookies in a storage state, None if all are session-only.
+    With first_seen ({(domain, name, expires): unix time}, kept by the caller across calls), a cookie
+    whose lifetime since it was first seen is under SESSION_REFRESH_MARGIN_SECONDS is short-lived by
+    design (rolled on every response) and not taken as the session.
+    """
+    now = time.time() if now is None else now
+    expiries = []
+    for cookie in storage_state.get('cookies', []):
+        if not (cookie.get('expires', -1) > 0
+                and _host_matches(cookie.get('domain', '').lstrip('.'), SESSION_COOKIE_DOMAIN)
+                and SESSION_COOKIE_NAME_PATTERN.fullmatch(cookie.get('name', ''))):
+            continue
+        if first_seen is not None:
+            seen = first_seen.setdefault((cookie.get('domain', ''), cookie['name'], cookie['expires']), now)
+            if cookie['expires'] - seen < SESSION_REFRESH_MARGIN_SECONDS:
+                continue
+        expiries.append(cookie['expires'])
+    return min(expiries) if expiries else None
+
+class SessionManager:
+    """
+    Keeps one controller's polling context logged in.
+    A background task checks the context's cookie expiry every
+    SESSION_CHECK_INTERVAL_SECONDS; when the session is within
+    SESSION_REFRESH_MARGIN_SECONDS of expiring (or older than SESSION_MAX_AGE_SECONDS)
+    it logs in again in a separate context, saves that storage state and copies
+    its cookies into the polling context, so polling never stops.
+    """
+
+    def __init__(self, browser, context, controller_id: str, username: str, password: str,
+                 storage_state_path: str):
+        self.browser = browser
+        self.context = context
+        self.controller_id = controller_id
+        self.username = username
+        self.password = password
+        self.storage_state_path = storage_state_path
+        self.renewed_at = time.time()
+        # When each session cookie expiry was first seen, to tell short-lived cookies apart
+        self.cookie_first_seen: dict[tuple, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def seconds_until_refresh(self) -> float:
+        now = time.time()
+        # Forget expiries that have passed
+        self.cookie_first_seen = {key: seen for key, seen in self.cookie_first_seen.items() if key[2] > now}
+        expiry = session_expiry(await self.context.storage_state(), self.cookie_first_seen, now)
+        deadlines = []
+        if expiry is not None:
+            deadlines.append(expiry - SESSION_REFRESH_MARGIN_SECONDS)
+        if SESSION_MAX_AGE_SECONDS:
+            deadlines.append(self.renewed_at + SESSION_MAX_AGE_SECONDS)
+        return min(deadlines) - time.time() if deadlines else float("inf")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                remaining = await self.seconds_until_refresh()
+                if remaining <= 0:
+                    if not await self.renew():
+                        await asyncio.sleep(SESSION_REFRESH_RETRY_SECONDS)
+                        continue
+                elif remaining < SESSION_CHECK_INTERVAL_SECONDS:
+                    await asyncio.sleep(remaining)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log(f"[session] Refresh check failed: {e}")
+            await asyncio.sleep(SESSION_CHECK_INTERVAL_SECONDS)
+
+    async def renew(self) -> bool:
+        """Fresh login in a throwaway context; on success swap its cookies into the polling context."""
+        log("[session] Session expiring soon, renewing in background context...")
+        started = time.monotonic()
+        context = await self.browser.new_context()
+        try:
+            page = await context.new_page()
+            await page.goto(login_url(), wait_until="domcontentloaded", timeout=60000)
+            if not await ensure_logged_in_strategy_simple(page, self.username, self.password):
+                log("[session] ❌ Background login failed, polling context keeps its current session")
+                metrics.inc("session_refresh_failures", self.controller_id)
+                return False
+
+            await page.goto(jobs_url(), wait_until="load", timeout=60000)
+            if "login.frontlineeducation.com" in page.url:
+                log("[session] ❌ Background login redirected back to login page")
+                metrics.inc("session_refresh_failures", self.controller_id)
+                return False
+
+            state = await context.storage_state(path=self.storage_state_path)
+            # add_cookies() replaces same-named cookies in place, so there is no
+            # moment where the polling context has no session
+            await self.context.add_cookies(state.get('cookies', []))
+            self.renewed_at = time.time()
+            metrics.inc("session_refreshes", self.controller_id)
+            expiry = session_expiry(state)
+            expires = f", expires {datetime.fromtimestamp(expiry, timezone.utc):%Y-%m-%d %H:%M} UTC" if expiry else ""
+            log(f"[session] ✅ Session renewed in {time.monotonic() - started:.1f}s and saved to {self.storage_state_path}{expires}")
+            return True
+        except Exception as e:
+            log(f"[session] ❌ Background renewal error: {e}")
+            metrics.inc("session_refresh_failures", self.controller_id)
+            return False
+        finally:
+            await context.close()
 
-    log(f"[init] Controller: {CONTROLLER_ID}, District: {DISTRICT_ID}")
-    log(f"[init] Firebase Project: {FIREBASE_PROJECT_ID}")
 
+async def run_controller(browser, controller_id: str, district_id: str, username: str,
+                         password: str, storage_state_path: str) -> None:
+    """
+    Log in and watch the jobs page for one controller in its own browser context.
+    Runs until re-login is exhausted (raises) or the task is cancelled.
+    """
     relogin_failures = 0
     MAX_RELOGIN_FAILURES = 3  # Limit to 3 attempts with different strategies
+    metrics.set_district(controller_id, district_id)
+    # Build the district's school index now rather than on the first publish
+    current_school_index()
 
-    # Apply initial offset for this controller
-    offset = get_scraper_offset()
+    # Restarts by the supervisor count from here, the first run from process start
+    startup_started = time.monotonic() if metrics.get("time_to_first_poll_seconds", controller_id) is not None else PROCESS_STARTED
+
+    # Apply initial offset for this controller (phase coordination re-slots continuously instead)
+    offset = 0 if PHASE_COORDINATION else get_scraper_offset(controller_id)
     if offset > 0:
-        log(f"[init] Applying {offset}s offset for {CONTROLLER_ID}")
+        log(f"[init] Applying {offset}s offset for {controller_id}")
         await asyncio.sleep(offset)
 
-    async with async_playwright() as p:
-        # Try to load saved browser context (cookies from manual auth)
-        # This allows us to bypass SSO by using a pre-authenticated session
-        storage_state_path = os.getenv("STORAGE_STATE_PATH", f"/opt/frontline-watcher/storage_state_{CONTROLLER_ID}.json")
-        context_options = {}
-        
-        if os.path.exists(storage_state_path):
-            try:
-                context_options["storage_state"] = storage_state_path
-                log(f"[auth] Loading saved browser context from {storage_state_path}")
-            except Exception as e:
-                log(f"[auth] Warning: Could not load saved context: {e}")
-        else:
-            log(f"[auth] No saved browser context found at {storage_state_path}, will use username/password")
-        
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(**context_options)
+    # Try to load saved browser context (cookies from manual auth)
+    # This allows us to bypass SSO by using a pre-authenticated session
+    context_options = {}
+
+    if os.path.exists(storage_state_path):
+        try:
+            context_options["storage_state"] = storage_state_path
+            log(f"[auth] Loading saved browser context from {storage_state_path}")
+        except Exception as e:
+            log(f"[auth] Warning: Could not load saved context: {e}")
+    else:
+        log(f"[auth] No saved browser context found at {storage_state_path}, will use username/password")
+
+    context = await browser.new_context(**context_options)
+    pipeline = None
+    phase_coordinator = None
+    session_manager = None
+    pages = None
+    http_poller = None
+    memory_governor = MemoryGovernor(controller_id) if MEMORY_GOVERNOR else None
+    try:
+        request_blocker = RequestBlocker()
+        await request_blocker.install(context)
+
         page = await context.new_page()
         page.on("dialog", lambda d: asyncio.create_task(d.accept()))
+        pages = PageBuffer(controller_id)
+        await pages.add_page(context, page)
+        feed = pages.feed
 
-        await page.goto(JOBS_URL)
+        await page.goto(jobs_url())
         await page.wait_for_load_state("domcontentloaded")
 
         if "login.frontlineeducation.com" in page.url:
@@ -1003,7 +3917,7 @@ async def main() -> None:
                 log(f"[auth] Saved context expired, attempting fresh login...")
             
             # Use simple strategy for initial login (like old working code)
-            await page.goto(LOGIN_URL, wait_until="domcontentloaded", timeout=60000)
+            await page.goto(login_url(), wait_until="domcontentloaded", timeout=60000)
             ok = await ensure_logged_in_strategy_simple(page, username, password)
             if ok:
                 log("[auth] ✅ Initial login attempt successful, verifying...")
@@ -1015,14 +3929,14 @@ async def main() -> None:
                     log(f"[auth] Warning: Could not save context: {e}")
                 
                 # Navigate to jobs page and verify we're actually logged in
-                await page.goto(JOBS_URL, wait_until="load", timeout=60000)
+                await page.goto(jobs_url(), wait_until="load", timeout=60000)
                 
                 # CRITICAL: Verify we're not redirected back to login page
                 await asyncio.sleep(2)  # Give page time to redirect if needed
                 if "login.frontlineeducation.com" in page.url:
                     log("[auth] ❌ Redirected back to login page - initial login was not successful")
                     error_msg = "❌ Frontline watcher: Initial login appeared successful but was redirected to login page. SSO/captcha may be blocking. Cannot proceed."
-                    notify(error_msg)
+                    await notifier.send(error_msg, controller_id)
                     raise Exception("Initial login failed - redirected back to login page, SSO/captcha blocking")
                 else:
                     log("[auth] ✅ Verified logged in - not redirected to login page")
@@ -1032,190 +3946,506 @@ async def main() -> None:
                 if error_msg_detected:
                     log(f"[auth] ❌ Initial login failed - credential error detected: {error_msg_detected}")
                     log("[auth] ⚠️  This suggests the username/password may be INCORRECT")
-                    error_msg = f"❌ Frontline watcher: Initial login failed.\n\nError message: {error_msg_detected}\n\n⚠️  This suggests the username/password for controller_1 may be INCORRECT.\nPlease verify the credentials in the .env file on EC2."
-                    notify(error_msg)
+                    error_msg = f"❌ Frontline watcher: Initial login failed.\n\nError message: {error_msg_detected}\n\n⚠️  This suggests the username/password for {controller_id} may be INCORRECT.\nPlease verify the credentials in the .env file on EC2."
+                    await notifier.send(error_msg, controller_id)
                     raise Exception(f"Initial login failed - credential error: {error_msg_detected}")
                 else:
                     log("[auth] ❌ Initial login failed - SSO/captcha may be blocking. Cannot proceed.")
                     error_msg = "❌ Frontline watcher: Initial login failed. SSO/captcha may be blocking automated login. Cannot proceed."
-                    notify(error_msg)
+                    await notifier.send(error_msg, controller_id)
                     raise Exception("Initial login failed - SSO/captcha blocking automated login")
         else:
             log("[auth] ✅ Already logged in (using saved context or existing session)")
 
-        await page.wait_for_load_state("load", timeout=60000)
+        if SESSION_REFRESH:
+            session_manager = SessionManager(browser, context, controller_id, username, password, storage_state_path)
+            session_manager.start()
 
-        baseline = await get_available_jobs_snapshot(page)
+        page_recorder = PageRecorder(RECORD_PAGES_DIR, controller_id) if RECORD_PAGES_DIR else None
         log("[*] Monitoring started.")
-        log(f"[available_jobs baseline]:\n{baseline[:500]}")
-        
-        # Send startup notification
-        startup_message = f"🚀 Frontline watcher started\nController: {CONTROLLER_ID}\nDistrict: {DISTRICT_ID}\nNTFY Topic: {get_ntfy_topic()}"
-        notify(startup_message)
-        log(f"[notify] Sent startup notification to {get_ntfy_topic()}")
 
-        # Track which jobs we've already published in this session (bounded LRU cache)
-        # Firestore already handles deduplication, but this helps avoid redundant checks
-        # Limit to last 100 jobs to prevent unbounded growth
-        MAX_SESSION_CACHE = 100
-        published_job_ids = set()
+        # Send startup notification in the background; the first poll does not wait for it
+        startup_message = f"🚀 Frontline watcher started\nController: {controller_id}\nDistrict: {district_id}\nNTFY Topic: {get_ntfy_topic(controller_id)}"
+        startup_notify = asyncio.create_task(notifier.send(startup_message, controller_id))
+
+        # Firestore may still be initializing; the publish pipeline and the adaptive
+        # schedule wait for it themselves, so the first poll doesn't
+
+        # Track which jobs are already in Firestore (bounded, persisted across restarts)
+        # Firestore already handles deduplication, but this avoids redundant reads
+        dedup_index = DedupIndex(get_dedup_index_path(controller_id))
+
+        # Only jobs that appeared since the last poll go downstream
+        snapshot_diff = SnapshotDiff()
+
+        poll_scheduler = AdaptivePollScheduler(district_id) if POLL_SCHEDULER == "adaptive" else None
+        poll_stats = PollStats(POLL_SCHEDULER)
+        phase_coordinator = PhaseCoordinator(controller_id, district_id) if PHASE_COORDINATION else None
+
+        def record_publish_result(block: str, job_data: dict, status: str) -> None:
+            job_id = job_data['confirmationNumber']
+            if status == PUBLISHED:
+                dedup_index.add(job_event_id(district_id, job_data), job_data)
+                metrics.inc("published", controller_id)
+                log(f"[publish] ✅ Published and notified for job {job_id}")
+            elif status == ALREADY_EXISTS:
+                dedup_index.add(job_event_id(district_id, job_data), job_data)
+                metrics.inc("already_exists", controller_id)
+                log(f"[publish] Job {job_id} already exists in Firestore, skipping notification")
+            else:
+                metrics.inc("publish_failures", controller_id)
+                log(f"[publish] Job {job_id} failed to publish, will retry next poll")
+                snapshot_diff.forget(block)
+
+        # Firestore writes and notifications run off the scrape loop
+        pipeline = PublishPipeline(controller_id, district_id, record_publish_result)
+
+        if POLL_DOUBLE_BUFFER:
+            await pages.add_page(context)
+            cap = f", capped at {POLL_MAX_RELOADS_PER_MINUTE:g} loads/min" if POLL_MAX_RELOADS_PER_MINUTE > 0 else ""
+            log(f"[poll] Double-buffered polling with {len(pages.entries)} pages{cap}")
+        if HTTP_POLL:
+            http_poller = HttpJobPoller(controller_id)
+            await http_poller.sync(context, feed)
+            log(f"[http] Browserless polling {'of ' + http_poller.url if http_poller.ready else 'starts once the job feed is seen'}")
+
+        # Set while the session is expired, until polling resumes
+        unauthenticated_since: Optional[float] = None
+
+        # The page loaded at startup is already fresh, so the first poll extracts without reloading
+        first_poll = True
 
         while True:
-            try:
-                # Check if page is still valid before reloading
-                if page.is_closed():
-                    log("[!] Page is closed, cannot reload. This should not happen.")
-                    raise Exception("Page is closed")
-                
-                await page.reload(wait_until="domcontentloaded", timeout=30000)
-            except PWTimeout:
-                log("[!] reload timeout, trying goto instead...")
-                try:
-                    await page.goto(JOBS_URL, wait_until="domcontentloaded", timeout=30000)
-                except Exception as goto_err:
-                    log(f"[!] goto also failed after reload timeout: {goto_err}")
-                    await asyncio.sleep(5)
-                    continue
-            except Exception as e:
-                log(f"[!] reload error: {e}, trying goto instead...")
-                try:
-                    # If reload fails, try navigating to the URL directly
-                    await page.goto(JOBS_URL, wait_until="domcontentloaded", timeout=30000)
-                except Exception as goto_err:
-                    log(f"[!] goto also failed after reload error: {goto_err}")
-                    # If both fail, wait a bit longer and continue
+            # Browserless poll first; the browser only runs when it cannot answer
+            current = await http_poller.poll() if http_poller is not None else None
+            via_http = current is not None
+            if not via_http:
+                wait_started = time.monotonic()
+                loaded = True if first_poll else await pages.next()
+                page, feed = pages.page, pages.feed
+                if not loaded:
+                    # If both reload and goto failed, wait a bit longer and continue
                     await asyncio.sleep(5)
                     continue
+                metrics.observe("page_wait", time.monotonic() - wait_started, controller_id)
 
-            if "login.frontlineeducation.com" in page.url:
-                relogin_failures += 1
-                log(f"[auth] Session expired. Attempt {relogin_failures}/{MAX_RELOGIN_FAILURES}")
+                if "login.frontlineeducation.com" in page.url:
+                    # Keep the standby page off the login flow until this page is back in
+                    await pages.cancel_prefetch()
+                    relogin_failures += 1
+                    metrics.inc("session_expired", controller_id)
+                    if unauthenticated_since is None:
+                        unauthenticated_since = time.monotonic()
+                    log(f"[auth] Session expired. Attempt {relogin_failures}/{MAX_RELOGIN_FAILURES}")
                 
-                # Send notification about session expiry and which attempt we're on
-                session_expired_msg = f"⚠️ Frontline watcher: Session expired. Attempting re-login (Attempt {relogin_failures}/{MAX_RELOGIN_FAILURES})..."
-                notify(session_expired_msg)
+                    # Send notification about session expiry and which attempt we're on
+                    session_expired_msg = f"⚠️ Frontline watcher: Session expired. Attempting re-login (Attempt {relogin_failures}/{MAX_RELOGIN_FAILURES})..."
+                    await notifier.send(session_expired_msg, controller_id)
                 
-                # Exponential backoff: wait longer with each failure
-                backoff_delay = min(30 * (2 ** (relogin_failures - 1)), 120)  # 30s, 60s, 120s max
-                if relogin_failures > 1:
-                    log(f"[auth] Backing off for {backoff_delay}s before retry")
-                    await asyncio.sleep(backoff_delay)
-
-                # Try different login strategies based on attempt number
-                ok = False
-                strategy_name = ""
+                    # Exponential backoff: wait longer with each failure
+                    backoff_delay = min(30 * (2 ** (relogin_failures - 1)), 120)  # 30s, 60s, 120s max
+                    if relogin_failures > 1:
+                        log(f"[auth] Backing off for {backoff_delay}s before retry")
+                        await asyncio.sleep(backoff_delay)
+
+                    # Try different login strategies based on attempt number
+                    ok = False
+                    strategy_name = ""
                 
-                if relogin_failures == 1:
-                    # Strategy 1: Simple login (like old working code)
-                    strategy_name = "Simple (like old code)"
-                    log(f"[auth] Attempt {relogin_failures}/{MAX_RELOGIN_FAILURES}: Trying Strategy 1 - {strategy_name}")
-                    try:
-                        await page.goto(LOGIN_URL, wait_until="domcontentloaded", timeout=60000)
-                        ok = await ensure_logged_in_strategy_simple(page, username, password)
-                    except Exception as e:
-                        log(f"[auth-strategy-1] Error: {e}")
-                        ok = False
+                    if relogin_failures == 1:
+                        # Strategy 1: Simple login (like old working code)
+                        strategy_name = "Simple (like old code)"
+                        log(f"[auth] Attempt {relogin_failures}/{MAX_RELOGIN_FAILURES}: Trying Strategy 1 - {strategy_name}")
+                        try:
+                            await page.goto(login_url(), wait_until="domcontentloaded", timeout=60000)
+                            ok = await ensure_logged_in_strategy_simple(page, username, password)
+                        except Exception as e:
+                            log(f"[auth-strategy-1] Error: {e}")
+                            ok = False
                         
-                elif relogin_failures == 2:
-                    # Strategy 2: Delayed actions with Enter key
-                    strategy_name = "Delayed with Enter key"
-                    log(f"[auth] Attempt {relogin_failures}/{MAX_RELOGIN_FAILURES}: Trying Strategy 2 - {strategy_name}")
-                    try:
-                        await page.goto(LOGIN_URL, wait_until="domcontentloaded", timeout=60000)
-                        ok = await ensure_logged_in_strategy_delayed(page, username, password)
-                    except Exception as e:
-                        log(f"[auth-strategy-2] Error: {e}")
-                        ok = False
+                    elif relogin_failures == 2:
+                        # Strategy 2: Delayed actions with Enter key
+                        strategy_name = "Delayed with Enter key"
+                        log(f"[auth] Attempt {relogin_failures}/{MAX_RELOGIN_FAILURES}: Trying Strategy 2 - {strategy_name}")
+                        try:
+                            await page.goto(login_url(), wait_until="domcontentloaded", timeout=60000)
+                            ok = await ensure_logged_in_strategy_delayed(page, username, password)
+                        except Exception as e:
+                            log(f"[auth-strategy-2] Error: {e}")
+                            ok = False
                         
-                else:  # relogin_failures == 3
-                    # Strategy 3: Clear cookies and try again
-                    strategy_name = "Clear cookies and retry"
-                    log(f"[auth] Attempt {relogin_failures}/{MAX_RELOGIN_FAILURES}: Trying Strategy 3 - {strategy_name}")
-                    try:
-                        ok = await ensure_logged_in_strategy_clear_cookies(page, context, username, password)
-                    except Exception as e:
-                        log(f"[auth-strategy-3] Error: {e}")
-                        ok = False
-
-                if ok:
-                    attempt_num = relogin_failures  # Save attempt number before resetting
-                    log(f"[auth] ✅ Strategy '{strategy_name}' (Attempt {attempt_num}/{MAX_RELOGIN_FAILURES}) succeeded, verifying...")
-                    try:
-                        await page.goto(JOBS_URL, wait_until="load", timeout=60000)
-                        # Verify we're not redirected back to login
-                        await asyncio.sleep(2)  # Give page time to redirect if needed
-                        if "login.frontlineeducation.com" in page.url:
-                            log(f"[auth] ❌ Strategy '{strategy_name}' (Attempt {attempt_num}/{MAX_RELOGIN_FAILURES}) appeared successful but redirected to login page")
-                            ok = False  # Treat as failure
-                        else:
-                            relogin_failures = 0  # reset on success
-                            success_msg = f"✅ Frontline watcher: Re-authenticated successfully!\n  Strategy: {strategy_name}\n  Attempt: {attempt_num}/{MAX_RELOGIN_FAILURES}"
-                            log("[auth] ✅ Successfully re-authenticated and verified on jobs page")
-                            notify(success_msg)
-                    except Exception as e:
-                        log(f"[auth] goto(JOBS_URL) failed after login: {e}")
-                        await asyncio.sleep(10)
-                        continue
-                
-                if not ok:
-                    log(f"[auth] ❌ Strategy '{strategy_name}' (Attempt {relogin_failures}/{MAX_RELOGIN_FAILURES}) failed")
-                    if relogin_failures >= MAX_RELOGIN_FAILURES:
-                        error_msg = f"🔥 Frontline watcher: Session expired and all {MAX_RELOGIN_FAILURES} re-login strategies failed:\n  Attempt 1/3: Simple (like old code) - FAILED\n  Attempt 2/3: Delayed with Enter key - FAILED\n  Attempt 3/3: Clear cookies and retry - FAILED\n\nBlocked by SSO/captcha. Stopping to avoid rate limiting."
-                        log(error_msg)
-                        notify(error_msg)
-                        raise Exception(f"Max relogin failures ({MAX_RELOGIN_FAILURES}) reached - all strategies exhausted, stopping to avoid rate limiting")
-                    continue
+                    else:  # relogin_failures == 3
+                        # Strategy 3: Clear cookies and try again
+                        strategy_name = "Clear cookies and retry"
+                        log(f"[auth] Attempt {relogin_failures}/{MAX_RELOGIN_FAILURES}: Trying Strategy 3 - {strategy_name}")
+                        try:
+                            ok = await ensure_logged_in_strategy_clear_cookies(page, context, username, password)
+                        except Exception as e:
+                            log(f"[auth-strategy-3] Error: {e}")
+                            ok = False
 
-            current = await get_available_jobs_snapshot(page)
-            
-            if current != "NO_AVAILABLE_JOBS":
-                # Extract individual job blocks
-                job_blocks = [b.strip() for b in current.split("\n\n") if b.strip()]
+                    if ok:
+                        attempt_num = relogin_failures  # Save attempt number before resetting
+                        log(f"[auth] ✅ Strategy '{strategy_name}' (Attempt {attempt_num}/{MAX_RELOGIN_FAILURES}) succeeded, verifying...")
+                        try:
+                            await page.goto(jobs_url(), wait_until="load", timeout=60000)
+                            # Verify we're not redirected back to login
+                            await asyncio.sleep(2)  # Give page time to redirect if needed
+                            if "login.frontlineeducation.com" in page.url:
+                                log(f"[auth] ❌ Strategy '{strategy_name}' (Attempt {attempt_num}/{MAX_RELOGIN_FAILURES}) appeared successful but redirected to login page")
+                                ok = False  # Treat as failure
+                            else:
+                                relogin_failures = 0  # reset on success
+                                if session_manager is not None:
+                                    session_manager.renewed_at = time.time()
+                                success_msg = f"✅ Frontline watcher: Re-authenticated successfully!\n  Strategy: {strategy_name}\n  Attempt: {attempt_num}/{MAX_RELOGIN_FAILURES}"
+                                log("[auth] ✅ Successfully re-authenticated and verified on jobs page")
+                                await notifier.send(success_msg, controller_id)
+                        except Exception as e:
+                            log(f"[auth] goto(JOBS_URL) failed after login: {e}")
+                            await asyncio.sleep(10)
+                            continue
                 
-                log(f"[monitor] Found {len(job_blocks)} job(s) on page")
+                    if not ok:
+                        log(f"[auth] ❌ Strategy '{strategy_name}' (Attempt {relogin_failures}/{MAX_RELOGIN_FAILURES}) failed")
+                        if relogin_failures >= MAX_RELOGIN_FAILURES:
+                            error_msg = f"🔥 Frontline watcher: Session expired and all {MAX_RELOGIN_FAILURES} re-login strategies failed:\n  Attempt 1/3: Simple (like old code) - FAILED\n  Attempt 2/3: Delayed with Enter key - FAILED\n  Attempt 3/3: Clear cookies and retry - FAILED\n\nBlocked by SSO/captcha. Stopping to avoid rate limiting."
+                            log(error_msg)
+                            await notifier.send(error_msg, controller_id)
+                            raise Exception(f"Max relogin failures ({MAX_RELOGIN_FAILURES}) reached - all strategies exhausted, stopping to avoid rate limiting")
+                        continue
+
+                if unauthenticated_since is not None:
+                    blind = time.monotonic() - unauthenticated_since
+                    unauthenticated_since = None
+                    metrics.observe("unauthenticated", blind, controller_id)
+                    metrics.inc("unauthenticated_seconds", controller_id, blind)
+                    log(f"[auth] Polling resumed after {blind:.1f}s unauthenticated")
+
+                extract_started = time.monotonic()
+                current = await get_available_jobs_snapshot(page, feed)
+                metrics.observe("extract", time.monotonic() - extract_started, controller_id)
+                if http_poller is not None:
+                    await http_poller.sync(context, feed, current)
+
+            queued = 0
+            changes = snapshot_diff.update(current)
+            if changes is None:
+                log("[monitor] Page unchanged since last poll")
+            else:
+                added, removed = changes
+                log(f"[monitor] Found {snapshot_diff.job_count()} job(s) on page ({len(added)} new, {len(removed)} gone)")
+                metrics.inc("new_jobs", controller_id, len(added))
+                if page_recorder and not via_http:
+                    await page_recorder.record(page)
                 
-                for block in job_blocks:
+                for block in added:
                     # Parse to get job ID for tracking
+                    parse_started = time.monotonic()
                     job_data = parse_job_block(block)
+                    metrics.observe("parse", time.monotonic() - parse_started, controller_id)
                     if job_data and job_data['confirmationNumber']:
                         job_id = job_data['confirmationNumber']
                         
-                        # Skip if we've already published this job in this session
-                        if job_id in published_job_ids:
-                            log(f"[monitor] Job {job_id} already processed in this session, skipping")
+                        # Skip if this job is already known to be in Firestore
+                        dedup_started = time.monotonic()
+                        known = job_event_id(district_id, job_data) in dedup_index
+                        metrics.observe("dedup", time.monotonic() - dedup_started, controller_id)
+                        if known:
+                            log(f"[monitor] Job {job_id} already published, skipping")
                             continue
-                        
-                        # Try to publish (this will send NTFY notification if it's a new job)
-                        published = publish_job_event(block)
-                        if published:
-                            # Add to session cache (bounded LRU)
-                            if len(published_job_ids) >= MAX_SESSION_CACHE:
-                                # Remove oldest entry (simple FIFO since we can't track access order easily)
-                                # In practice, Firestore deduplication handles this, so we just clear when full
-                                published_job_ids.clear()
-                            published_job_ids.add(job_id)
-                            log(f"[publish] ✅ Published and notified for job {job_id}")
-                        else:
-                            log(f"[publish] Job {job_id} already exists in Firestore, skipping notification")
+
+                        # Hand off to the publish pipeline (sends NTFY notification if it's a new job)
+                        if pipeline.submit(block, job_data):
+                            queued += 1
                     else:
                         log(f"[publish] Could not parse job block, skipping")
-            
-            # Update baseline
-            baseline = current
-
-            # Determine delay based on hot window and configured interval
-            SCRAPE_INTERVAL = int(os.getenv("SCRAPE_INTERVAL_SECONDS", "15"))
-            if should_run_aggressive():
-                # Use configured interval (with small random variation)
-                delay = SCRAPE_INTERVAL + random.uniform(-2, 2)
-            else:
-                # Slower outside hot windows (5x the interval)
-                delay = SCRAPE_INTERVAL * 5
 
+                if queued:
+                    log(f"[monitor] Queued {queued} job(s) for publishing (queue depth {pipeline.depth()})")
+
+            poll_stats.record_poll(queued)
+            metrics.inc("polls", controller_id)
+            if first_poll:
+                first_poll = False
+                time_to_first_poll = time.monotonic() - startup_started - offset
+                metrics.set("time_to_first_poll_seconds", time_to_first_poll, controller_id)
+                log(f"[init] First poll completed {time_to_first_poll:.1f}s after start")
+
+            # Determine delay based on the configured scheduler
+            delay = poll_scheduler.next_delay() if poll_scheduler else get_static_delay()
+            if phase_coordinator:
+                try:
+                    delay = await phase_coordinator.next_delay(delay)
+                except Exception as e:
+                    log(f"[phase] Coordination unavailable, keeping own schedule: {e}")
+
+            # Persist results that arrived during this poll (no-op if nothing changed)
+            dedup_index.save()
+            metrics.maybe_write_json()
+
+            recycle = await memory_governor.check(context, page) if memory_governor is not None else None
+            if recycle is not None:
+                # Replace the page or context now so the next poll runs on schedule
+                recycle_started = time.monotonic()
+                new_context = None
+                try:
+                    if recycle == RECYCLE_CONTEXT:
+                        new_context = await browser.new_context(storage_state=await context.storage_state())
+                        new_blocker = RequestBlocker()
+                        await new_blocker.install(new_context)
+                        loaded = await pages.recycle(new_context)
+                        old_context, context, request_blocker = context, new_context, new_blocker
+                        new_context = None
+                        if session_manager is not None:
+                            session_manager.context = context
+                        try:
+                            await old_context.close()
+                        except Exception as e:
+                            log(f"[memory] Could not close the old context: {e}")
+                    else:
+                        loaded = await pages.recycle(context)
+                except Exception as e:
+                    # Keep polling on the current page and context; the governor asks again later
+                    log(f"[memory] Could not recycle {recycle}, keeping the current one: {e}")
+                    metrics.inc("recycle_errors", controller_id)
+                    if new_context is not None:
+                        try:
+                            await new_context.close()
+                        except Exception:
+                            pass
+                else:
+                    page, feed = pages.page, pages.feed
+                    if http_poller is not None:
+                        await http_poller.sync(context, feed)
+                    elapsed = time.monotonic() - recycle_started
+                    metrics.observe("recycle", elapsed, controller_id)
+                    metrics.inc(f"{recycle}_recycles", controller_id)
+                    log(f"[memory] Recycled {recycle} in {elapsed:.1f}s{'' if loaded else ' (page load failed, next poll retries)'}")
+                delay = max(0.0, delay - (time.monotonic() - recycle_started))
+
+            log(request_blocker.take_poll_stats())
             log(f"(sleeping {delay:.2f}s)")
+            if session_manager is not None and http_poller is not None and http_poller.ready \
+                    and session_manager.renewed_at > http_poller.synced_at:
+                # Pick up the cookies of a background session renewal
+                await http_poller.sync(context)
+            if http_poller is None or not http_poller.ready:
+                pages.prefetch(delay)
             await asyncio.sleep(delay)
+    finally:
+        if pages is not None:
+            await pages.cancel_prefetch()
+        if http_poller is not None:
+            await http_poller.close()
+        if session_manager is not None:
+            await session_manager.stop()
+        if phase_coordinator is not None:
+            await phase_coordinator.leave()
+        if pipeline is not None:
+            await pipeline.stop()
+        await context.close()
+
+
+async def main() -> None:
+    username = os.getenv("FRONTLINE_USERNAME")
+    password = os.getenv("FRONTLINE_PASSWORD")
+    if not username or not password:
+        print("ERROR: Missing FRONTLINE_USERNAME or FRONTLINE_PASSWORD")
+        print()
+        print(
+            "Required environment variables:\n"
+            "  - FRONTLINE_USERNAME\n"
+            "  - FRONTLINE_PASSWORD\n"
+            "  - CONTROLLER_ID (controller_1 through controller_5)\n"
+            "  - DISTRICT_ID\n"
+            "  - FIREBASE_PROJECT_ID\n"
+            "  - FIREBASE_CREDENTIALS_PATH\n"
+        )
+        sys.exit(1)
+
+    if not DISTRICT_ID:
+        print("ERROR: DISTRICT_ID environment variable is required")
+        sys.exit(1)
+
+    start_firebase_init()
+    start_metrics()
+
+    log(f"[init] Controller: {CONTROLLER_ID}, District: {DISTRICT_ID}")
+    log(f"[init] Firebase Project: {FIREBASE_PROJECT_ID}")
+
+    storage_state_path = os.getenv("STORAGE_STATE_PATH", f"/opt/frontline-watcher/storage_state_{CONTROLLER_ID}.json")
+
+    # Open the ntfy connection while Firebase initializes and the browser launches
+    warm_up = asyncio.create_task(notifier.warm_up())
+    try:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            await run_controller(browser, CONTROLLER_ID, DISTRICT_ID, username, password, storage_state_path)
+    finally:
+        warm_up.cancel()
+        await notifier.close()
+
+# ---------------------------------------------------------------------
+# MULTI-CONTROLLER SUPERVISOR
+# ---------------------------------------------------------------------
+
+# Comma-separated controller IDs to run in this process, e.g. "controller_1,controller_3".
+# Each controller gets its own browser context (credentials, cookies, offset)
+# inside one shared Chromium instead of one browser per process.
+SUPERVISE_CONTROLLERS = [c.strip() for c in os.getenv("SUPERVISE_CONTROLLERS", "").split(",") if c.strip()]
+
+# Directory holding the per-controller .env.<controller_id> files (same files the systemd units use)
+CONTROLLER_ENV_DIR = os.getenv("CONTROLLER_ENV_DIR", "/opt/frontline-watcher")
+
+# Delay before restarting a controller whose task failed (e.g. re-login exhausted)
+SUPERVISOR_RESTART_DELAY_SECONDS = int(os.getenv("SUPERVISOR_RESTART_DELAY_SECONDS", "300"))
+
+# Controllers that must never run (see CONTROLLER_2_PERMANENTLY_DISABLED.md)
+DISABLED_CONTROLLERS = {"controller_2"}
+
+# JSON district registry: watch every district it lists from this one process
+# (takes the place of SUPERVISE_CONTROLLERS). See district-registry.example.json
+DISTRICT_REGISTRY_PATH = os.getenv("DISTRICT_REGISTRY_PATH", "")
+
+# Per-district settings a registry entry may give; unset ones use the process-wide values
+DISTRICT_SETTINGS = {"jobsUrl", "loginUrl", "schools", "scrapeIntervalSeconds", "pollBudgetPerDay"}
+
+def load_controller_config(controller_id: str, district_id: Optional[str] = None) -> Optional[dict]:
+    """
+    Read a controller's credentials and district from CONTROLLER_ENV_DIR/.env.<controller_id>.
+    DISTRICT_ID falls back to the process environment unless district_id is given.
+    Returns None if credentials are missing.
+    """
+    env_path = os.path.join(CONTROLLER_ENV_DIR, f".env.{controller_id}")
+    values = dotenv_values(env_path) if os.path.exists(env_path) else {}
+
+    username = values.get("FRONTLINE_USERNAME")
+    password = values.get("FRONTLINE_PASSWORD")
+    if not username or not password:
+        log(f"[supervisor] {controller_id}: missing FRONTLINE_USERNAME/FRONTLINE_PASSWORD in {env_path}, skipping")
+        return None
+
+    district_id = district_id or values.get("DISTRICT_ID") or DISTRICT_ID
+    if not district_id:
+        log(f"[supervisor] {controller_id}: no DISTRICT_ID in {env_path} or environment, skipping")
+        return None
+
+    return {
+        'controller_id': controller_id,
+        'district_id': district_id,
+        'username': username,
+        'password': password,
+        'storage_state_path': values.get("STORAGE_STATE_PATH")
+            or f"/opt/frontline-watcher/storage_state_{controller_id}.json",
+    }
+
+def load_district_registry(path: str = DISTRICT_REGISTRY_PATH) -> list[dict]:
+    """
+    Controller configs for every account in the registry, e.g.
+    {"districts": {"alpine_school_district": {"controllers": ["controller_1", "controller_3"],
+                                              "scrapeIntervalSeconds": 15}}}
+    Each config carries its district's settings under 'district', plus its
+    place among the district's accounts for get_scraper_offset().
+    """
+    with open(path, encoding="utf-8") as f:
+        registry = json.load(f)
+
+    configs = []
+    seen: set[str] = set()
+    for district_id, entry in registry.get("districts", {}).items():
+        unknown = set(entry) - DISTRICT_SETTINGS - {"controllers"}
+        if unknown:
+            log(f"[registry] {district_id}: ignoring unknown setting(s) {', '.join(sorted(unknown))}")
+        settings = {key: entry[key] for key in DISTRICT_SETTINGS if key in entry}
+        if "schools" in settings:
+            settings["schools"] = os.path.join(os.path.dirname(os.path.abspath(path)), settings["schools"])
+
+        accounts = []
+        for controller_id in entry.get("controllers", []):
+            if controller_id in seen:
+                log(f"[registry] {district_id}: {controller_id} is already listed under another district, skipping")
+            elif controller_id in DISABLED_CONTROLLERS:
+                log(f"[registry] {district_id}: {controller_id} is permanently disabled, skipping")
+            else:
+                config = load_controller_config(controller_id, district_id)
+                if config:
+                    accounts.append(config)
+            seen.add(controller_id)
+
+        if not accounts:
+            log(f"[registry] {district_id}: no runnable controllers, skipping")
+        for number, config in enumerate(accounts, start=1):
+            config['district'] = {**settings, "numScrapers": len(accounts), "scraperNumber": number}
+            configs.append(config)
+        log(f"[registry] {district_id}: {len(accounts)} controller(s)")
+    return configs
+
+async def supervise_controller(browser, config: dict) -> None:
+    """Run one controller, restarting it after SUPERVISOR_RESTART_DELAY_SECONDS if it fails."""
+    controller_id = config['controller_id']
+    if config.get('district') is not None:
+        DISTRICT.set(config['district'])
+        LOG_TAG.set(f"[{config['district_id']}/{controller_id}]")
+    else:
+        LOG_TAG.set(f"[{controller_id}]")
+
+    while True:
+        try:
+            await run_controller(
+                browser, controller_id, config['district_id'],
+                config['username'], config['password'], config['storage_state_path'],
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log(f"[supervisor] Controller stopped: {e}")
+
+        if not browser.is_connected():
+            # Shared browser is gone - let the process exit so systemd restarts everything
+            raise RuntimeError("Browser disconnected")
+
+        log(f"[supervisor] Restarting in {SUPERVISOR_RESTART_DELAY_SECONDS}s")
+        await asyncio.sleep(SUPERVISOR_RESTART_DELAY_SECONDS)
+
+async def supervisor_main() -> None:
+    """
+    Run every controller in the district registry (or SUPERVISE_CONTROLLERS) as
+    a task sharing one Chromium.
+    """
+    configs = []
+    if DISTRICT_REGISTRY_PATH:
+        configs = load_district_registry()
+    else:
+        for controller_id in SUPERVISE_CONTROLLERS:
+            if controller_id in DISABLED_CONTROLLERS:
+                log(f"[supervisor] {controller_id} is permanently disabled, skipping")
+                continue
+            config = load_controller_config(controller_id)
+            if config:
+                configs.append(config)
+
+    if not configs:
+        print(f"ERROR: {'DISTRICT_REGISTRY_PATH' if DISTRICT_REGISTRY_PATH else 'SUPERVISE_CONTROLLERS'} has no runnable controllers")
+        sys.exit(1)
+
+    start_firebase_init()
+    start_metrics()
+
+    log(f"[supervisor] Controllers: {', '.join(c['controller_id'] for c in configs)}")
+    log(f"[init] Firebase Project: {FIREBASE_PROJECT_ID}")
+
+    # Open the ntfy connection while Firebase initializes and the browser launches
+    warm_up = asyncio.create_task(notifier.warm_up())
+    try:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            await asyncio.gather(*(supervise_controller(browser, config) for config in configs))
+    finally:
+        warm_up.cancel()
+        await notifier.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(supervisor_main() if SUPERVISE_CONTROLLERS or DISTRICT_REGISTRY_PATH else main())
 
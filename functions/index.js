@@ -22,7 +22,7 @@ function getStripe() {
 exports.onJobEventCreated = functions.firestore
   .document('job_events/{eventId}')
   .onCreate(async (snap, context) => {
-    const event = snap.data();
+    const event = expandJobEvent(snap.data());
     const eventId = context.params.eventId;
     
     console.log(`[Dispatcher] Processing job event: ${eventId}`);
@@ -256,7 +256,7 @@ exports.backfillJobStartTimeHistogram = functions.https.onCall(async (data, cont
 
   for (const doc of snap.docs) {
     lastId = doc.id;
-    const event = doc.data();
+    const event = expandJobEvent(doc.data());
     if (scope === 'district' && districtId && event.districtId !== districtId) continue;
     await updateJobStartTimeHistogram(event);
     processed += 1;
@@ -1496,6 +1496,67 @@ function rangesOverlap(aStart, aEnd, bStart, bEnd) {
   return a0 < b1 && b0 < a1;
 }
 
+// job_events documents come in two versions (see JOB EVENT SCHEMA in
+// frontline_watcher_refactored.py). Version 2 stores typed job fields and
+// only the keywords the text doesn't contain; expandJobEvent() rebuilds the
+// version 1 snapshotText / keywords / jobData the matcher reads.
+const JOB_WEEKDAYS = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat'];
+const JOB_SCHOOL_FIELDS = ['schoolId', 'schoolName', 'schoolType', 'schoolCity', 'schoolZip'];
+// Same as KEYWORD_RE in the watcher (u: count code points like Python does)
+const JOB_KEYWORD_RE = /[^,.;:!?()\[\]{}<>"'\\\/\n\t ]{3,}/gu;
+
+function renderJobDate(day) {
+  const [y, m, d] = day.split('-').map(n => parseInt(n, 10));
+  const weekday = JOB_WEEKDAYS[new Date(Date.UTC(y, m - 1, d)).getUTCDay()];
+  return `${weekday}, ${m}/${d}/${y}`;
+}
+
+function renderJobClock(minutes) {
+  const hour = Math.floor(minutes / 60);
+  const minute = String(minutes % 60).padStart(2, '0');
+  return `${(hour % 12) || 12}:${minute} ${hour >= 12 ? 'PM' : 'AM'}`;
+}
+
+function jobView(job) {
+  const view = { confirmationNumber: job.confirmationNumber || '' };
+  for (const key of ['teacher', 'title', 'duration', 'location']) {
+    view[key] = job[key] || '';
+  }
+  if ('schoolId' in job) {
+    // Empty school fields are not stored
+    for (const key of JOB_SCHOOL_FIELDS) view[key] = job[key] || '';
+  }
+  view.date = job.day ? renderJobDate(job.day) : (job.date || '');
+  for (const key of ['startTime', 'endTime']) {
+    const value = job[key] ?? '';
+    view[key] = Number.isInteger(value) ? renderJobClock(value) : value;
+  }
+  return view;
+}
+
+// Same layout as build_job_block() in the watcher
+function renderJobText(view) {
+  const lines = [];
+  if (view.confirmationNumber) lines.push(`CONFIRMATION #${view.confirmationNumber}`);
+  if (view.teacher) lines.push(`TEACHER: ${view.teacher}`);
+  if (view.title) lines.push(`TITLE: ${view.title}`);
+  if (view.date) lines.push(`DATE: ${view.date}`);
+  if (view.startTime || view.endTime) lines.push(`TIME: ${view.startTime} - ${view.endTime}`.trim());
+  if (view.duration) lines.push(`DURATION: ${view.duration}`);
+  if (view.location) lines.push(`LOCATION: ${view.location}`);
+  return lines.filter(ln => ln.trim()).join('\n');
+}
+
+function expandJobEvent(doc) {
+  if (!doc || (doc.schemaVersion || 1) < 2 || 'snapshotText' in doc) return doc;
+  const job = doc.job || {};
+  const jobData = jobView(job);
+  const snapshotText = doc.rawText || renderJobText(jobData);
+  const keywords = new Set(snapshotText.toLowerCase().match(JOB_KEYWORD_RE) || []);
+  for (const tag of doc.tags || []) keywords.add(tag);
+  return { ...doc, snapshotText, keywords: [...keywords].sort(), jobData };
+}
+
 /**
  * Create user-level job event record in users/{uid}/matched_jobs/{eventId}
  */